@@ -5,15 +5,17 @@ using the WhatsApp MCP tools directly.
 """
 import os
 import sys
-import json
-import shutil
-import subprocess
 from datetime import datetime
 from pathlib import Path
 
 # Constants
 SUBBIES_GROUP_JID = '120363417538730975@g.us'  # Velocity/fibretime subbies group JID
 BASE_MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media/images')
+WHATSAPP_BRIDGE_URL = os.getenv('WHATSAPP_API_URL', 'http://localhost:8080')
+
+# Shared media cache (whatsapp-mcp-server/media_cache.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'whatsapp-mcp/whatsapp-mcp-server'))
+from media_cache import cached_download, place
 
 # Known image message IDs from our previous search
 KNOWN_IMAGE_IDS = [
@@ -27,7 +29,7 @@ def setup_directories():
 
 def download_image_with_mcp(message_id):
     """
-    Download an image using the WhatsApp MCP command line
+    Download an image through the shared media cache (bridge on a miss)
     
     Args:
         message_id: ID of the message containing the image
@@ -36,28 +38,11 @@ def download_image_with_mcp(message_id):
         Path to the downloaded image or None if download failed
     """
     try:
-        # Use subprocess to run the mcp8_download_media command
-        cmd = [
-            "python3", "-c", 
-            f"from mcp8_download_media import download_media; print(download_media(message_id='{message_id}', chat_jid='{SUBBIES_GROUP_JID}'))"
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            # Parse the output to get the file path
-            try:
-                output = result.stdout.strip()
-                data = json.loads(output)
-                if data.get('success') and 'file_path' in data:
-                    return data['file_path']
-                else:
-                    print(f"Download failed: {data.get('message', 'Unknown error')}")
-            except json.JSONDecodeError:
-                print(f"Failed to parse output: {output}")
-        else:
-            print(f"Command failed with return code {result.returncode}")
-            print(f"Error: {result.stderr}")
+        # Served from the media cache; the bridge is only asked on the first run
+        path, message = cached_download(message_id, SUBBIES_GROUP_JID, WHATSAPP_BRIDGE_URL)
+        if path:
+            return path
+        print(f"Download failed: {message}")
     
     except Exception as e:
         print(f"Error downloading image: {str(e)}")
@@ -106,9 +91,9 @@ def organize_image(source_path, message_id, date_str=None):
         target_filename = f"image_{message_id}{ext}"
         target_path = os.path.join(date_dir, target_filename)
         
-        # Copy the file
-        shutil.copy2(source_path, target_path)
-        print(f"Copied image to: {target_path}")
+        # Link the cached file into place instead of copying it
+        method = place(source_path, target_path)
+        print(f"Placed image ({method}) at: {target_path}")
         
         return target_path
     
@@ -6,19 +6,24 @@ and organize them by date in the specified directory structure.
 import os
 import sys
 import json
-import shutil
-import requests
 import sqlite3
 from datetime import datetime
 from pathlib import Path
 
 # Constants
 SUBBIES_GROUP_JID = '120363417538730975@g.us'  # Velocity/fibretime subbies group JID
-WHATSAPP_API_URL = 'http://localhost:8080/api'
+WHATSAPP_BRIDGE_URL = 'http://localhost:8080'
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
                       'whatsapp-mcp/whatsapp-bridge/store/messages.db')
 BASE_MEDIA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media/images')
 
+# Pooled keep-alive bridge client (whatsapp-mcp-server/bridge_client.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'whatsapp-mcp/whatsapp-mcp-server'))
+from bridge_client import get_bridge_client
+from media_cache import cached_download_many, place
+
+bridge = get_bridge_client(WHATSAPP_BRIDGE_URL)
+
 def setup_directories():
     """Create necessary directories if they don't exist"""
     os.makedirs(BASE_MEDIA_DIR, exist_ok=True)
@@ -37,8 +42,8 @@ def get_image_messages(days=30, limit=100):
     """
     try:
         # Try using the WhatsApp API first
-        response = requests.post(
-            f"{WHATSAPP_API_URL}/list-messages",
+        response = bridge.request(
+            'POST', 'list-messages',
             json={
                 "chat_jid": SUBBIES_GROUP_JID,
                 "limit": limit,
@@ -151,42 +156,6 @@ def get_image_messages(days=30, limit=100):
         print(f"Error accessing database: {str(e)}")
         return []
 
-def download_image(message_id, chat_jid=SUBBIES_GROUP_JID):
-    """
-    Download an image using the WhatsApp API
-    
-    Args:
-        message_id: ID of the message containing the image
-        chat_jid: JID of the chat containing the message
-        
-    Returns:
-        Path to the downloaded image or None if download failed
-    """
-    try:
-        # Try using the WhatsApp API
-        response = requests.post(
-            f"{WHATSAPP_API_URL}/download",
-            json={
-                "message_id": message_id,
-                "chat_jid": chat_jid
-            }
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('success') and 'file_path' in data:
-                return data['file_path']
-            else:
-                print(f"Download failed: {data.get('message', 'Unknown error')}")
-        else:
-            print(f"API request failed with status code: {response.status_code}")
-            print(f"Response: {response.text}")
-    
-    except Exception as e:
-        print(f"Error downloading image: {str(e)}")
-    
-    return None
-
 def organize_image(source_path, message_id, timestamp):
     """
     Organize an image into the date-based directory structure
@@ -218,9 +187,9 @@ def organize_image(source_path, message_id, timestamp):
         target_filename = f"image_{time_str}_{message_id}{ext}"
         target_path = os.path.join(date_dir, target_filename)
         
-        # Copy the file
-        shutil.copy2(source_path, target_path)
-        print(f"Copied image to: {target_path}")
+        # Link the cached file into place instead of copying it
+        method = place(source_path, target_path)
+        print(f"Placed image ({method}) at: {target_path}")
         
         return target_path
     
@@ -244,16 +213,18 @@ def main():
     
     print(f"Downloading {len(image_messages)} images...")
     
-    # Download and organize each image
+    # Cached images are reused; the rest download concurrently over a few keep-alive connections
+    source_paths = cached_download_many([(msg['id'], SUBBIES_GROUP_JID) for msg in image_messages],
+                                        WHATSAPP_BRIDGE_URL)
+    
+    # Organize each downloaded image
     successful_downloads = 0
-    for msg in image_messages:
+    for msg, source_path in zip(image_messages, source_paths):
         message_id = msg['id']
         timestamp = msg['timestamp']
         
         print(f"Processing image message: {message_id}")
         
-        # Download the image
-        source_path = download_image(message_id)
         if not source_path:
             print(f"Failed to download image for message: {message_id}")
             continue
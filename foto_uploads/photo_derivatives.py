@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Photo Derivatives: thumbnails and review copies for stored photos
+Generated in a process pool and cached by the source photo's SHA-256
+
+For every stored photo this writes, under PHOTO_DERIVATIVES_DIR/<sha[:2]>/<sha>/:
+- thumb.jpg / thumb.webp - THUMBNAIL_SIZE px on the long side, for lists
+- review.jpg - REVIEW_MAX_SIZE px on the long side, rotated upright, sRGB,
+  EXIF (GPS, device) stripped - what QA reviewers open instead of the original
+
+Photos with an embedded ICC profile (e.g. Display P3 from newer phones) are
+converted to sRGB with ImageCms before resizing, since the profile isn't
+carried over to the derivatives; photos without one are assumed to be sRGB.
+
+A photo whose derivatives already exist is never processed again, so
+forwarded duplicates and re-runs cost nothing. Pillow work is CPU-bound, so
+it runs in a ProcessPoolExecutor with DERIVATIVE_WORKERS processes, started
+with forkserver (spawn where that's unavailable) so workers never inherit a
+forked copy of the caller's threads, locks or connections. The
+assistant backend serves the files at /api/photos/<sha256>/<variant>.
+
+Usage:
+    future = submit_derivatives(photo_path, sha256)   # from the upload pipeline
+    python photo_derivatives.py                       # backfill everything in photos/
+    python photo_derivatives.py path/to/photo.jpg ...
+"""
+
+import io
+import os
+import sys
+import atexit
+import multiprocessing
+import hashlib
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    from PIL import ImageCms
+    SRGB_PROFILE = ImageCms.createProfile('sRGB')
+    IMAGECMS_AVAILABLE = True
+except Exception:
+    # Pillow built without LittleCMS
+    IMAGECMS_AVAILABLE = False
+
+# Configuration
+BASE_DIR = Path(__file__).parent
+PHOTO_DERIVATIVES_DIR = Path(os.getenv('PHOTO_DERIVATIVES_DIR', str(BASE_DIR / 'derivatives')))
+THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '320'))
+REVIEW_MAX_SIZE = int(os.getenv('REVIEW_MAX_SIZE', '2048'))
+DERIVATIVE_WORKERS = int(os.getenv('DERIVATIVE_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+
+# variant file name -> (long side in px, Pillow format, save options)
+VARIANTS = {
+    'thumb.jpg': (THUMBNAIL_SIZE, 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'thumb.webp': (THUMBNAIL_SIZE, 'WEBP', {'quality': 75, 'method': 4}),
+    'review.jpg': (REVIEW_MAX_SIZE, 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+logger = logging.getLogger(__name__)
+
+def file_sha256(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def derivative_dir(sha256, root=PHOTO_DERIVATIVES_DIR):
+    """Directory holding the derivatives of one source photo"""
+    return Path(root) / sha256[:2] / sha256
+
+def derivatives_exist(sha256, root=PHOTO_DERIVATIVES_DIR):
+    """True if every variant of the photo is already on disk"""
+    target_dir = derivative_dir(sha256, root)
+    return all((target_dir / variant).exists() for variant in VARIANTS)
+
+def to_srgb(image, icc_profile):
+    """Convert an RGB image with an embedded ICC profile to sRGB (unchanged if it can't be)"""
+    if not icc_profile or not IMAGECMS_AVAILABLE or image.mode != 'RGB':
+        return image
+    try:
+        source_profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        return ImageCms.profileToProfile(image, source_profile, SRGB_PROFILE, outputMode='RGB')
+    except (ImageCms.PyCMSError, OSError, ValueError) as e:
+        logger.warning(f"Could not convert colour profile to sRGB: {e}")
+        return image
+
+def generate_derivatives(source_path, sha256=None, root=PHOTO_DERIVATIVES_DIR):
+    """Write the missing variants of one photo. Runs in a pool worker process.
+
+    Returns:
+        (sha256, {variant: path}) of all variants
+    """
+    sha256 = sha256 or file_sha256(source_path)
+    target_dir = derivative_dir(sha256, root)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    missing = [variant for variant in VARIANTS if not (target_dir / variant).exists()]
+
+    if missing:
+        with Image.open(source_path) as original:
+            # Apply the EXIF orientation, then drop all metadata by not passing exif= on save
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image = to_srgb(image, original.info.get('icc_profile'))
+
+            # Largest first, so the smaller ones downscale from an already-reduced image
+            for variant in sorted(missing, key=lambda v: -VARIANTS[v][0]):
+                size, image_format, options = VARIANTS[variant]
+                resized = image.copy()
+                resized.thumbnail((size, size), Image.LANCZOS)
+
+                # Write then rename, so a half-written file is never served or treated as cached
+                tmp_path = target_dir / f".{variant}.{os.getpid()}.tmp"
+                resized.save(tmp_path, image_format, **options)
+                os.replace(tmp_path, target_dir / variant)
+                image = resized
+
+    return sha256, {variant: str(target_dir / variant) for variant in VARIANTS}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_derivative_pool():
+    """Shared process pool for derivative generation"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The upload pipeline calls this from threads - a forked worker could
+            # inherit a lock held by one of them and deadlock
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(start_method)
+            if start_method == 'forkserver':
+                # Workers fork from a server that has Pillow and this module loaded already
+                context.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=DERIVATIVE_WORKERS, mp_context=context)
+            atexit.register(_pool.shutdown)
+    return _pool
+
+def submit_derivatives(source_path, sha256=None):
+    """Queue derivative generation for a photo.
+
+    Returns:
+        A Future for (sha256, {variant: path}), or None if the derivatives
+        are cached already or Pillow isn't installed
+    """
+    if not PIL_AVAILABLE:
+        return None
+    if sha256 and derivatives_exist(sha256):
+        return None
+    return get_derivative_pool().submit(generate_derivatives, str(source_path), sha256)
+
+def generate_many(paths):
+    """Generate derivatives for many photos in the pool. Returns how many photos were processed."""
+    pending = {}
+    seen = set()
+    for path in paths:
+        sha256 = file_sha256(path)
+        if sha256 not in seen and not derivatives_exist(sha256):
+            pending[path] = sha256
+        seen.add(sha256)
+
+    if not pending:
+        return 0
+
+    logger.info(f"🖼️  Generating derivatives for {len(pending)} photos ({DERIVATIVE_WORKERS} processes)")
+    done = 0
+    pool = get_derivative_pool()
+    futures = {pool.submit(generate_derivatives, str(path), sha256): path for path, sha256 in pending.items()}
+    for future in as_completed(futures):
+        try:
+            future.result()
+            done += 1
+        except Exception as e:
+            logger.error(f"❌ Derivatives failed for {futures[future]}: {e}")
+    return done
+
+def main():
+    """Backfill derivatives for the given photos (default: everything under photos/)"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if not PIL_AVAILABLE:
+        print("❌ Pillow is not installed (pip install Pillow)")
+        sys.exit(1)
+
+    if len(sys.argv) > 1:
+        paths = [Path(arg) for arg in sys.argv[1:]]
+    else:
+        paths = [
+            path for path in (BASE_DIR / 'photos').rglob('*')
+            if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+        ]
+
+    count = generate_many(paths)
+    print(f"✅ Derivatives generated for {count} photos in {PHOTO_DERIVATIVES_DIR}")
+
+if __name__ == "__main__":
+    main()
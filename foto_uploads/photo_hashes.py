@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Photo Hash Index: near-duplicate detection for ingested photos
+64-bit difference hashes (dHash) with a vectorized Hamming-distance search
+
+Contractors resubmit the same photo, sometimes under a different drop, and
+re-saved or re-compressed copies don't share a SHA-256. A dHash changes
+by only a few bits under resizing, recompression or small edits, so two
+photos within PHOTO_DUPLICATE_DISTANCE bits of each other are flagged as
+near duplicates.
+
+The index is built incrementally during ingestion and persisted in SQLite
+(PHOTO_HASH_INDEX_PATH). In memory all hashes sit in one uint64 NumPy array;
+a query XORs it against the photo's hash and counts the differing bits,
+which takes milliseconds even for hundreds of thousands of photos
+(pure-Python fallback without NumPy).
+
+Usage:
+    index = get_photo_hash_index()
+    matches = index.near(dhash_file(path))
+    python photo_hashes.py path/to/photo.jpg   # near duplicates of a photo
+    python photo_hashes.py --stats
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+import logging
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Configuration
+BASE_DIR = Path(__file__).parent
+PHOTO_HASH_INDEX_PATH = os.getenv('PHOTO_HASH_INDEX_PATH', str(BASE_DIR / 'photo_hashes.db'))
+# Differing bits (out of 64) at or below which two photos count as near duplicates
+PHOTO_DUPLICATE_DISTANCE = int(os.getenv('PHOTO_DUPLICATE_DISTANCE', '6'))
+DHASH_SIZE = 8
+# Blank / uniform images hash to (nearly) all zeros and would all match each other
+MIN_HASH_BITS = 4
+
+logger = logging.getLogger(__name__)
+
+def dhash_file(path):
+    """64-bit difference hash of an image file (None if it can't be read)"""
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        with Image.open(path) as image:
+            # JPEGs decode at 1/8 scale or smaller - a few ms instead of a full decode
+            image.draft('L', (DHASH_SIZE * 8, DHASH_SIZE * 8))
+            image = ImageOps.exif_transpose(image)
+            small = image.convert('L').resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS)
+    except Exception as e:
+        logger.warning(f"Could not hash {path}: {e}")
+        return None
+
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            left = pixels[row * (DHASH_SIZE + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (DHASH_SIZE + 1) + col + 1])
+    return bits
+
+def is_informative(dhash):
+    """False for hashes of blank or uniform images, which say nothing about content"""
+    bits = bin(dhash).count('1')
+    return MIN_HASH_BITS <= bits <= DHASH_SIZE * DHASH_SIZE - MIN_HASH_BITS
+
+def to_signed(value):
+    """uint64 hash -> signed int64 for SQLite / Postgres BIGINT"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+class PhotoHashIndex:
+    """dHashes of every ingested photo, searchable by Hamming distance"""
+
+    def __init__(self, path=PHOTO_HASH_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS photo_hashes (
+                message_id TEXT NOT NULL,
+                chat_jid TEXT NOT NULL,
+                dhash INTEGER NOT NULL,
+                sha256 TEXT,
+                drop_number TEXT,
+                file_path TEXT,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (message_id, chat_jid)
+            )
+        """)
+        self._conn.commit()
+
+        # Parallel storage: hashes in a growable array, photo details in a list
+        self._photos = []
+        self._hashes = np.zeros(1024, dtype=np.uint64) if NUMPY_AVAILABLE else []
+        self._count = 0
+        self._loaded_rowid = 0
+        self._keys = set()
+        self.refresh()
+
+    def _append(self, dhash, photo):
+        if NUMPY_AVAILABLE:
+            if self._count == len(self._hashes):
+                self._hashes = np.concatenate([self._hashes, np.zeros(len(self._hashes), dtype=np.uint64)])
+            self._hashes[self._count] = dhash
+        else:
+            self._hashes.append(dhash)
+        self._photos.append(photo)
+        self._keys.add((photo['message_id'], photo['chat_jid']))
+        self._count += 1
+
+    def refresh(self):
+        """Load photos added since the last load (also by other processes)"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT rowid, message_id, chat_jid, dhash, sha256, drop_number, file_path
+                FROM photo_hashes WHERE rowid > ? ORDER BY rowid
+            """, (self._loaded_rowid,)).fetchall()
+            for rowid, message_id, chat_jid, dhash, sha256, drop_number, file_path in rows:
+                if (message_id, chat_jid) not in self._keys:
+                    self._append(to_unsigned(dhash), {
+                        'message_id': message_id, 'chat_jid': chat_jid, 'sha256': sha256,
+                        'drop_number': drop_number, 'file_path': file_path
+                    })
+                self._loaded_rowid = rowid
+
+    def __len__(self):
+        return self._count
+
+    def distances(self, dhash):
+        """Hamming distance from dhash to every indexed photo"""
+        if not NUMPY_AVAILABLE:
+            return [bin(h ^ dhash).count('1') for h in self._hashes]
+        differing = self._hashes[:self._count] ^ np.uint64(dhash)
+        if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+            return np.bitwise_count(differing)
+        return np.unpackbits(differing.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+    def near(self, dhash, max_distance=PHOTO_DUPLICATE_DISTANCE, limit=10, exclude=None):
+        """Indexed photos within max_distance bits of dhash, closest first.
+
+        Args:
+            exclude: (message_id, chat_jid) to leave out, e.g. the photo itself
+        """
+        with self._lock:
+            if not self._count:
+                return []
+            distances = self.distances(dhash)
+            if NUMPY_AVAILABLE:
+                candidates = np.flatnonzero(distances <= max_distance)
+                order = candidates[np.argsort(distances[candidates], kind='stable')].tolist()
+            else:
+                order = sorted((i for i, d in enumerate(distances) if d <= max_distance),
+                               key=lambda i: distances[i])
+
+            matches = []
+            for i in order:
+                photo = self._photos[i]
+                if exclude and (photo['message_id'], photo['chat_jid']) == tuple(exclude):
+                    continue
+                matches.append(dict(photo, distance=int(distances[i])))
+                if len(matches) >= limit:
+                    break
+            return matches
+
+    def add(self, message_id, chat_jid, dhash, sha256=None, drop_number=None, file_path=None):
+        """Index a photo (ignored if it's indexed already)"""
+        with self._lock:
+            if (message_id, chat_jid) in self._keys:
+                return
+            self._conn.execute("""
+                INSERT OR IGNORE INTO photo_hashes
+                    (message_id, chat_jid, dhash, sha256, drop_number, file_path, added_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (message_id, chat_jid, to_signed(dhash), sha256, drop_number, file_path, time.time()))
+            self._conn.commit()
+            self._append(dhash, {
+                'message_id': message_id, 'chat_jid': chat_jid, 'sha256': sha256,
+                'drop_number': drop_number, 'file_path': file_path
+            })
+
+    def check_and_add(self, photo_info):
+        """Closest earlier near duplicate of an ingested photo (or None), then index it.
+
+        photo_info needs message_id, chat_jid and dhash; sha256, drop_number
+        and file_path are stored when present.
+        """
+        key = (photo_info['message_id'], photo_info['chat_jid'])
+        self.refresh()
+        matches = []
+        if is_informative(photo_info['dhash']):
+            matches = self.near(photo_info['dhash'], limit=1, exclude=key)
+        self.add(*key, photo_info['dhash'], photo_info.get('content_sha256'),
+                 photo_info.get('drop_number'), photo_info.get('file_path'))
+        return matches[0] if matches else None
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_photo_hash_index(path=PHOTO_HASH_INDEX_PATH):
+    """Get the shared index for path"""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = PhotoHashIndex(key)
+            _indexes[key] = index
+    return index
+
+def main():
+    """Show index stats or the near duplicates of a photo"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    index = get_photo_hash_index()
+    if len(sys.argv) < 2 or sys.argv[1] == '--stats':
+        print(f"📊 {len(index)} photos indexed in {index.path}")
+        return
+
+    for path in sys.argv[1:]:
+        dhash = dhash_file(path)
+        if dhash is None:
+            print(f"❌ Could not hash {path}")
+            continue
+        started = time.perf_counter()
+        matches = index.near(dhash)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"🔍 {path}: {len(matches)} near duplicates among {len(index)} photos ({elapsed:.1f} ms)")
+        for match in matches:
+            print(f"   {match['distance']:2d} bits  {match['drop_number'] or '-':12s} "
+                  f"{match['message_id']}  {match['file_path'] or ''}")
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,31 @@
 """
 Step 1: Simple Photo Upload from WhatsApp Groups
 Basic photo detection, download, and storage without AI processing
+
+Photos go through a staged pipeline:
+1. Discovery - image messages after this service's rowid cursor in
+   messages.db (the last PHOTO_BACKLOG_HOURS on the first run)
+2. Skip - message IDs already in simple_photo_uploads are dropped before
+   anything is downloaded
+3. Download + store - PHOTO_DOWNLOAD_WORKERS threads fetch through the media
+   cache (hashed on the way in) and link the file into the project folder
+4. Metadata - results are upserted PHOTO_METADATA_BATCH_SIZE rows at a time
+   as they complete, while later downloads are still running
+5. Derivatives - thumbnails and an EXIF-stripped review copy are made in a
+   process pool (photo_derivatives.py), once per distinct photo
+
+Each photo's perceptual hash is checked against every earlier one
+(photo_hashes.py); near duplicates are logged and recorded in
+simple_photo_uploads.duplicate_of.
 """
 
 import os
 import sys
 import sqlite3
-import psycopg2
-import requests
 import json
 import hashlib
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
@@ -19,7 +34,24 @@ import logging
 BASE_DIR = Path(__file__).parent
 WHATSAPP_DB_PATH = BASE_DIR.parent / 'whatsapp-mcp/whatsapp-bridge/store/messages.db'
 PHOTOS_STORAGE_PATH = BASE_DIR / 'photos'
-WHATSAPP_BRIDGE_URL = 'http://localhost:8080'
+WHATSAPP_BRIDGE_URL = os.getenv('WHATSAPP_API_URL', 'http://localhost:8080')
+MCP_SERVER_DIR = BASE_DIR.parent / 'whatsapp-mcp/whatsapp-mcp-server'
+# Concurrent downloads (they share the bridge client's BRIDGE_MAX_CONNECTIONS keep-alive connections)
+PHOTO_DOWNLOAD_WORKERS = int(os.getenv('PHOTO_DOWNLOAD_WORKERS', '8'))
+PHOTO_METADATA_BATCH_SIZE = int(os.getenv('PHOTO_METADATA_BATCH_SIZE', '50'))
+# First run looks back this far; failed downloads are retried for as long
+PHOTO_BACKLOG_HOURS = int(os.getenv('PHOTO_BACKLOG_HOURS', '24'))
+PHOTO_CURSOR_NAME = 'simple_photo_upload'
+
+# Shared drop-number extraction (whatsapp-mcp-server/message_index.py)
+sys.path.insert(0, str(MCP_SERVER_DIR))
+from message_index import extract_drop_numbers
+from message_watcher import get_watcher
+from message_cursor import get_cursor_store, read_messages_after, rowid_before
+import pg_pool
+from media_cache import blob_sha256, cached_download, place
+from photo_derivatives import submit_derivatives
+from photo_hashes import dhash_file, get_photo_hash_index, to_signed
 
 # Database configuration
 NEON_DB_URL = os.getenv('NEON_DATABASE_URL', '')
@@ -55,6 +87,8 @@ class SimplePhotoUpload:
     def __init__(self):
         self.setup_directories()
         self.setup_database()
+        # Ingested this run - the skip check when no database is configured
+        self.ingested = set()
         
     def setup_directories(self):
         """Create necessary directories"""
@@ -78,7 +112,7 @@ class SimplePhotoUpload:
             return
             
         try:
-            conn = psycopg2.connect(NEON_DB_URL)
+            conn = pg_pool.connect(NEON_DB_URL)
             cursor = conn.cursor()
             
             # Create simple photo uploads table
@@ -100,6 +134,10 @@ class SimplePhotoUpload:
                     UNIQUE(message_id, chat_jid)
                 )
             """)
+            cursor.execute("ALTER TABLE simple_photo_uploads ADD COLUMN IF NOT EXISTS content_sha256 TEXT")
+            cursor.execute("ALTER TABLE simple_photo_uploads ADD COLUMN IF NOT EXISTS dhash BIGINT")
+            cursor.execute("ALTER TABLE simple_photo_uploads ADD COLUMN IF NOT EXISTS duplicate_of TEXT")
+            cursor.execute("ALTER TABLE simple_photo_uploads ADD COLUMN IF NOT EXISTS duplicate_distance INTEGER")
             
             conn.commit()
             conn.close()
@@ -120,23 +158,11 @@ class SimplePhotoUpload:
     def download_photo_from_whatsapp(self, message_id, chat_jid):
         """Download photo using WhatsApp bridge API"""
         try:
-            download_url = f"{WHATSAPP_BRIDGE_URL}/api/download"
-            payload = {
-                'message_id': message_id,
-                'chat_jid': chat_jid
-            }
-            
-            response = requests.post(download_url, json=payload, timeout=30)
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    return result.get('path')
-                else:
-                    logger.error(f"Download failed: {result.get('message')}")
-            else:
-                logger.error(f"HTTP {response.status_code}: {response.text}")
-            
-            return None
+            # Media cache - the bridge is only asked once per message
+            path, error = cached_download(message_id, chat_jid, WHATSAPP_BRIDGE_URL)
+            if not path:
+                logger.error(error)
+            return path
             
         except Exception as e:
             logger.error(f"Error downloading photo {message_id}: {e}")
@@ -165,9 +191,8 @@ class SimplePhotoUpload:
             
             target_path = date_dir / new_filename
             
-            # Copy file
-            import shutil
-            shutil.copy2(source_path, target_path)
+            # Hardlink (or reflink) out of the media cache instead of copying
+            place(source_path, str(target_path))
             
             logger.info(f"Photo organized: {target_path}")
             return str(target_path)
@@ -178,22 +203,38 @@ class SimplePhotoUpload:
     
     def store_photo_metadata(self, photo_info):
         """Store photo metadata in database"""
+        return self.store_photo_metadata_batch([photo_info]) == 1
+    
+    def store_photo_metadata_batch(self, photos):
+        """Upsert metadata for a batch of photos in one statement. Returns rows stored."""
+        if not photos:
+            return 0
         if not NEON_DB_URL:
             logger.info("No database configured, skipping metadata storage")
-            return True
+            return len(photos)
             
         try:
-            conn = psycopg2.connect(NEON_DB_URL)
+            from psycopg2.extras import execute_values
+            conn = pg_pool.connect(NEON_DB_URL)
             cursor = conn.cursor()
             
-            cursor.execute("""
+            execute_values(cursor, """
                 INSERT INTO simple_photo_uploads (
                     message_id, chat_jid, group_name, project_code, 
                     sender_phone, message_content, original_filename,
-                    stored_filename, file_path, file_size, processed
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (message_id, chat_jid) DO NOTHING
-            """, (
+                    stored_filename, file_path, file_size, content_sha256,
+                    dhash, duplicate_of, duplicate_distance, processed
+                ) VALUES %s
+                ON CONFLICT (message_id, chat_jid) DO UPDATE SET
+                    stored_filename = EXCLUDED.stored_filename,
+                    file_path = EXCLUDED.file_path,
+                    file_size = EXCLUDED.file_size,
+                    content_sha256 = EXCLUDED.content_sha256,
+                    dhash = EXCLUDED.dhash,
+                    duplicate_of = EXCLUDED.duplicate_of,
+                    duplicate_distance = EXCLUDED.duplicate_distance,
+                    processed = EXCLUDED.processed
+            """, [(
                 photo_info['message_id'],
                 photo_info['chat_jid'],
                 photo_info['group_name'],
@@ -204,145 +245,259 @@ class SimplePhotoUpload:
                 photo_info['stored_filename'],
                 photo_info['file_path'],
                 photo_info['file_size'],
+                photo_info.get('content_sha256'),
+                to_signed(photo_info['dhash']) if photo_info.get('dhash') is not None else None,
+                photo_info.get('duplicate_of'),
+                photo_info.get('duplicate_distance'),
                 True  # processed
-            ))
+            ) for photo_info in photos])
             
             conn.commit()
             conn.close()
             
-            logger.info(f"Metadata stored for {photo_info['message_id']}")
-            return True
+            logger.info(f"Metadata stored for {len(photos)} photos")
+            return len(photos)
             
         except Exception as e:
             logger.error(f"Error storing metadata: {e}")
-            return False
+            return 0
+    
+    def already_ingested(self, photos):
+        """(message_id, chat_jid) keys of the photos that are already stored - one query"""
+        keys = {(p['message_id'], p['chat_jid']) for p in photos}
+        done = keys & self.ingested
+        if not NEON_DB_URL or not keys - done:
+            return done
+        
+        try:
+            conn = pg_pool.connect(NEON_DB_URL)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT message_id, chat_jid FROM simple_photo_uploads
+                WHERE message_id = ANY(%s) AND processed
+            """, ([message_id for message_id, _ in keys - done],))
+            done |= {tuple(row) for row in cursor.fetchall()} & keys
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error checking ingested photos: {e}")
+        return done
     
     def extract_drop_number(self, content):
         """Extract drop number from message content"""
-        if not content:
-            return None
-        
-        import re
-        pattern = r'\bDR\d+\b'
-        matches = re.findall(pattern, content.upper())
-        return matches[0] if matches else None
+        drops = extract_drop_numbers(content)
+        return drops[0] if drops else None
+    
+    def build_photo_info(self, msg_dict, group_jid, config):
+        """Build the photo record for an image message"""
+        return {
+            'message_id': msg_dict['id'],
+            'chat_jid': group_jid,
+            'group_name': config['name'],
+            'project_code': config['project_code'],
+            'sender_phone': msg_dict.get('sender', ''),
+            'message_content': msg_dict.get('content', ''),
+            'original_filename': msg_dict.get('filename', 'photo.jpg'),
+            'file_size': msg_dict.get('file_length', 0),
+            'timestamp': msg_dict.get('timestamp', 0),
+            'rowid': msg_dict.get('rowid'),
+            'drop_number': self.extract_drop_number(msg_dict.get('content'))
+        }
     
     def get_new_photos(self):
-        """Get new photo messages from monitored groups"""
+        """Get photo messages posted in monitored groups since the last run.
+        
+        Returns:
+            (photos, high-water rowid to save once they are processed)
+        """
         try:
-            wa_conn = self.connect_to_whatsapp_db()
-            cursor = wa_conn.cursor()
+            store = get_cursor_store()
+            after = store.get(PHOTO_CURSOR_NAME)
+            if after is None:
+                after = rowid_before(str(WHATSAPP_DB_PATH),
+                                     datetime.now() - timedelta(hours=PHOTO_BACKLOG_HOURS))
             
-            new_photos = []
+            enabled = {jid: config for jid, config in TEST_GROUPS.items() if config.get('enabled', True)}
+            messages, high_water = read_messages_after(str(WHATSAPP_DB_PATH), after, enabled.keys())
+            # Re-inserted or history-synced rows get new rowids too
+            messages = store.drop_replayed(PHOTO_CURSOR_NAME, messages)
             
-            # Check each monitored group
-            for group_jid, config in TEST_GROUPS.items():
-                if not config.get('enabled', True):
-                    continue
-                
-                # Get recent image messages (last 24 hours)
-                cutoff_timestamp = int((datetime.now().timestamp() - 86400) * 1000)
-                
-                cursor.execute("""
-                    SELECT id, chat_jid, sender, content, timestamp, 
-                           filename, url, file_length, media_type
-                    FROM messages 
-                    WHERE chat_jid = ? 
-                    AND media_type = 'image' 
-                    AND timestamp > ?
-                    ORDER BY timestamp DESC
-                    LIMIT 20
-                """, (group_jid, cutoff_timestamp))
-                
-                messages = cursor.fetchall()
-                
-                for msg in messages:
-                    msg_dict = dict(msg)
-                    
-                    photo_info = {
-                        'message_id': msg_dict['id'],
-                        'chat_jid': group_jid,
-                        'group_name': config['name'],
-                        'project_code': config['project_code'],
-                        'sender_phone': msg_dict.get('sender', ''),
-                        'message_content': msg_dict.get('content', ''),
-                        'original_filename': msg_dict.get('filename', 'photo.jpg'),
-                        'file_size': msg_dict.get('file_length', 0),
-                        'timestamp': msg_dict.get('timestamp', 0),
-                        'drop_number': self.extract_drop_number(msg_dict.get('content'))
-                    }
-                    
-                    new_photos.append(photo_info)
-            
-            wa_conn.close()
-            return new_photos
+            new_photos = [
+                self.build_photo_info(msg, msg['chat_jid'], enabled[msg['chat_jid']])
+                for msg in messages if msg['media_type'] == 'image'
+            ]
+            return new_photos, high_water
             
         except Exception as e:
             logger.error(f"Error getting new photos: {e}")
-            return []
+            return [], None
     
-    def process_photos(self):
-        """Main processing function - download and organize new photos"""
+    def ingest_photo(self, photo_info):
+        """Download (through the media cache) and organize one photo. Returns it with its paths, or None."""
+        downloaded_path = self.download_photo_from_whatsapp(
+            photo_info['message_id'], 
+            photo_info['chat_jid']
+        )
+        
+        if not downloaded_path:
+            logger.warning(f"Failed to download photo: {photo_info['message_id']}")
+            return None
+        
+        # Organize photo into project structure
+        organized_path = self.organize_photo(downloaded_path, photo_info)
+        
+        if not organized_path:
+            logger.warning(f"Failed to organize photo: {photo_info['message_id']}")
+            return None
+        
+        # Update photo info with final paths
+        photo_info['file_path'] = organized_path
+        photo_info['stored_filename'] = os.path.basename(organized_path)
+        photo_info['file_size'] = photo_info['file_size'] or os.path.getsize(organized_path)
+        photo_info['content_sha256'] = blob_sha256(downloaded_path)
+        photo_info['dhash'] = dhash_file(organized_path)
+        return photo_info
+    
+    def flag_duplicate(self, photo_info):
+        """Check an ingested photo against the hash index and record its closest earlier near duplicate"""
+        if photo_info.get('dhash') is None:
+            return None
+        
+        match = get_photo_hash_index().check_and_add(photo_info)
+        if match:
+            photo_info['duplicate_of'] = match['message_id']
+            photo_info['duplicate_distance'] = match['distance']
+            other_drop = f" (drop {match['drop_number']})" if match['drop_number'] else ""
+            logger.warning(f"⚠️ Possible duplicate photo {photo_info['message_id']} "
+                           f"(drop {photo_info['drop_number'] or 'unknown'}): matches {match['message_id']}"
+                           f"{other_drop}, {match['distance']} bits apart")
+        return match
+    
+    def flush_metadata(self, batch, failed):
+        """Store a batch of ingested photos. Returns how many were stored.
+        
+        If storing fails the batch is added to failed, so the cursor holds
+        before it and the photos are picked up again on the next run.
+        """
+        if not batch:
+            return 0
+        stored = self.store_photo_metadata_batch(batch)
+        if not stored:
+            logger.warning(f"{len(batch)} photos organized but metadata storage failed - will retry")
+            failed.extend(batch)
+            return 0
+        
+        for photo_info in batch:
+            self.ingested.add((photo_info['message_id'], photo_info['chat_jid']))
+            
+            # Log success with details
+            details = []
+            if photo_info['drop_number']:
+                details.append(f"Drop: {photo_info['drop_number']}")
+            if photo_info['sender_phone']:
+                details.append(f"From: {photo_info['sender_phone']}")
+            
+            logger.info(f"✅ Photo processed successfully: {photo_info['stored_filename']} " + 
+                      (f"({', '.join(details)})" if details else ""))
+        return stored
+    
+    def process_photos(self, new_photos=None):
+        """Main processing function - download and organize new (or the given) photos"""
         logger.info("Starting photo processing...")
         
         # Get new photos from WhatsApp
-        new_photos = self.get_new_photos()
+        high_water = None
+        if new_photos is None:
+            new_photos, high_water = self.get_new_photos()
+        
+        # Skip anything stored before, without touching the bridge
+        done = self.already_ingested(new_photos) if new_photos else set()
+        pending = [p for p in new_photos if (p['message_id'], p['chat_jid']) not in done]
+        if done:
+            logger.info(f"Skipping {len(done)} photos that were already ingested")
         
-        if not new_photos:
+        if not pending:
             logger.info("No new photos found")
+            self.save_cursor(high_water, new_photos, [])
             return 0
         
-        logger.info(f"Found {len(new_photos)} new photos to process")
+        logger.info(f"Found {len(pending)} new photos to process ({PHOTO_DOWNLOAD_WORKERS} download workers)")
         
         successful_count = 0
+        failed = []
+        batch = []
+        derivative_futures = {}
         
-        for photo_info in new_photos:
-            try:
-                logger.info(f"Processing photo: {photo_info['message_id']} from {photo_info['group_name']}")
+        with ThreadPoolExecutor(max_workers=max(1, min(PHOTO_DOWNLOAD_WORKERS, len(pending)))) as executor:
+            futures = {executor.submit(self.ingest_photo, photo_info): photo_info for photo_info in pending}
+            for future in as_completed(futures):
+                photo_info = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing photo {photo_info.get('message_id', 'unknown')}: {e}")
+                    result = None
                 
-                # Download photo from WhatsApp
-                downloaded_path = self.download_photo_from_whatsapp(
-                    photo_info['message_id'], 
-                    photo_info['chat_jid']
-                )
-                
-                if not downloaded_path:
-                    logger.warning(f"Failed to download photo: {photo_info['message_id']}")
-                    continue
-                
-                # Organize photo into project structure
-                organized_path = self.organize_photo(downloaded_path, photo_info)
-                
-                if not organized_path:
-                    logger.warning(f"Failed to organize photo: {photo_info['message_id']}")
+                if result is None:
+                    failed.append(photo_info)
                     continue
                 
-                # Update photo info with final paths
-                photo_info['file_path'] = organized_path
-                photo_info['stored_filename'] = os.path.basename(organized_path)
+                self.flag_duplicate(result)
                 
-                # Store metadata in database
-                if self.store_photo_metadata(photo_info):
-                    successful_count += 1
-                    
-                    # Log success with details
-                    details = []
-                    if photo_info['drop_number']:
-                        details.append(f"Drop: {photo_info['drop_number']}")
-                    if photo_info['sender_phone']:
-                        details.append(f"From: {photo_info['sender_phone']}")
-                    
-                    logger.info(f"✅ Photo processed successfully: {photo_info['stored_filename']} " + 
-                              (f"({', '.join(details)})" if details else ""))
-                else:
-                    logger.warning(f"Photo organized but metadata storage failed: {photo_info['message_id']}")
+                # Thumbnails are made in other processes while downloads continue
+                future = submit_derivatives(result['file_path'], result['content_sha256'])
+                if future is not None:
+                    derivative_futures[future] = result['message_id']
                 
-            except Exception as e:
-                logger.error(f"Error processing photo {photo_info.get('message_id', 'unknown')}: {e}")
+                # Metadata is written in batches while the remaining downloads run
+                batch.append(result)
+                if len(batch) >= PHOTO_METADATA_BATCH_SIZE:
+                    successful_count += self.flush_metadata(batch, failed)
+                    batch = []
+        
+        successful_count += self.flush_metadata(batch, failed)
+        self.save_cursor(high_water, new_photos, failed)
+        
+        for future in wait(derivative_futures).done:
+            if future.exception():
+                logger.warning(f"Derivatives failed for {derivative_futures[future]}: {future.exception()}")
         
-        logger.info(f"Photo processing complete: {successful_count}/{len(new_photos)} successful")
+        logger.info(f"Photo processing complete: {successful_count}/{len(pending)} successful")
         return successful_count
     
+    def save_cursor(self, high_water, photos, failed):
+        """Advance the discovery cursor, stopping before recent failed photos so they are retried"""
+        if high_water is None:
+            return
+        
+        failed_keys = {(p['message_id'], p['chat_jid']) for p in failed}
+        processed = [
+            {'id': p['message_id'], 'chat_jid': p['chat_jid'], 'timestamp': p.get('timestamp')}
+            for p in photos if (p['message_id'], p['chat_jid']) not in failed_keys
+        ]
+        
+        retry_after = datetime.now() - timedelta(hours=PHOTO_BACKLOG_HOURS)
+        retry_rowids = []
+        for photo_info in failed:
+            timestamp = photo_info.get('timestamp')
+            if photo_info.get('rowid') is None or not isinstance(timestamp, datetime):
+                continue
+            if timestamp.replace(tzinfo=None) >= retry_after:
+                retry_rowids.append(photo_info['rowid'])
+        
+        get_cursor_store().set(PHOTO_CURSOR_NAME, min(retry_rowids) - 1 if retry_rowids else high_water,
+                               processed)
+    
+    def handle_messages(self, messages):
+        """Message dispatcher handler: ingest images posted in monitored groups"""
+        new_photos = [
+            self.build_photo_info(msg, msg['chat_jid'], TEST_GROUPS[msg['chat_jid']])
+            for msg in messages
+            if msg['media_type'] == 'image'
+            and TEST_GROUPS.get(msg['chat_jid'], {}).get('enabled', False)
+        ]
+        if new_photos:
+            self.process_photos(new_photos)
+    
     def run_once(self):
         """Run processing once and exit"""
         try:
@@ -355,16 +510,18 @@ class SimplePhotoUpload:
     
     def run_continuous(self, interval_seconds=60):
         """Run processing continuously"""
-        logger.info(f"Starting continuous photo monitoring (interval: {interval_seconds}s)")
+        logger.info(f"Starting continuous photo monitoring (max idle interval: {interval_seconds}s, wakes on new messages)")
         
         import time
+        watcher = get_watcher(str(WHATSAPP_DB_PATH))
         while True:
             try:
                 count = self.process_photos()
                 if count > 0:
                     logger.info(f"Processed {count} photos")
                 
-                time.sleep(interval_seconds)
+                # Wait for the bridge to write new messages (or the interval to pass)
+                watcher.wait_for_change(interval_seconds)
                 
             except KeyboardInterrupt:
                 logger.info("Service stopped by user")
@@ -5,9 +5,8 @@ Requires: Drop number, QA step, saves user and timestamp
 """
 
 import os
+import sys
 import sqlite3
-import requests
-import shutil
 import re
 import json
 from datetime import datetime
@@ -16,7 +15,11 @@ from pathlib import Path
 # Simple config
 WHATSAPP_DB = Path(__file__).parent.parent / 'whatsapp-mcp/whatsapp-bridge/store/messages.db'
 PHOTOS_DIR = Path(__file__).parent / 'photos'
-BRIDGE_URL = 'http://localhost:8080'
+BRIDGE_URL = os.getenv('WHATSAPP_API_URL', 'http://localhost:8080')
+
+# Shared media cache from the MCP server
+sys.path.insert(0, str(Path(__file__).parent.parent / 'whatsapp-mcp/whatsapp-mcp-server'))
+from media_cache import cached_download, place
 
 # Groups to monitor
 GROUPS = {
@@ -153,17 +156,9 @@ def get_recent_photos():
 def download_photo(message_id, group_jid):
     """Download photo from WhatsApp bridge"""
     try:
-        response = requests.post(f"{BRIDGE_URL}/api/download", json={
-            'message_id': message_id,
-            'chat_jid': group_jid
-        }, timeout=30)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('success'):
-                return result.get('path')
-        
-        return None
+        # Served from the media cache after the first download
+        path, _ = cached_download(message_id, group_jid, BRIDGE_URL)
+        return path
         
     except Exception as e:
         print(f"❌ Download error {message_id[:8]}: {e}")
@@ -188,7 +183,7 @@ def save_photo(source_path, photo_info):
         target_dir = PHOTOS_DIR / photo_info['project']
         target_path = target_dir / filename
         
-        shutil.copy2(source_path, target_path)
+        place(source_path, str(target_path))
         
         # Log the upload
         log_entry = {
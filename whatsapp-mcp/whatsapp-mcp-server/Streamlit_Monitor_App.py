@@ -22,6 +22,9 @@ import os
 import sys
 from pathlib import Path
 
+from sqlite_pool import get_read_connection
+from message_index import get_drop_mentions
+
 # Page configuration
 st.set_page_config(
     page_title="WA_Tool Monitor Dashboard",
@@ -66,12 +69,12 @@ SERVICES = {
         'description': 'Bridge between WhatsApp Web and monitoring system',
         'log_file': '../whatsapp-bridge/bridge.log'
     },
-    'Real-time Drop Monitor': {
-        'process_name': 'realtime_drop_monitor.py',
-        'script_path': 'realtime_drop_monitor.py',
+    'Message Dispatcher': {
+        'process_name': 'message_dispatcher.py',
+        'script_path': 'message_dispatcher.py',
         'critical': True,
-        'description': 'Extract DR numbers and sync to database/Google Sheets',
-        'log_file': 'realtime_monitor.log'
+        'description': 'Extract DR numbers, sync to database/Google Sheets and handle resubmissions',
+        'log_file': 'message_dispatcher.log'
     },
     'Google Sheets QA Monitor': {
         'process_name': 'google_sheets_qa_monitor.py',
@@ -79,20 +82,6 @@ SERVICES = {
         'critical': True,
         'description': 'Monitor Google Sheets for incomplete drops and send feedback',
         'log_file': 'google_sheets_qa_monitor.log'
-    },
-    'Velo Test Resubmission Monitor': {
-        'process_name': 'whatsapp_message_monitor.py',
-        'script_path': 'whatsapp_message_monitor.py',
-        'critical': False,
-        'description': 'Monitor Velo Test for resubmission keywords',
-        'log_file': 'whatsapp_message_monitor.log'
-    },
-    'Mohadin Resubmission Monitor': {
-        'process_name': 'mohadin_message_monitor.py',
-        'script_path': 'mohadin_message_monitor.py',
-        'critical': False,
-        'description': 'Monitor Mohadin for resubmission keywords',
-        'log_file': 'mohadin_message_monitor.log'
     }
 }
 
@@ -184,33 +173,26 @@ class WhatsAppMonitor:
     def get_recent_dr_numbers(self, limit=10):
         """Get recent DR numbers from all groups."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # Get recent DR numbers
-            cursor.execute("""
-                SELECT m.content, c.name, m.timestamp
-                FROM messages m
-                JOIN chats c ON m.chat_jid = c.jid
-                WHERE m.content LIKE 'DR%'
-                ORDER BY m.timestamp DESC
-                LIMIT ?
-            """, (limit,))
+            # Indexed lookup of the latest drop mentions
+            mentions = get_drop_mentions(self.db_path, newest_first=True, limit=limit, with_content=True)
+            chat_jids = list({m['chat_jid'] for m in mentions})
+            group_names = {}
+            if chat_jids:
+                conn = get_read_connection(self.db_path)
+                group_names = dict(conn.execute(
+                    f"SELECT jid, name FROM chats WHERE jid IN ({','.join('?' * len(chat_jids))})",
+                    chat_jids
+                ).fetchall())
 
             dr_numbers = []
-            for row in cursor.fetchall():
-                # Extract DR number from message
-                import re
-                dr_match = re.search(r'DR\d+', row[0])
-                if dr_match:
-                    dr_numbers.append({
-                        'drop_number': dr_match.group(),
-                        'group': row[1],
-                        'timestamp': datetime.fromtimestamp(row[2] / 1000),
-                        'message': row[0]
-                    })
+            for mention in mentions:
+                dr_numbers.append({
+                    'drop_number': mention['drop_number'],
+                    'group': group_names.get(mention['chat_jid'], mention['chat_jid']),
+                    'timestamp': mention['timestamp'],
+                    'message': mention['content']
+                })
 
-            conn.close()
             return dr_numbers
 
         except Exception as e:
@@ -441,12 +423,12 @@ def main():
         # Mohadin-specific workflow monitoring
         mohadin_services = {
             'Message Reception': 'WhatsApp Bridge',
-            'DR Number Extraction': 'Real-time Drop Monitor',
-            'Database Sync': 'Real-time Drop Monitor',
-            'Google Sheets Update': 'Real-time Drop Monitor',
+            'DR Number Extraction': 'Message Dispatcher',
+            'Database Sync': 'Message Dispatcher',
+            'Google Sheets Update': 'Message Dispatcher',
             'QA Review': 'Google Sheets QA Monitor',
             'Feedback Communication': 'Google Sheets QA Monitor',
-            'Resubmission Processing': 'Mohadin Resubmission Monitor'
+            'Resubmission Processing': 'Message Dispatcher'
         }
 
         for step, service in mohadin_services.items():
@@ -2,6 +2,18 @@ import os
 import subprocess
 import tempfile
 
+def opus_encoder_args(bitrate="32k", sample_rate=24000):
+    """ffmpeg output options for WhatsApp voice notes (Opus, tuned for speech)."""
+    return [
+        "-c:a", "libopus",
+        "-b:a", bitrate,
+        "-ar", str(sample_rate),
+        "-application", "voip",  # Optimize for voice
+        "-vbr", "on",           # Variable bitrate
+        "-compression_level", "10",  # Maximum compression
+        "-frame_duration", "60",     # 60ms frames (good for voice)
+    ]
+
 def convert_to_opus_ogg(input_file, output_file=None, bitrate="32k", sample_rate=24000):
     """
     Convert an audio file to Opus format in an Ogg container.
@@ -33,16 +45,7 @@ def convert_to_opus_ogg(input_file, output_file=None, bitrate="32k", sample_rate
         os.makedirs(output_dir)
     
     # Build the ffmpeg command
-    cmd = [
-        "ffmpeg",
-        "-i", input_file,
-        "-c:a", "libopus",
-        "-b:a", bitrate,
-        "-ar", str(sample_rate),
-        "-application", "voip",  # Optimize for voice
-        "-vbr", "on",           # Variable bitrate
-        "-compression_level", "10",  # Maximum compression
-        "-frame_duration", "60",     # 60ms frames (good for voice)
+    cmd = ["ffmpeg", "-i", input_file] + opus_encoder_args(bitrate, sample_rate) + [
         "-y",                        # Overwrite output file if it exists
         output_file
     ]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Cached Audio Transcoder
+=======================
+
+Opus/Ogg conversion for voice messages, done once per distinct input.
+
+send_audio_message used to run a blocking ffmpeg into a new temp file for
+every send, so a reminder broadcast to 50 agents was transcoded 50 times.
+Now:
+
+- Outputs are cached in AUDIO_CACHE_DIR under the SHA-256 of the input's
+  content plus the encoder settings, so the same audio is transcoded once
+  no matter how many recipients or processes send it
+- Concurrent requests for the same input wait for the one conversion in
+  progress instead of starting their own
+- ffmpeg reads the input on stdin and writes Ogg to stdout, with no
+  intermediate temp file. Containers that need seeking (mp4/m4a with the
+  index at the end) fall back to ffmpeg reading the file path directly
+- At most AUDIO_TRANSCODE_WORKERS ffmpeg processes run at once;
+  `transcode_many()` converts a batch through that bounded pool
+- The cache is kept under AUDIO_CACHE_MAX_MB, least recently used first
+
+Usage:
+    ogg_path = get_opus_ogg(media_path)
+    ogg_paths = transcode_many([path1, path2, ...])
+
+    python audio_transcoder.py input_file [...]
+"""
+
+import os
+import sys
+import time
+import hashlib
+import subprocess
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from audio import opus_encoder_args
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR = os.getenv(
+    'AUDIO_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_cache')
+)
+AUDIO_CACHE_MAX_BYTES = int(float(os.getenv('AUDIO_CACHE_MAX_MB', '500')) * 1024 ** 2)
+AUDIO_TRANSCODE_WORKERS = int(os.getenv('AUDIO_TRANSCODE_WORKERS', '2'))
+AUDIO_TRANSCODE_TIMEOUT = float(os.getenv('AUDIO_TRANSCODE_TIMEOUT', '120'))
+
+DEFAULT_BITRATE = "32k"
+DEFAULT_SAMPLE_RATE = 24000
+
+class AudioTranscoder:
+    """Content-hash cache of Opus/Ogg conversions with a bounded number of ffmpeg processes."""
+
+    def __init__(self, cache_dir: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES,
+                 workers: int = AUDIO_TRANSCODE_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # (path, size, mtime) -> content hash, so repeat sends of a file aren't re-read
+        self._hashes: Dict[Tuple[str, int, float], str] = {}
+        self.stats = {'hits': 0, 'conversions': 0}
+
+    def _content_hash(self, input_file: str) -> str:
+        stat = os.stat(input_file)
+        memo_key = (os.path.abspath(input_file), stat.st_size, stat.st_mtime)
+        with self._lock:
+            digest = self._hashes.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(input_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            with self._lock:
+                self._hashes[memo_key] = digest
+        return digest
+
+    def cache_path(self, input_file: str, bitrate: str = DEFAULT_BITRATE,
+                   sample_rate: int = DEFAULT_SAMPLE_RATE) -> str:
+        """Where the conversion of input_file with these settings is cached."""
+        key = hashlib.sha256(
+            f"{self._content_hash(input_file)}:{bitrate}:{sample_rate}".encode()
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.ogg")
+
+    def _run_ffmpeg(self, input_file: str, bitrate: str, sample_rate: int) -> bytes:
+        """Convert to Ogg/Opus bytes, piping the input through stdin when the format allows it."""
+        output_args = opus_encoder_args(bitrate, sample_rate) + ["-f", "ogg", "pipe:1"]
+        with self._slots:
+            with open(input_file, 'rb') as f:
+                data = f.read()
+            process = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0"] + output_args,
+                input=data, capture_output=True, timeout=AUDIO_TRANSCODE_TIMEOUT
+            )
+            if process.returncode != 0 or not process.stdout:
+                # Some containers can't be demuxed from a pipe - let ffmpeg seek in the file
+                process = subprocess.run(
+                    ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", input_file] + output_args,
+                    capture_output=True, timeout=AUDIO_TRANSCODE_TIMEOUT
+                )
+        if process.returncode != 0 or not process.stdout:
+            stderr = process.stderr.decode(errors='replace').strip()
+            raise RuntimeError(f"Failed to convert audio. You likely need to install ffmpeg {stderr}")
+        return process.stdout
+
+    def transcode(self, input_file: str, bitrate: str = DEFAULT_BITRATE,
+                  sample_rate: int = DEFAULT_SAMPLE_RATE) -> str:
+        """Path of input_file converted to Opus/Ogg, converting only if it isn't cached.
+
+        Raises:
+            FileNotFoundError: If the input file doesn't exist
+            RuntimeError: If the ffmpeg conversion fails
+        """
+        if not os.path.isfile(input_file):
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+
+        output_file = self.cache_path(input_file, bitrate, sample_rate)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(output_file, threading.Lock())
+
+        with key_lock:
+            if os.path.exists(output_file):
+                os.utime(output_file)  # LRU position
+                with self._lock:
+                    self.stats['hits'] += 1
+                return output_file
+
+            started = time.monotonic()
+            data = self._run_ffmpeg(input_file, bitrate, sample_rate)
+            tmp_path = f"{output_file}.{os.getpid()}.{threading.get_ident()}.part"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, output_file)
+            with self._lock:
+                self.stats['conversions'] += 1
+            logger.info(f"🎙️  Transcoded {os.path.basename(input_file)} to Opus "
+                        f"({len(data) / 1024:.0f} KB, {time.monotonic() - started:.1f}s)")
+
+        self.evict(keep=output_file)
+        return output_file
+
+    def transcode_many(self, input_files: Iterable[str], bitrate: str = DEFAULT_BITRATE,
+                       sample_rate: int = DEFAULT_SAMPLE_RATE) -> List[Optional[str]]:
+        """Convert a batch through the bounded pool. Paths in input order (None on failure)."""
+        input_files = list(input_files)
+        if not input_files:
+            return []
+
+        def convert(input_file):
+            try:
+                return self.transcode(input_file, bitrate, sample_rate)
+            except Exception as e:
+                logger.warning(f"⚠️  Could not transcode {input_file}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(input_files))) as executor:
+            return list(executor.map(convert, input_files))
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Remove least recently used outputs until the cache is under max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.ogg'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info(f"🧹 Audio cache evicted {evicted} files")
+        return evicted
+
+_transcoders: Dict[str, AudioTranscoder] = {}
+_transcoders_lock = threading.Lock()
+
+def get_transcoder(cache_dir: str = AUDIO_CACHE_DIR) -> AudioTranscoder:
+    """Get the shared transcoder for a cache directory."""
+    key = os.path.abspath(cache_dir)
+    with _transcoders_lock:
+        transcoder = _transcoders.get(key)
+        if transcoder is None:
+            transcoder = AudioTranscoder(key)
+            _transcoders[key] = transcoder
+    return transcoder
+
+def get_opus_ogg(input_file: str, bitrate: str = DEFAULT_BITRATE,
+                 sample_rate: int = DEFAULT_SAMPLE_RATE) -> str:
+    """Cached Opus/Ogg version of an audio file (see AudioTranscoder.transcode)."""
+    return get_transcoder().transcode(input_file, bitrate, sample_rate)
+
+def transcode_many(input_files: Iterable[str], bitrate: str = DEFAULT_BITRATE,
+                   sample_rate: int = DEFAULT_SAMPLE_RATE) -> List[Optional[str]]:
+    """Cached Opus/Ogg versions of a batch of audio files (None where conversion failed)."""
+    return get_transcoder().transcode_many(input_files, bitrate, sample_rate)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if len(sys.argv) < 2:
+        print("Usage: python audio_transcoder.py input_file [...]")
+        sys.exit(1)
+
+    for input_file, output_file in zip(sys.argv[1:], transcode_many(sys.argv[1:])):
+        print(f"{input_file} -> {output_file or 'FAILED'}")
+    transcoder = get_transcoder()
+    print(f"Cache: {transcoder.stats['conversions']} converted, {transcoder.stats['hits']} already cached")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Bridge REST Client
+===========================
+
+Pooled keep-alive client for the Go bridge's REST API (/api/send,
+/api/download, ...).
+
+Every bridge call used to go through module-level `requests.post`, which
+opens a new TCP connection per request and (mostly) had no timeout. This
+module keeps one client per bridge URL:
+
+- `BridgeClient` (sync): a `requests.Session` whose connection pool holds
+  at most BRIDGE_MAX_CONNECTIONS keep-alive connections; extra callers wait
+  for a free connection instead of opening more
+- `AsyncBridgeClient` (asyncio): an `httpx.AsyncClient` with the same
+  limits, one per event loop
+- Separate connect / read timeouts (BRIDGE_CONNECT_TIMEOUT,
+  BRIDGE_READ_TIMEOUT), overridable per call
+- `download_many()` on both fetches a batch of media concurrently
+  (BRIDGE_DOWNLOAD_CONCURRENCY in flight) over those few connections
+
+The bridge URL comes from WHATSAPP_API_URL (as set in docker-compose),
+defaulting to http://localhost:8080.
+
+Usage:
+    client = get_bridge_client()
+    success, response = client.send({'recipient': jid, 'message': text})
+    path, error = client.download(message_id, chat_jid)
+    paths = client.download_many([(message_id, chat_jid), ...])
+
+    client = get_async_bridge_client()
+    paths = await client.download_many([(message_id, chat_jid), ...])
+"""
+
+import os
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+BRIDGE_URL = os.getenv('WHATSAPP_API_URL', 'http://localhost:8080').rstrip('/')
+BRIDGE_CONNECT_TIMEOUT = float(os.getenv('BRIDGE_CONNECT_TIMEOUT', '5'))
+BRIDGE_READ_TIMEOUT = float(os.getenv('BRIDGE_READ_TIMEOUT', '60'))
+BRIDGE_MAX_CONNECTIONS = int(os.getenv('BRIDGE_MAX_CONNECTIONS', '4'))
+BRIDGE_DOWNLOAD_CONCURRENCY = int(os.getenv('BRIDGE_DOWNLOAD_CONCURRENCY', '8'))
+
+def _send_result(status_code: int, text: str, result: Optional[Dict]) -> Tuple[bool, str]:
+    if status_code != 200:
+        return False, f"Error: HTTP {status_code} - {text}"
+    if result is None:
+        return False, f"Error parsing response: {text}"
+    return result.get("success", False), result.get("message", "Unknown response")
+
+def _download_result(status_code: int, text: str, result: Optional[Dict]) -> Tuple[Optional[str], str]:
+    if status_code != 200:
+        return None, f"Error: HTTP {status_code} - {text}"
+    if result is None:
+        return None, f"Error parsing response: {text}"
+    if not result.get("success", False):
+        return None, f"Download failed: {result.get('message', 'Unknown error')}"
+    return result.get("path") or result.get("file_path"), result.get("message", "")
+
+class BridgeClient:
+    """Sync bridge client over a pooled keep-alive requests.Session."""
+
+    def __init__(self, base_url: str = BRIDGE_URL, max_connections: int = BRIDGE_MAX_CONNECTIONS,
+                 connect_timeout: float = BRIDGE_CONNECT_TIMEOUT, read_timeout: float = BRIDGE_READ_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # pool_block: wait for a free connection rather than open extra ones
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, endpoint: str) -> str:
+        return f"{self.base_url}/api/{endpoint.lstrip('/')}"
+
+    def request(self, method: str, endpoint: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        """Raw request to /api/<endpoint>; raises requests.RequestException."""
+        timeout = (self.timeout[0], timeout) if timeout else self.timeout
+        return self.session.request(method, self.url(endpoint), timeout=timeout, **kwargs)
+
+    def post_json(self, endpoint: str, payload: Dict,
+                  timeout: Optional[float] = None) -> Tuple[int, str, Optional[Dict]]:
+        """POST JSON. Returns (status code, body text, parsed JSON or None)."""
+        response = self.request('POST', endpoint, json=payload, timeout=timeout)
+        try:
+            result = response.json()
+        except ValueError:
+            result = None
+        return response.status_code, response.text, result
+
+    def send(self, payload: Dict, timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """POST /api/send. Returns (success, response message)."""
+        try:
+            return _send_result(*self.post_json('send', payload, timeout))
+        except requests.RequestException as e:
+            return False, f"Request error: {str(e)}"
+
+    def download(self, message_id: str, chat_jid: str,
+                 timeout: Optional[float] = None) -> Tuple[Optional[str], str]:
+        """POST /api/download. Returns (local path or None, message)."""
+        try:
+            return _download_result(*self.post_json(
+                'download', {"message_id": message_id, "chat_jid": chat_jid}, timeout
+            ))
+        except requests.RequestException as e:
+            return None, f"Request error: {str(e)}"
+
+    def download_many(self, items: Iterable[Tuple[str, str]],
+                      concurrency: int = BRIDGE_DOWNLOAD_CONCURRENCY) -> List[Optional[str]]:
+        """Download (message_id, chat_jid) pairs concurrently. Paths in input order (None on failure)."""
+        items = list(items)
+        if not items:
+            return []
+
+        def fetch(item):
+            path, error = self.download(*item)
+            if path is None:
+                logger.warning(f"⚠️  Media {item[0]}: {error}")
+            return path
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as executor:
+            return list(executor.map(fetch, items))
+
+    def close(self):
+        self.session.close()
+
+class AsyncBridgeClient:
+    """asyncio bridge client over a pooled keep-alive httpx.AsyncClient."""
+
+    def __init__(self, base_url: str = BRIDGE_URL, max_connections: int = BRIDGE_MAX_CONNECTIONS,
+                 connect_timeout: float = BRIDGE_CONNECT_TIMEOUT, read_timeout: float = BRIDGE_READ_TIMEOUT):
+        import httpx
+        self._httpx = httpx
+        self.base_url = base_url.rstrip('/')
+        self.client = httpx.AsyncClient(
+            base_url=f"{self.base_url}/api/",
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    async def request(self, method: str, endpoint: str, timeout: Optional[float] = None, **kwargs):
+        """Raw request to /api/<endpoint>; raises httpx.HTTPError."""
+        if timeout:
+            kwargs['timeout'] = self._httpx.Timeout(timeout, connect=self.client.timeout.connect)
+        return await self.client.request(method, endpoint.lstrip('/'), **kwargs)
+
+    async def post_json(self, endpoint: str, payload: Dict,
+                        timeout: Optional[float] = None) -> Tuple[int, str, Optional[Dict]]:
+        """POST JSON. Returns (status code, body text, parsed JSON or None)."""
+        response = await self.request('POST', endpoint, json=payload, timeout=timeout)
+        try:
+            result = response.json()
+        except ValueError:
+            result = None
+        return response.status_code, response.text, result
+
+    async def send(self, payload: Dict, timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """POST /api/send. Returns (success, response message)."""
+        try:
+            return _send_result(*await self.post_json('send', payload, timeout))
+        except self._httpx.HTTPError as e:
+            return False, f"Request error: {str(e)}"
+
+    async def download(self, message_id: str, chat_jid: str,
+                       timeout: Optional[float] = None) -> Tuple[Optional[str], str]:
+        """POST /api/download. Returns (local path or None, message)."""
+        try:
+            return _download_result(*await self.post_json(
+                'download', {"message_id": message_id, "chat_jid": chat_jid}, timeout
+            ))
+        except self._httpx.HTTPError as e:
+            return None, f"Request error: {str(e)}"
+
+    async def download_many(self, items: Iterable[Tuple[str, str]],
+                            concurrency: int = BRIDGE_DOWNLOAD_CONCURRENCY) -> List[Optional[str]]:
+        """Download (message_id, chat_jid) pairs concurrently. Paths in input order (None on failure)."""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(item):
+            async with semaphore:
+                path, error = await self.download(*item)
+            if path is None:
+                logger.warning(f"⚠️  Media {item[0]}: {error}")
+            return path
+
+        return list(await asyncio.gather(*(fetch(item) for item in items)))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+_clients: Dict[str, BridgeClient] = {}
+_async_clients: Dict[Tuple[str, int], AsyncBridgeClient] = {}
+_clients_lock = threading.Lock()
+
+def get_bridge_client(base_url: Optional[str] = None) -> BridgeClient:
+    """Get the shared sync client for a bridge URL (default WHATSAPP_API_URL)."""
+    key = (base_url or BRIDGE_URL).rstrip('/')
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = BridgeClient(key)
+            _clients[key] = client
+    return client
+
+def get_async_bridge_client(base_url: Optional[str] = None) -> AsyncBridgeClient:
+    """Get the shared async client for a bridge URL on the running event loop."""
+    key = ((base_url or BRIDGE_URL).rstrip('/'), id(asyncio.get_running_loop()))
+    with _clients_lock:
+        client = _async_clients.get(key)
+        if client is None:
+            client = AsyncBridgeClient(key[0])
+            _async_clients[key] = client
+    return client
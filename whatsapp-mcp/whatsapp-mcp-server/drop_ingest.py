@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Batched Drop Ingestion
+======================
+
+Writes a batch of new drops to Neon - one `installations` row and one
+`qa_photo_reviews` row per drop - in a single transaction with two set-based
+statements, instead of an INSERT (plus a SELECT/INSERT on a second
+connection for the QA review) per drop.
+
+- `unnest` over parallel arrays: two round trips regardless of batch size
+- `ON CONFLICT DO NOTHING` on installations(drop_number) and
+  qa_photo_reviews(drop_number, review_date): drops that already exist are
+  reported, not errors
+- If the batch statement fails (e.g. one bad value), the batch is replayed
+  drop by drop under savepoints so the good drops still land
+- Returns a per-drop outcome: INSERTED, EXISTS or FAILED
+
+Used by realtime_drop_monitor, robust_drop_monitor and sync_drops_to_neon.
+
+Usage:
+    with pg_pool.connect(NEON_DB_URL) as conn:
+        outcomes = ingest_drops(conn, drops)
+    new = [d for d, outcome in outcomes.items() if outcome == INSERTED]
+
+Each drop is a dict with drop_number, contractor_name, address, timestamp and
+optionally project_name and agent_notes.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+INSERTED = 'inserted'
+EXISTS = 'exists'
+FAILED = 'failed'
+
+INSERT_INSTALLATIONS = """
+    INSERT INTO installations (
+        drop_number, contractor_name, address, status,
+        agent_notes, project_name, date_submitted
+    )
+    SELECT d.drop_number, d.contractor_name, d.address, 'submitted',
+           d.agent_notes, d.project_name, COALESCE(d.date_submitted, NOW())
+    FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::timestamptz[])
+         AS d(drop_number, contractor_name, address, agent_notes, project_name, date_submitted)
+    ON CONFLICT (drop_number) DO NOTHING
+    RETURNING drop_number
+"""
+
+INSERT_QA_REVIEWS = """
+    INSERT INTO qa_photo_reviews (
+        drop_number, review_date, user_name, project,
+        step_01_property_frontage, step_02_location_before_install,
+        step_03_outside_cable_span, step_04_home_entry_outside,
+        step_05_home_entry_inside, step_06_fibre_entry_to_ont,
+        step_07_patched_labelled_drop, step_08_work_area_completion,
+        step_09_ont_barcode_scan, step_10_ups_serial_number,
+        step_11_powermeter_reading, step_12_powermeter_at_ont,
+        step_13_active_broadband_light, step_14_customer_signature,
+        outstanding_photos_loaded_to_1map,
+        comment
+    )
+    SELECT r.drop_number, CURRENT_DATE, r.user_name, r.project,
+           FALSE, FALSE, FALSE, FALSE, FALSE, FALSE, FALSE,
+           FALSE, FALSE, FALSE, FALSE, FALSE, FALSE, FALSE,
+           FALSE,
+           r.comment
+    FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[])
+         AS r(drop_number, user_name, project, comment)
+    ON CONFLICT (drop_number, review_date) DO NOTHING
+"""
+
+def review_user_name(contractor_name: str) -> str:
+    """QA review user name: contractor without the WhatsApp- prefix, max 20 chars."""
+    contractor_name = contractor_name or ''
+    if contractor_name.startswith('WhatsApp-'):
+        contractor_name = contractor_name.replace('WhatsApp-', '')
+    return contractor_name[:20]
+
+def _submitted_at(timestamp) -> Optional[datetime]:
+    if isinstance(timestamp, datetime):
+        return timestamp
+    try:
+        return datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+
+def _insert_batch(cursor, drops: List[Dict], create_reviews: bool) -> List[str]:
+    """Insert one batch; returns the drop numbers whose installation row was created."""
+    cursor.execute(INSERT_INSTALLATIONS, (
+        [d['drop_number'] for d in drops],
+        [d.get('contractor_name') for d in drops],
+        [d.get('address') for d in drops],
+        [d.get('agent_notes') for d in drops],
+        [d.get('project_name', 'Unknown') for d in drops],
+        [_submitted_at(d.get('timestamp')) for d in drops],
+    ))
+    inserted = {row[0] for row in cursor.fetchall()}
+
+    new_drops = [d for d in drops if d['drop_number'] in inserted]
+    if create_reviews and new_drops:
+        comment = f"Auto-created from WhatsApp drop detection on {datetime.now().isoformat()}"
+        cursor.execute(INSERT_QA_REVIEWS, (
+            [d['drop_number'] for d in new_drops],
+            [review_user_name(d.get('contractor_name')) for d in new_drops],
+            [d.get('project_name', 'Unknown') for d in new_drops],
+            [comment] * len(new_drops),
+        ))
+    return [d['drop_number'] for d in new_drops]
+
+def ingest_drops(conn, drops: List[Dict], create_reviews: bool = True) -> Dict[str, str]:
+    """Insert drops (and their QA reviews) in one transaction.
+
+    Args:
+        conn: psycopg2 (or pg_pool) connection; committed on return
+        drops: Drop dicts, see module docstring. Repeated drop numbers are
+            ingested once (first occurrence wins)
+        create_reviews: Also create today's qa_photo_reviews row for each new drop
+
+    Returns:
+        Dict mapping drop_number to INSERTED, EXISTS or FAILED, in input order
+    """
+    unique: Dict[str, Dict] = {}
+    for drop in drops:
+        unique.setdefault(drop['drop_number'], drop)
+    if not unique:
+        return {}
+    batch = list(unique.values())
+
+    cursor = conn.cursor()
+    try:
+        inserted = set(_insert_batch(cursor, batch, create_reviews))
+        conn.commit()
+        outcomes = {d: INSERTED if d in inserted else EXISTS for d in unique}
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.warning(f"⚠️  Batch insert of {len(batch)} drops failed ({e}) - retrying one by one")
+        outcomes = {}
+        for drop in batch:
+            drop_number = drop['drop_number']
+            try:
+                cursor.execute("SAVEPOINT ingest_drop")
+                outcomes[drop_number] = INSERTED if _insert_batch(cursor, [drop], create_reviews) else EXISTS
+                cursor.execute("RELEASE SAVEPOINT ingest_drop")
+            except psycopg2.Error as drop_error:
+                cursor.execute("ROLLBACK TO SAVEPOINT ingest_drop")
+                outcomes[drop_number] = FAILED
+                logger.error(f"❌ Error inserting {drop_number}: {drop_error}")
+        conn.commit()
+    finally:
+        cursor.close()
+
+    counts = {outcome: sum(1 for o in outcomes.values() if o == outcome) for outcome in (INSERTED, EXISTS, FAILED)}
+    logger.info(f"📥 Ingested {len(batch)} drops: {counts[INSERTED]} new, "
+                f"{counts[EXISTS]} already existed, {counts[FAILED]} failed")
+    return outcomes
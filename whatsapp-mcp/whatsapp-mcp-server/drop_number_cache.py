@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Known Drop Numbers Cache
+========================
+
+In-memory set of the DR numbers already in Neon's `installations` table, so
+"is this drop new or a resubmission?" is a local set lookup instead of pulling
+every drop number over the network each time new drops show up.
+
+- Loaded once with a full query, then kept fresh incrementally with
+  `WHERE id > <highest id seen> - DROP_CACHE_ID_OVERLAP`. installations.id
+  is a SERIAL, handed out when a transaction inserts, not when it commits:
+  a row committed after one with a higher id would be skipped by a plain
+  `id > max`, so each refresh re-reads the last DROP_CACHE_ID_OVERLAP ids
+- Refreshed at most every DROP_CACHE_REFRESH_SECONDS; membership checks
+  between refreshes never touch the network
+- A full reload every DROP_CACHE_FULL_RELOAD_SECONDS picks up deletions
+- Drops we insert ourselves are added immediately via add()
+- Optional JSON snapshot (DROP_CACHE_PATH) so a restart only needs the
+  incremental query
+- If Neon is unreachable the last known set is kept
+
+Usage:
+    from drop_number_cache import get_known_drop_numbers
+    known = get_known_drop_numbers(NEON_DB_URL)
+    if drop_number in known: ...
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+import pg_pool
+
+logger = logging.getLogger(__name__)
+
+DROP_CACHE_REFRESH_SECONDS = int(os.getenv('DROP_CACHE_REFRESH_SECONDS', '30'))
+DROP_CACHE_FULL_RELOAD_SECONDS = int(os.getenv('DROP_CACHE_FULL_RELOAD_SECONDS', '3600'))
+DROP_CACHE_PATH = os.getenv('DROP_CACHE_PATH')
+# Ids below the highest seen that are re-read on each refresh (slower, out-of-order commits)
+DROP_CACHE_ID_OVERLAP = int(os.getenv('DROP_CACHE_ID_OVERLAP', '200'))
+
+class KnownDropNumbers:
+    """Set-like view of the drop numbers in installations, refreshed incrementally."""
+
+    def __init__(self, db_url: str, cache_path: Optional[str] = DROP_CACHE_PATH):
+        self.db_url = db_url
+        self.cache_path = cache_path
+        self._drops: Set[str] = set()
+        self._max_id = 0
+        self._last_refresh = 0.0
+        self._last_full_reload = 0.0
+        self._lock = threading.Lock()
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                snapshot = json.load(f)
+            self._drops = set(snapshot['drop_numbers'])
+            self._max_id = snapshot['max_id']
+            # Snapshot is trusted until the next scheduled full reload
+            self._last_full_reload = time.monotonic()
+            logger.info(f"📂 Loaded {len(self._drops)} known drop numbers from {self.cache_path}")
+        except Exception as e:
+            logger.warning(f"⚠️  Could not load drop number cache: {e}")
+
+    def _save_snapshot(self):
+        if not self.cache_path:
+            return
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'max_id': self._max_id, 'drop_numbers': sorted(self._drops)}, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not save drop number cache: {e}")
+
+    def refresh(self, full: bool = False) -> bool:
+        """Pull new drop numbers from Neon (or reload everything). Returns success."""
+        with self._lock:
+            full = full or self._max_id == 0 or \
+                time.monotonic() - self._last_full_reload >= DROP_CACHE_FULL_RELOAD_SECONDS
+            try:
+                conn = pg_pool.connect(self.db_url)
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        SELECT id, drop_number FROM installations
+                        WHERE drop_number LIKE 'DR%%' AND id > %s
+                        ORDER BY id
+                    """, (0 if full else max(0, self._max_id - DROP_CACHE_ID_OVERLAP),))
+                    rows = cursor.fetchall()
+                    cursor.close()
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.error(f"Error refreshing known drop numbers from Neon: {e}")
+                return False
+
+            if full:
+                self._drops = {drop for _, drop in rows}
+                self._max_id = rows[-1][0] if rows else 0
+                self._last_full_reload = time.monotonic()
+                logger.info(f"🔄 Loaded {len(self._drops)} known drop numbers from Neon")
+            else:
+                new_drops = {drop for _, drop in rows} - self._drops
+                self._drops.update(new_drops)
+                self._max_id = max([self._max_id] + [row_id for row_id, _ in rows])
+                if new_drops:
+                    logger.debug(f"🔄 {len(new_drops)} new drop numbers in Neon")
+
+            self._last_refresh = time.monotonic()
+            if full or new_drops:
+                self._save_snapshot()
+            return True
+
+    def refresh_if_stale(self):
+        """Refresh only if the last refresh is older than DROP_CACHE_REFRESH_SECONDS."""
+        if time.monotonic() - self._last_refresh >= DROP_CACHE_REFRESH_SECONDS:
+            self.refresh()
+
+    def add(self, drop_numbers: Iterable[str]):
+        """Record drops we just inserted so they count as known immediately."""
+        with self._lock:
+            self._drops.update(drop_numbers)
+
+    def __contains__(self, drop_number: str) -> bool:
+        return drop_number in self._drops
+
+    def __len__(self) -> int:
+        return len(self._drops)
+
+    def __iter__(self):
+        return iter(set(self._drops))
+
+_caches: Dict[str, KnownDropNumbers] = {}
+_caches_lock = threading.Lock()
+
+def get_known_drop_numbers(db_url: str) -> KnownDropNumbers:
+    """Get the process-wide cache for db_url, refreshed if stale."""
+    with _caches_lock:
+        cache = _caches.get(db_url)
+        if cache is None:
+            cache = KnownDropNumbers(db_url)
+            _caches[db_url] = cache
+    cache.refresh_if_stale()
+    return cache
@@ -15,7 +15,6 @@ import os
 import time
 import logging
 import sys
-import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import argparse
@@ -23,7 +22,8 @@ import argparse
 # Google Sheets imports
 try:
     from google.oauth2.service_account import Credentials
-    from googleapiclient.discovery import build
+    # Availability probe only - services are built with sheets_quota.build_sheets_service()
+    import googleapiclient.discovery
     GOOGLE_AVAILABLE = True
 except ImportError:
     GOOGLE_AVAILABLE = False
@@ -33,6 +33,10 @@ except ImportError:
 
 import psycopg2
 import whatsapp
+from message_index import latest_drop_mention
+from sheets_mirror import read_tab
+from sheets_quota import build_sheets_service
+from qa_steps import QAState
 
 # Set up logging
 logging.basicConfig(
@@ -77,24 +81,6 @@ SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 GSHEET_ID = os.getenv("GSHEET_ID", "1TYxDLyCqDHr0Imb5j7X4uJhxccgJTO0KrDVAD0Ja0Dk")
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
 
-# QA Steps for feedback
-QA_STEPS = {
-    'step_01_property_frontage': '1. Property Frontage Photo',
-    'step_02_location_before_install': '2. Location Before Installation',
-    'step_03_outside_cable_span': '3. Outside Cable Span',
-    'step_04_home_entry_outside': '4. Home Entry Outside',
-    'step_05_home_entry_inside': '5. Home Entry Inside',
-    'step_06_fibre_entry_to_ont': '6. Fibre Entry to ONT',
-    'step_07_patched_labelled_drop': '7. Patched & Labelled Drop',
-    'step_08_work_area_completion': '8. Work Area Completion',
-    'step_09_ont_barcode_scan': '9. ONT Barcode Scan',
-    'step_10_ups_serial_number': '10. UPS Serial Number',
-    'step_11_powermeter_reading': '11. Power Meter Reading',
-    'step_12_powermeter_at_ont': '12. Power Meter at ONT',
-    'step_13_active_broadband_light': '13. Active Broadband Light',
-    'step_14_customer_signature': '14. Customer Signature'
-}
-
 def get_enabled_groups() -> Dict[str, Dict]:
     """Get only enabled groups for monitoring"""
     enabled = {name: config for name, config in GROUP_CONFIG.items() if config['enabled']}
@@ -107,7 +93,7 @@ def get_sheets_service():
         credentials = Credentials.from_service_account_file(
             GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
         )
-        return build("sheets", "v4", credentials=credentials, cache_discovery=False)
+        return build_sheets_service(credentials)
     except Exception as e:
         logger.error(f"Failed to create Google Sheets service: {e}")
         return None
@@ -121,26 +107,12 @@ def get_drop_original_message(drop_number: str, group_jid: str) -> Optional[str]
             logger.warning(f"WhatsApp database not found: {whatsapp_db}")
             return None
         
-        conn = sqlite3.connect(whatsapp_db)
-        cursor = conn.cursor()
-        
-        # Search for the drop number in messages
-        cursor.execute("""
-            SELECT id, content, sender, timestamp 
-            FROM messages 
-            WHERE chat_jid = ? 
-            AND content LIKE ? 
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        """, (group_jid, f'%{drop_number}%'))
+        # Indexed lookup of the latest message mentioning this drop
+        mention = latest_drop_mention(whatsapp_db, drop_number, [group_jid])
         
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if result:
-            message_id, content, sender, timestamp = result
-            logger.info(f"📱 Found original message for {drop_number}: ID={message_id}, sender={sender}")
+        if mention:
+            message_id = mention['message_id']
+            logger.info(f"📱 Found original message for {drop_number}: ID={message_id}, sender={mention['sender']}")
             return message_id
         else:
             logger.warning(f"⚠️ Original message not found for {drop_number} in {group_jid}")
@@ -198,10 +170,10 @@ def send_reply_to_sender(drop_number: str, group_jid: str, message: str, dry_run
             "reply_to": original_message_id  # This makes it a REPLY
         }
         
-        success, response = whatsapp.send_message_reply(group_jid, message, original_message_id)
+        success, response = whatsapp.queue_message(group_jid, message, reply_to=original_message_id)
         
         if success:
-            logger.info(f"✅ REPLY sent for {drop_number}")
+            logger.info(f"✅ REPLY queued for {drop_number}")
             return True
         else:
             logger.error(f"❌ Failed to send reply for {drop_number}: {response}")
@@ -220,10 +192,10 @@ def send_group_message(group_jid: str, message: str, dry_run: bool = False) -> b
             logger.info(f"🔍 DRY RUN: Would send group message to {group_jid}")
             return True
             
-        success, response = whatsapp.send_message(group_jid, message)
+        success, response = whatsapp.queue_message(group_jid, message)
         
         if success:
-            logger.info(f"✅ Group message sent")
+            logger.info(f"✅ Group message queued")
             return True
         else:
             logger.error(f"❌ Failed to send group message: {response}")
@@ -234,18 +206,9 @@ def send_group_message(group_jid: str, message: str, dry_run: bool = False) -> b
         return False
 
 def get_sheet_data(sheet_name: str) -> List[List]:
-    """Get data from specific Google Sheet"""
+    """Get data from specific Google Sheet (local mirror, refreshed when stale)"""
     try:
-        service = get_sheets_service()
-        if not service:
-            return []
-            
-        result = service.spreadsheets().values().get(
-            spreadsheetId=GSHEET_ID,
-            range=f"{sheet_name}!A:X"
-        ).execute()
-        
-        return result.get('values', [])
+        return read_tab(sheet_name)
         
     except Exception as e:
         logger.error(f"Error reading {sheet_name} sheet: {e}")
@@ -269,22 +232,7 @@ def parse_sheet_row(row: List, row_number: int) -> Optional[Dict]:
         return {
             'row_number': row_number,
             'drop_number': drop_number,
-            'qa_steps': {
-                'step_01_property_frontage': row[2].lower() == 'true',
-                'step_02_location_before_install': row[3].lower() == 'true',
-                'step_03_outside_cable_span': row[4].lower() == 'true',
-                'step_04_home_entry_outside': row[5].lower() == 'true',
-                'step_05_home_entry_inside': row[6].lower() == 'true',
-                'step_06_fibre_entry_to_ont': row[7].lower() == 'true',
-                'step_07_patched_labelled_drop': row[8].lower() == 'true',
-                'step_08_work_area_completion': row[9].lower() == 'true',
-                'step_09_ont_barcode_scan': row[10].lower() == 'true',
-                'step_10_ups_serial_number': row[11].lower() == 'true',
-                'step_11_powermeter_reading': row[12].lower() == 'true',
-                'step_12_powermeter_at_ont': row[13].lower() == 'true',
-                'step_13_active_broadband_light': row[14].lower() == 'true',
-                'step_14_customer_signature': row[15].lower() == 'true',
-            },
+            'qa_steps': QAState.from_cells(row[2:16]),  # Columns C-P
             'user': row[18] if len(row) > 18 else '',
             'incomplete': row[21].lower() == 'true' if len(row) > 21 else False,
             'completed': row[23].lower() == 'true' if len(row) > 23 else False,
@@ -294,14 +242,11 @@ def parse_sheet_row(row: List, row_number: int) -> Optional[Dict]:
         logger.error(f"Error parsing row {row_number}: {e}")
         return None
 
-def get_missing_steps(qa_steps: Dict[str, bool]) -> List[str]:
+def get_missing_steps(qa_steps) -> List[str]:
     """Get list of missing QA steps"""
-    missing = []
-    for step_key, is_complete in qa_steps.items():
-        if not is_complete:
-            step_description = QA_STEPS.get(step_key, step_key)
-            missing.append(step_description)
-    return missing
+    if not isinstance(qa_steps, int):
+        qa_steps = QAState.from_dict(qa_steps)
+    return list(QAState(qa_steps).missing_labels())
 
 def monitor_qa_feedback(dry_run: bool = False, check_interval: int = 60):
     """Main monitoring loop with REPLY functionality"""
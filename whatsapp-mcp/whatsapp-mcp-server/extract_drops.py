@@ -5,10 +5,10 @@ Usage: uv run python extract_drops.py [--days N] [--today] [--csv]
 """
 
 import argparse
-import re
 import json
 from datetime import datetime, timedelta
-from whatsapp import list_messages
+from whatsapp import MESSAGES_DB_PATH, resolve_sender_names
+from message_index import get_drop_mentions
 
 # Lawley Activation 3 group JID
 LAWLEY_GROUP_JID = '120363418298130331@g.us'
@@ -20,49 +20,40 @@ def extract_drop_numbers(days=7, today_only=False, output_format='text'):
     
     # Set date filter
     if today_only:
-        after_date = datetime.now().date().isoformat()
-        print(f"Filter: Today only ({after_date})")
+        after_date = datetime.combine(datetime.now().date(), datetime.min.time())
+        print(f"Filter: Today only ({after_date.date().isoformat()})")
     else:
-        after_date = (datetime.now() - timedelta(days=days)).isoformat()
-        print(f"Filter: Last {days} days (since {after_date})")
+        after_date = datetime.now() - timedelta(days=days)
+        print(f"Filter: Last {days} days (since {after_date.isoformat()})")
     
-    # Get messages containing DR
-    messages = list_messages(
-        chat_jid=LAWLEY_GROUP_JID, 
-        query='DR', 
-        after=after_date, 
-        limit=200
+    # Indexed lookup of every drop mention in the group, newest first
+    mentions = get_drop_mentions(
+        MESSAGES_DB_PATH,
+        chat_jids=[LAWLEY_GROUP_JID],
+        since=after_date,
+        newest_first=True,
+        with_content=True
     )
+    sender_names = resolve_sender_names([m['sender'] for m in mentions])
     
-    # Extract drop numbers using regex
-    drop_pattern = r'DR\d+'
     found_drops = {}  # Use dict to store drop with latest timestamp
     
-    # Split the messages string by lines and process each line
-    message_lines = messages.split('\n')
-    
-    for line in message_lines:
-        # Find all drop numbers in this line
-        drops_in_line = re.findall(drop_pattern, line, re.IGNORECASE)
+    for mention in mentions:
+        drop_upper = mention['drop_number']
         
-        for drop in drops_in_line:
-            drop_upper = drop.upper()
-            
-            # Extract timestamp and sender info
-            timestamp_match = re.search(r'\[([\d\-\s:]+)\]', line)
-            sender_match = re.search(r'From:\s*([^:]+):', line)
-            
-            timestamp = timestamp_match.group(1) if timestamp_match else 'Unknown time'
-            sender = sender_match.group(1) if sender_match else 'Unknown sender'
-            
-            # Keep the latest occurrence of each drop number
-            if drop_upper not in found_drops or timestamp > found_drops[drop_upper]['timestamp']:
-                found_drops[drop_upper] = {
-                    'drop': drop_upper,
-                    'timestamp': timestamp,
-                    'sender': sender,
-                    'full_line': line.strip()
-                }
+        # Keep the latest occurrence of each drop number
+        if drop_upper in found_drops:
+            continue
+        
+        timestamp = f"{mention['timestamp']:%Y-%m-%d %H:%M:%S}" if mention['timestamp'] else 'Unknown time'
+        sender = sender_names.get(mention['sender']) or 'Unknown sender'
+        
+        found_drops[drop_upper] = {
+            'drop': drop_upper,
+            'timestamp': timestamp,
+            'sender': sender,
+            'full_line': f"[{timestamp}] From: {sender}: {mention['content']}".strip()
+        }
     
     # Sort drops by timestamp (most recent first)
     sorted_drops = sorted(found_drops.values(), key=lambda x: x['timestamp'], reverse=True)
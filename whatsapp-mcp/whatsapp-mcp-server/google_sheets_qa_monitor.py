@@ -6,14 +6,27 @@ Google Sheets QA Monitor - Watches for "Incomplete" checkbox changes
 Monitors the Google Sheets "Velo Test" tab for when the "Incomplete" 
 checkbox (column V) is ticked and triggers QA feedback communication 
 to the WhatsApp group.
+
+Each poll is incremental:
+- the spreadsheet's Drive version is checked first and the poll is skipped
+  if nothing changed (forced re-read every QA_FORCE_POLL_SECONDS)
+- all tabs are read with one values.batchGet using UNFORMATTED_VALUE, so
+  checkboxes arrive as real booleans
+- a content hash per row means only rows that changed since the last poll
+  are parsed and acted on
+- every read is also written into the local sheet mirror (sheets_mirror.py)
+  that the other QA readers query instead of the Sheets API; a skipped
+  poll marks the mirror as current, since the sheet is known unchanged
 """
 
 import os
 import time
+import json
+import hashlib
 import logging
 import sys
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import argparse
 
 # Google Sheets imports
@@ -29,7 +42,9 @@ except ImportError:
 
 # Import existing QA feedback system
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-import psycopg2
+import pg_pool
+from sheets_mirror import MIRROR_COLUMNS, get_sheets_mirror
+from sheets_quota import build_sheets_service
 
 # Set up logger first for imported modules
 logging.basicConfig(
@@ -44,11 +59,16 @@ logger = logging.getLogger(__name__)
 
 from qa_feedback_communicator import (
     get_missing_steps, create_feedback_message, send_feedback_to_group, 
-    mark_feedback_sent, QA_STEPS, PROJECTS, NEON_DB_URL
+    PROJECTS, NEON_DB_URL
 )
+from qa_steps import QAState
 
 # Configuration
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    # Only used to read the spreadsheet's version for the cheap "anything changed?" check
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
 GSHEET_ID = os.getenv("GSHEET_ID")
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 # Support multiple sheet tabs
@@ -56,22 +76,56 @@ SHEET_NAMES = ["Velo Test", "Mohadin"]
 
 # State tracking
 MONITOR_STATE_FILE = 'google_sheets_qa_monitor_state.json'
+# Re-read the tabs at least this often even if the Drive version looks unchanged
+QA_FORCE_POLL_SECONDS = int(os.getenv('QA_FORCE_POLL_SECONDS', '600'))
+
+_credentials = None
+_drive_service = None
+_drive_disabled_reason: Optional[str] = None
 
 def setup_logging():
     """Set up logging configuration (already done at module level)"""
     return logger
 
+def get_credentials():
+    """Service account credentials (loaded once)"""
+    global _credentials
+    if _credentials is None:
+        _credentials = Credentials.from_service_account_file(
+            GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
+        )
+    return _credentials
+
 def get_sheets_service():
     """Get Google Sheets service connection"""
     try:
-        credentials = Credentials.from_service_account_file(
-            GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
-        )
-        return build("sheets", "v4", credentials=credentials, cache_discovery=False)
+        return build_sheets_service(get_credentials())
     except Exception as e:
         logger.error(f"Failed to create Google Sheets service: {e}")
         return None
 
+def get_spreadsheet_version() -> Optional[str]:
+    """Drive version of the spreadsheet - changes whenever any cell is edited.
+    
+    Returns None if it can't be read (Drive API not enabled for the project,
+    missing scope, ...), in which case every poll reads the tabs. The first
+    failure turns the check off for the rest of the run.
+    """
+    global _drive_service, _drive_disabled_reason
+    if _drive_disabled_reason:
+        return None
+    try:
+        if _drive_service is None:
+            _drive_service = build("drive", "v3", credentials=get_credentials(), cache_discovery=False)
+        metadata = _drive_service.files().get(
+            fileId=GSHEET_ID, fields="version", supportsAllDrives=True
+        ).execute()
+        return metadata.get('version')
+    except Exception as e:
+        _drive_disabled_reason = str(e)
+        logger.warning(f"⚠️  Could not read spreadsheet version ({e}) - reading all tabs every poll")
+        return None
+
 def check_environment():
     """Check if all required environment variables are set"""
     if not GSHEET_ID:
@@ -84,52 +138,68 @@ def check_environment():
         raise FileNotFoundError(f"Credentials file not found: {GOOGLE_APPLICATION_CREDENTIALS}")
 
 def get_sheet_data(sheet_name=None):
-    """Get all data from the specified sheet (or all sheets if None)"""
+    """Get all data from the specified sheet (or all sheets if None) in one batchGet"""
     try:
         service = get_sheets_service()
         if not service:
             return None
-            
-        if sheet_name:
-            # Get data from specific sheet
-            result = service.spreadsheets().values().get(
-                spreadsheetId=GSHEET_ID,
-                range=f"{sheet_name}!A:X"
-            ).execute()
-            
-            values = result.get('values', [])
-            return {sheet_name: values}
-        else:
-            # Get data from all monitored sheets
-            all_data = {}
-            for sheet in SHEET_NAMES:
-                try:
-                    result = service.spreadsheets().values().get(
-                        spreadsheetId=GSHEET_ID,
-                        range=f"{sheet}!A:X"
-                    ).execute()
-                    all_data[sheet] = result.get('values', [])
-                except Exception as e:
-                    logger.warning(f"Could not read {sheet} sheet: {e}")
-                    all_data[sheet] = []
-            return all_data
+        
+        sheet_names = [sheet_name] if sheet_name else SHEET_NAMES
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=GSHEET_ID,
+            ranges=[f"'{sheet}'!{MIRROR_COLUMNS}" for sheet in sheet_names],
+            valueRenderOption='UNFORMATTED_VALUE',
+            dateTimeRenderOption='FORMATTED_STRING'
+        ).execute()
+        
+        value_ranges = result.get('valueRanges', [])
+        data = {
+            sheet: (value_ranges[i].get('values', []) if i < len(value_ranges) else [])
+            for i, sheet in enumerate(sheet_names)
+        }
+        
+        # Keep the shared local mirror in sync with what we just read
+        try:
+            mirror = get_sheets_mirror()
+            for sheet, values in data.items():
+                mirror.apply_tab(sheet, values)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not update sheet mirror: {e}")
+        
+        return data
         
     except Exception as e:
         logger.error(f"Error reading sheet data: {e}")
         return None
 
+def _cell_bool(value) -> bool:
+    """Checkbox cell - native bool with UNFORMATTED_VALUE, 'TRUE'/'FALSE' text otherwise"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() == 'true'
+
+def _cell_int(value, default: int) -> int:
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value).strip()
+    return int(value) if value.isdigit() else default
+
+def _cell_str(value) -> str:
+    return '' if value is None else str(value)
+
 def parse_sheet_row(row: List, row_number: int) -> Optional[Dict]:
     """Parse a sheet row into a structured dictionary"""
     try:
         # Ensure row has enough columns - now up to column X
-        while len(row) < 24:  # Up to column X
-            row.append('')
+        row = list(row) + [''] * (24 - len(row))
         
         # Skip header rows and empty drop numbers
-        if row_number <= 2 or not row[1].strip():  # Column B is drop number
+        drop_number = _cell_str(row[1]).strip()  # Column B is drop number
+        if row_number <= 2 or not drop_number:
             return None
             
-        drop_number = row[1].strip()
         if not drop_number.startswith('DR'):
             return None
             
@@ -137,31 +207,16 @@ def parse_sheet_row(row: List, row_number: int) -> Optional[Dict]:
         parsed = {
             'row_number': row_number,
             'drop_number': drop_number,
-            'date': row[0] if len(row) > 0 else '',
-            'qa_steps': {
-                'step_01_property_frontage': row[2].lower() == 'true' if len(row) > 2 else False,
-                'step_02_location_before_install': row[3].lower() == 'true' if len(row) > 3 else False,
-                'step_03_outside_cable_span': row[4].lower() == 'true' if len(row) > 4 else False,
-                'step_04_home_entry_outside': row[5].lower() == 'true' if len(row) > 5 else False,
-                'step_05_home_entry_inside': row[6].lower() == 'true' if len(row) > 6 else False,
-                'step_06_fibre_entry_to_ont': row[7].lower() == 'true' if len(row) > 7 else False,
-                'step_07_patched_labelled_drop': row[8].lower() == 'true' if len(row) > 8 else False,
-                'step_08_work_area_completion': row[9].lower() == 'true' if len(row) > 9 else False,
-                'step_09_ont_barcode_scan': row[10].lower() == 'true' if len(row) > 10 else False,
-                'step_10_ups_serial_number': row[11].lower() == 'true' if len(row) > 11 else False,
-                'step_11_powermeter_reading': row[12].lower() == 'true' if len(row) > 12 else False,
-                'step_12_powermeter_at_ont': row[13].lower() == 'true' if len(row) > 13 else False,
-                'step_13_active_broadband_light': row[14].lower() == 'true' if len(row) > 14 else False,
-                'step_14_customer_signature': row[15].lower() == 'true' if len(row) > 15 else False,
-            },
-            'completed_photos': int(row[16]) if len(row) > 16 and row[16].isdigit() else 0,
-            'outstanding_photos': int(row[17]) if len(row) > 17 and row[17].isdigit() else 14,
-            'user': row[18] if len(row) > 18 else '',
-            'one_map_loaded': row[19] if len(row) > 19 else '',
-            'comment': row[20] if len(row) > 20 else '',
-            'incomplete': row[21].lower() == 'true' if len(row) > 21 else False,  # Column V
-            'resubmitted': row[22].lower() == 'true' if len(row) > 22 else False,  # Column W
-            'completed': row[23].lower() == 'true' if len(row) > 23 else False,  # Column X
+            'date': _cell_str(row[0]),
+            'qa_steps': QAState.from_cells(row[2:16]),  # Columns C-P
+            'completed_photos': _cell_int(row[16], 0),
+            'outstanding_photos': _cell_int(row[17], 14),
+            'user': _cell_str(row[18]),
+            'one_map_loaded': _cell_str(row[19]),
+            'comment': _cell_str(row[20]),
+            'incomplete': _cell_bool(row[21]),  # Column V
+            'resubmitted': _cell_bool(row[22]),  # Column W
+            'completed': _cell_bool(row[23]),  # Column X
         }
         
         return parsed
@@ -170,10 +225,54 @@ def parse_sheet_row(row: List, row_number: int) -> Optional[Dict]:
         logger.error(f"Error parsing row {row_number}: {e}")
         return None
 
+class SheetChangeTracker:
+    """Content hash per sheet row, so each poll only handles rows that changed"""
+    
+    def __init__(self):
+        self.row_hashes: Dict[str, Dict[int, str]] = {}
+        self.version: Optional[str] = None
+        self.last_full_read = 0.0
+    
+    def spreadsheet_unchanged(self) -> Tuple[bool, Optional[str]]:
+        """Cheap revision check. Returns (skip this poll, current version)."""
+        version = get_spreadsheet_version()
+        if version is None or self.version is None or version != self.version:
+            return False, version
+        if time.monotonic() - self.last_full_read >= QA_FORCE_POLL_SECONDS:
+            return False, version
+        return True, version
+    
+    def mark_read(self, version: Optional[str]):
+        self.version = version
+        self.last_full_read = time.monotonic()
+    
+    @staticmethod
+    def _hash(row: List) -> str:
+        return hashlib.sha1(json.dumps(row, default=str).encode()).hexdigest()
+    
+    def changed_rows(self, sheet_name: str, values: List[List]) -> List[Tuple[int, List]]:
+        """(row_number, row) for rows that are new or changed since the last call."""
+        hashes = self.row_hashes.setdefault(sheet_name, {})
+        changed = []
+        for row_index, row in enumerate(values):
+            row_number = row_index + 1
+            row_hash = self._hash(row)
+            if hashes.get(row_number) != row_hash:
+                hashes[row_number] = row_hash
+                changed.append((row_number, row))
+        # Rows deleted from the bottom of the tab
+        for row_number in [n for n in hashes if n > len(values)]:
+            del hashes[row_number]
+        return changed
+    
+    def forget(self, sheet_name: str, row_number: int):
+        """Make a row count as changed on the next poll (e.g. to retry it)."""
+        self.row_hashes.get(sheet_name, {}).pop(row_number, None)
+
 def sync_incomplete_to_neon(drop_number: str, incomplete: bool) -> bool:
     """Update the Neon database when incomplete status changes (optional)"""
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
+        conn = pg_pool.connect(NEON_DB_URL)
         cursor = conn.cursor()
         
         # Try to update qa_photo_reviews table if record exists
@@ -233,18 +332,9 @@ def trigger_qa_feedback(drop_data: Dict, dry_run: bool = False) -> bool:
         # Create feedback message
         message = create_feedback_message(drop_number, missing_steps, project_name, user)
         
-        # Send to appropriate project group
-        success = send_feedback_to_group(project_name, message, dry_run)
-        
-        if success and not dry_run:
-            # Try to mark as sent in Neon database if record exists
-            try:
-                mark_feedback_sent(drop_number)
-            except Exception as e:
-                current_logger.info(f"ℹ️  Could not mark feedback sent in Neon for {drop_number}: {e}")
-                # Continue - this is not critical for sheet-based workflow
-            
-        return success
+        # Send to appropriate project group - feedback_sent is set in Neon (if the
+        # drop has a record) once the message is delivered, not when it's queued
+        return send_feedback_to_group(project_name, message, dry_run, drop_number)
         
     except Exception as e:
         current_logger.error(f"❌ Error triggering QA feedback for {drop_data['drop_number']}: {e}")
@@ -262,30 +352,47 @@ def monitor_sheets_for_incomplete(dry_run: bool = False, check_interval: int = 6
     
     # Track previously processed incomplete flags
     processed_incomplete = set()
+    tracker = SheetChangeTracker()
     
     while True:
         try:
-            # Get current data from all sheets
+            # Cheap revision check - skip the poll if nobody edited the spreadsheet
+            unchanged, version = tracker.spreadsheet_unchanged()
+            if unchanged:
+                logger.debug("Spreadsheet unchanged since last poll")
+                # The mirror still matches the sheet - keep readers from refreshing it
+                try:
+                    get_sheets_mirror().touch(SHEET_NAMES)
+                except Exception as e:
+                    logger.warning(f"⚠️  Could not update sheet mirror: {e}")
+                time.sleep(check_interval)
+                continue
+            
+            # Get current data from all sheets (one batchGet)
             all_sheet_data = get_sheet_data()
             if not all_sheet_data:
                 logger.error("❌ Could not read sheet data")
                 time.sleep(check_interval)
                 continue
+            tracker.mark_read(version)
             
             # Process each sheet
-            total_incomplete_found = 0
-            total_feedback_sent = 0
+            incomplete_found = 0
+            feedback_sent = 0
+            changed_found = 0
             
             for sheet_name, sheet_data in all_sheet_data.items():
-                if not sheet_data:
+                # Only rows that changed since the last poll
+                changed_rows = tracker.changed_rows(sheet_name, sheet_data)
+                if not changed_rows:
                     continue
                     
-                logger.debug(f"Processing {sheet_name} sheet...")
-                incomplete_found = 0
-                feedback_sent = 0
+                logger.debug(f"Processing {len(changed_rows)} changed rows in {sheet_name} sheet...")
+                changed_found += len(changed_rows)
                 
-                for row_index, row in enumerate(sheet_data):
-                    parsed_row = parse_sheet_row(row, row_index + 1)
+                for row_number, row in changed_rows:
+                    row_index = row_number - 1
+                    parsed_row = parse_sheet_row(row, row_number)
                     if not parsed_row:
                         continue
                     
@@ -307,7 +414,7 @@ def monitor_sheets_for_incomplete(dry_run: bool = False, check_interval: int = 6
                         incomplete_found += 1
                         
                         if row_key not in processed_incomplete:
-                            logger.info(f"🚨 NEW INCOMPLETE: {drop_number} (Row {row_index + 1})")
+                            logger.info(f"🚨 NEW INCOMPLETE: {drop_number} (Row {row_number})")
                             
                             # Sync to Neon database (optional, won't block sheet processing)
                             sync_incomplete_to_neon(drop_number, True)
@@ -318,15 +425,21 @@ def monitor_sheets_for_incomplete(dry_run: bool = False, check_interval: int = 6
                                 processed_incomplete.add(row_key)
                             else:
                                 logger.error(f"❌ Failed to send feedback for {drop_number}")
+                                # Retry this row on the next poll
+                                tracker.forget(sheet_name, row_number)
+                                tracker.version = None
                     else:
                         # Remove from processed set if no longer incomplete
                         if row_key in processed_incomplete:
                             processed_incomplete.remove(row_key)
                             logger.info(f"✅ {drop_number} no longer incomplete")
             
+            if changed_found:
+                logger.debug(f"🔍 {changed_found} changed rows this poll")
+            
             # Log summary
             if incomplete_found > 0:
-                logger.info(f"📊 Found {incomplete_found} incomplete drops, sent {feedback_sent} feedback messages")
+                logger.info(f"📊 Found {incomplete_found} incomplete drops in changed rows, sent {feedback_sent} feedback messages")
             else:
                 logger.debug(f"✅ No incomplete drops found")
                 
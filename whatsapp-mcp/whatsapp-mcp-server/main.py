@@ -1,4 +1,8 @@
-from typing import List, Dict, Any, Optional
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 from mcp.server.fastmcp import FastMCP
 from whatsapp import (
     search_contacts as whatsapp_search_contacts,
@@ -9,27 +13,58 @@ from whatsapp import (
     get_contact_chats as whatsapp_get_contact_chats,
     get_last_interaction as whatsapp_get_last_interaction,
     get_message_context as whatsapp_get_message_context,
-    send_message as whatsapp_send_message,
-    send_file as whatsapp_send_file,
-    send_audio_message as whatsapp_audio_voice_message,
-    download_media as whatsapp_download_media
+    send_message_async as whatsapp_send_message_async,
+    send_file_async as whatsapp_send_file_async,
+    send_audio_message_async as whatsapp_audio_voice_message_async,
+    download_media_async as whatsapp_download_media_async
 )
 
+# Tools are async so parallel tool calls run in parallel: blocking SQLite reads
+# go to a bounded thread pool, bridge calls use the async bridge client.
+# Each kind of work has its own concurrency limit and timeout.
+MCP_DB_THREADS = int(os.getenv('MCP_DB_THREADS', '8'))
+TOOL_CONCURRENCY = {
+    'db': MCP_DB_THREADS,
+    'send': int(os.getenv('MCP_SEND_CONCURRENCY', '2')),
+    'download': int(os.getenv('MCP_DOWNLOAD_CONCURRENCY', '4')),
+}
+TOOL_TIMEOUTS = {
+    'db': float(os.getenv('MCP_DB_TIMEOUT', '30')),
+    'send': float(os.getenv('MCP_SEND_TIMEOUT', '60')),
+    'download': float(os.getenv('MCP_DOWNLOAD_TIMEOUT', '120')),
+}
+
+_db_executor = ThreadPoolExecutor(max_workers=MCP_DB_THREADS, thread_name_prefix='mcp-db')
+_tool_limits = {kind: asyncio.Semaphore(limit) for kind, limit in TOOL_CONCURRENCY.items()}
+
+async def _limited(kind: str, start: Callable[[], Awaitable]) -> Any:
+    """Run start() under the concurrency limit and timeout for this kind of work."""
+    async with _tool_limits[kind]:
+        try:
+            return await asyncio.wait_for(start(), TOOL_TIMEOUTS[kind])
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"WhatsApp {kind} call timed out after {TOOL_TIMEOUTS[kind]:g}s")
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking database call on the bounded thread pool."""
+    loop = asyncio.get_running_loop()
+    return await _limited('db', lambda: loop.run_in_executor(_db_executor, partial(fn, *args, **kwargs)))
+
 # Initialize FastMCP server
 mcp = FastMCP("whatsapp")
 
 @mcp.tool()
-def search_contacts(query: str) -> List[Dict[str, Any]]:
+async def search_contacts(query: str) -> List[Dict[str, Any]]:
     """Search WhatsApp contacts by name or phone number.
     
     Args:
         query: Search term to match against contact names or phone numbers
     """
-    contacts = whatsapp_search_contacts(query)
+    contacts = await run_blocking(whatsapp_search_contacts, query)
     return contacts
 
 @mcp.tool()
-def list_messages(
+async def list_messages(
     after: Optional[str] = None,
     before: Optional[str] = None,
     sender_phone_number: Optional[str] = None,
@@ -55,7 +90,8 @@ def list_messages(
         context_before: Number of messages to include before each match (default 1)
         context_after: Number of messages to include after each match (default 1)
     """
-    messages = whatsapp_list_messages(
+    messages = await run_blocking(
+        whatsapp_list_messages,
         after=after,
         before=before,
         sender_phone_number=sender_phone_number,
@@ -70,7 +106,7 @@ def list_messages(
     return messages
 
 @mcp.tool()
-def list_chats(
+async def list_chats(
     query: Optional[str] = None,
     limit: int = 20,
     page: int = 0,
@@ -86,7 +122,8 @@ def list_chats(
         include_last_message: Whether to include the last message in each chat (default True)
         sort_by: Field to sort results by, either "last_active" or "name" (default "last_active")
     """
-    chats = whatsapp_list_chats(
+    chats = await run_blocking(
+        whatsapp_list_chats,
         query=query,
         limit=limit,
         page=page,
@@ -96,28 +133,28 @@ def list_chats(
     return chats
 
 @mcp.tool()
-def get_chat(chat_jid: str, include_last_message: bool = True) -> Dict[str, Any]:
+async def get_chat(chat_jid: str, include_last_message: bool = True) -> Dict[str, Any]:
     """Get WhatsApp chat metadata by JID.
     
     Args:
         chat_jid: The JID of the chat to retrieve
         include_last_message: Whether to include the last message (default True)
     """
-    chat = whatsapp_get_chat(chat_jid, include_last_message)
+    chat = await run_blocking(whatsapp_get_chat, chat_jid, include_last_message)
     return chat
 
 @mcp.tool()
-def get_direct_chat_by_contact(sender_phone_number: str) -> Dict[str, Any]:
+async def get_direct_chat_by_contact(sender_phone_number: str) -> Dict[str, Any]:
     """Get WhatsApp chat metadata by sender phone number.
     
     Args:
         sender_phone_number: The phone number to search for
     """
-    chat = whatsapp_get_direct_chat_by_contact(sender_phone_number)
+    chat = await run_blocking(whatsapp_get_direct_chat_by_contact, sender_phone_number)
     return chat
 
 @mcp.tool()
-def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Dict[str, Any]]:
+async def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Dict[str, Any]]:
     """Get all WhatsApp chats involving the contact.
     
     Args:
@@ -125,21 +162,21 @@ def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Dict[str
         limit: Maximum number of chats to return (default 20)
         page: Page number for pagination (default 0)
     """
-    chats = whatsapp_get_contact_chats(jid, limit, page)
+    chats = await run_blocking(whatsapp_get_contact_chats, jid, limit, page)
     return chats
 
 @mcp.tool()
-def get_last_interaction(jid: str) -> str:
+async def get_last_interaction(jid: str) -> str:
     """Get most recent WhatsApp message involving the contact.
     
     Args:
         jid: The JID of the contact to search for
     """
-    message = whatsapp_get_last_interaction(jid)
+    message = await run_blocking(whatsapp_get_last_interaction, jid)
     return message
 
 @mcp.tool()
-def get_message_context(
+async def get_message_context(
     message_id: str,
     before: int = 5,
     after: int = 5
@@ -151,11 +188,11 @@ def get_message_context(
         before: Number of messages to include before the target message (default 5)
         after: Number of messages to include after the target message (default 5)
     """
-    context = whatsapp_get_message_context(message_id, before, after)
+    context = await run_blocking(whatsapp_get_message_context, message_id, before, after)
     return context
 
 @mcp.tool()
-def send_message(
+async def send_message(
     recipient: str,
     message: str
 ) -> Dict[str, Any]:
@@ -177,14 +214,19 @@ def send_message(
         }
     
     # Call the whatsapp_send_message function with the unified recipient parameter
-    success, status_message = whatsapp_send_message(recipient, message)
+    try:
+        success, status_message = await _limited(
+            'send', lambda: whatsapp_send_message_async(recipient, message)
+        )
+    except TimeoutError as e:
+        success, status_message = False, str(e)
     return {
         "success": success,
         "message": status_message
     }
 
 @mcp.tool()
-def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
+async def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
     """Send a file such as a picture, raw audio, video or document via WhatsApp to the specified recipient. For group messages use the JID.
     
     Args:
@@ -197,14 +239,19 @@ def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
     """
     
     # Call the whatsapp_send_file function
-    success, status_message = whatsapp_send_file(recipient, media_path)
+    try:
+        success, status_message = await _limited(
+            'send', lambda: whatsapp_send_file_async(recipient, media_path)
+        )
+    except TimeoutError as e:
+        success, status_message = False, str(e)
     return {
         "success": success,
         "message": status_message
     }
 
 @mcp.tool()
-def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
+async def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
     """Send any audio file as a WhatsApp audio message to the specified recipient. For group messages use the JID. If it errors due to ffmpeg not being installed, use send_file instead.
     
     Args:
@@ -215,14 +262,19 @@ def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing success status and a status message
     """
-    success, status_message = whatsapp_audio_voice_message(recipient, media_path)
+    try:
+        success, status_message = await _limited(
+            'send', lambda: whatsapp_audio_voice_message_async(recipient, media_path)
+        )
+    except TimeoutError as e:
+        success, status_message = False, str(e)
     return {
         "success": success,
         "message": status_message
     }
 
 @mcp.tool()
-def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
+async def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
     """Download media from a WhatsApp message and get the local file path.
     
     Args:
@@ -232,7 +284,12 @@ def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing success status, a status message, and the file path if successful
     """
-    file_path = whatsapp_download_media(message_id, chat_jid)
+    try:
+        file_path, status_message = await _limited(
+            'download', lambda: whatsapp_download_media_async(message_id, chat_jid)
+        )
+    except TimeoutError as e:
+        file_path, status_message = None, str(e)
     
     if file_path:
         return {
@@ -243,7 +300,7 @@ def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
     else:
         return {
             "success": False,
-            "message": "Failed to download media"
+            "message": f"Failed to download media: {status_message}"
         }
 
 if __name__ == "__main__":
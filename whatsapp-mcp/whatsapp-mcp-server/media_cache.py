@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Media Cache
+====================
+
+Content-addressed on-disk cache in front of the bridge's /api/download.
+
+Every photo script asked the bridge to download and decrypt the same media
+again on every run, and then made another full copy of it in the project
+folder. This cache:
+
+- maps (message ID, chat JID) -> SHA-256 of the content, so a message that
+  has been fetched once is never requested from the bridge again (a file
+  lock per message keeps concurrent processes from both fetching it)
+- stores each distinct file once under MEDIA_CACHE_DIR/blobs/<sha[:2]>/<sha>,
+  so the same photo forwarded to several groups takes the space of one.
+  Blobs are reflinked or copied in (never hardlinked to the bridge's file,
+  which the bridge may rewrite) and made read-only, so a project folder
+  that links one can't change the cached content for everyone else
+- puts files into project folders with `place()`: a hardlink, or a reflink
+  on filesystems that support it, falling back to a copy across devices
+- keeps the blobs under MEDIA_CACHE_MAX_BYTES, evicting the least recently
+  used first (a blob that is also hardlinked into a project folder stays
+  there - eviction only drops the cache's own name for it)
+
+The index lives in MEDIA_CACHE_DIR/index.db.
+
+Usage:
+    from media_cache import cached_download, place
+    path = cached_download(message_id, chat_jid)
+    place(path, os.path.join(project_dir, filename))
+
+    python media_cache.py            # show cache usage
+    python media_cache.py --evict    # evict down to the size cap now
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_DIR = os.getenv(
+    'MEDIA_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media_cache')
+)
+MEDIA_CACHE_MAX_BYTES = int(float(os.getenv('MEDIA_CACHE_MAX_GB', '20')) * 1024 ** 3)
+
+# Linux FICLONE ioctl (_IOW(0x94, 9, int)) - copy-on-write clone on btrfs / XFS
+FICLONE = 0x40049409
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def blob_sha256(path: str) -> Optional[str]:
+    """SHA-256 of a cached blob, read from its file name (None for other paths)."""
+    sha256 = os.path.basename(path).split('.', 1)[0]
+    if len(sha256) == 64 and all(c in '0123456789abcdef' for c in sha256):
+        return sha256
+    return None
+
+def _reflink(source: str, target: str) -> bool:
+    if not FCNTL_AVAILABLE:
+        return False
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, target)
+        return True
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+def copy_file(source: str, target: str) -> str:
+    """Independent copy of source at target: a reflink where supported, else a full copy.
+
+    Written under a temporary name and renamed, so target is never partial.
+
+    Returns:
+        'reflink' or 'copy'
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        method = 'reflink' if _reflink(source, tmp_path) else 'copy'
+        if method == 'copy':
+            shutil.copy2(source, tmp_path)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return method
+
+def place(source: str, target: str) -> str:
+    """Put source at target without copying the data where possible.
+
+    Tries a hardlink, then a reflink, then falls back to shutil.copy2.
+    An existing target is replaced.
+
+    Returns:
+        How the file was placed: 'existing', 'hardlink', 'reflink' or 'copy'
+    """
+    if os.path.exists(target):
+        if os.path.samefile(source, target):
+            return 'existing'
+        os.remove(target)
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+
+    try:
+        os.link(source, target)
+        return 'hardlink'
+    except OSError:
+        # Cross-device, or a filesystem without hardlinks
+        pass
+    if _reflink(source, target):
+        return 'reflink'
+    shutil.copy2(source, target)
+    return 'copy'
+
+class MediaCache:
+    """Content-addressed media blobs plus a message -> blob index."""
+
+    def __init__(self, root: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.lock_dir = os.path.join(root, 'locks')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._conn = sqlite3.connect(os.path.join(root, 'index.db'), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS media_blobs (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_media_blobs_access ON media_blobs(last_access);
+            CREATE TABLE IF NOT EXISTS media_messages (
+                message_id TEXT NOT NULL,
+                chat_jid TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                PRIMARY KEY (message_id, chat_jid)
+            );
+            CREATE INDEX IF NOT EXISTS idx_media_messages_sha ON media_messages(sha256);
+        """)
+        self._conn.commit()
+
+    def lookup(self, message_id: str, chat_jid: str) -> Optional[str]:
+        """Cached path of a message's media, or None if it isn't cached."""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT b.sha256, b.path FROM media_messages m
+                JOIN media_blobs b ON b.sha256 = m.sha256
+                WHERE m.message_id = ? AND m.chat_jid = ?
+            """, (message_id, chat_jid)).fetchone()
+            if row is None:
+                return None
+            sha256, path = row
+            if not os.path.exists(path):
+                # Removed behind our back - forget it so it gets fetched again
+                self._conn.execute("DELETE FROM media_blobs WHERE sha256 = ?", (sha256,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE media_blobs SET last_access = ? WHERE sha256 = ?",
+                               (time.time(), sha256))
+            self._conn.commit()
+            return path
+
+    def add_file(self, message_id: str, chat_jid: str, source_path: str) -> str:
+        """Store a downloaded file for a message. Returns the cached blob path."""
+        sha256 = file_sha256(source_path)
+        _, ext = os.path.splitext(source_path)
+        blob_path = os.path.join(self.blob_dir, sha256[:2], f"{sha256}{ext.lower()}")
+
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM media_blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row and os.path.exists(row[0]):
+                blob_path = row[0]
+            else:
+                copy_file(source_path, blob_path)
+            # Read-only before place() links it anywhere - a hardlink shares the inode
+            os.chmod(blob_path, 0o444)
+            now = time.time()
+            self._conn.execute("""
+                INSERT INTO media_blobs(sha256, path, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET path = excluded.path, last_access = excluded.last_access
+            """, (sha256, blob_path, os.path.getsize(blob_path), now, now))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media_messages(message_id, chat_jid, sha256) VALUES (?, ?, ?)",
+                (message_id, chat_jid, sha256)
+            )
+            self._conn.commit()
+
+        self.evict(keep=sha256)
+        return blob_path
+
+    @contextmanager
+    def _message_lock(self, message_id: str, chat_jid: str):
+        """Held while a message is fetched - by this process's threads and other processes."""
+        key = (message_id, chat_jid)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            name = hashlib.sha1(f"{chat_jid}/{message_id}".encode()).hexdigest()
+            with open(os.path.join(self.lock_dir, name), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        with self._lock:
+            self._key_locks.pop(key, None)
+
+    def get(self, message_id: str, chat_jid: str,
+            fetch: Callable[[str, str], Tuple[Optional[str], str]]) -> Tuple[Optional[str], str]:
+        """Cached path of a message's media, calling fetch() only on a miss.
+
+        Args:
+            fetch: Downloads the media; returns (path or None, message) like BridgeClient.download
+
+        Returns:
+            Tuple of (cached path or None, message)
+        """
+        path = self.lookup(message_id, chat_jid)
+        if path:
+            return path, "Served from media cache"
+        with self._message_lock(message_id, chat_jid):
+            # Another thread or process may have fetched it while we waited
+            path = self.lookup(message_id, chat_jid)
+            if path:
+                return path, "Served from media cache"
+            path, message = fetch(message_id, chat_jid)
+            if not path:
+                return None, message
+            return self.add_file(message_id, chat_jid, path), message
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Drop least recently used blobs until under max_bytes. Returns how many were dropped."""
+        evicted = 0
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM media_blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            for sha256, path, size in self._conn.execute(
+                "SELECT sha256, path, size FROM media_blobs ORDER BY last_access"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                if sha256 == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"⚠️  Could not evict {path}: {e}")
+                    continue
+                self._conn.execute("DELETE FROM media_blobs WHERE sha256 = ?", (sha256,))
+                self._conn.execute("DELETE FROM media_messages WHERE sha256 = ?", (sha256,))
+                total -= size
+                evicted += 1
+            self._conn.commit()
+        if evicted:
+            logger.info(f"🧹 Media cache evicted {evicted} blobs ({total / 1024 ** 2:.0f} MB left)")
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            blobs, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM media_blobs"
+            ).fetchone()
+            messages = self._conn.execute("SELECT COUNT(*) FROM media_messages").fetchone()[0]
+        return {'blobs': blobs, 'bytes': size, 'messages': messages}
+
+_caches: Dict[str, MediaCache] = {}
+_caches_lock = threading.Lock()
+
+def get_media_cache(root: str = MEDIA_CACHE_DIR) -> MediaCache:
+    """Get the shared cache for a directory."""
+    key = os.path.abspath(root)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = MediaCache(key)
+            _caches[key] = cache
+    return cache
+
+def cached_download(message_id: str, chat_jid: str,
+                    bridge_url: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """Media of a message from the cache, downloading it from the bridge once.
+
+    Returns:
+        Tuple of (cached path or None, message)
+    """
+    from bridge_client import get_bridge_client
+    return get_media_cache().get(message_id, chat_jid, get_bridge_client(bridge_url).download)
+
+def cached_download_many(items: Iterable[Tuple[str, str]],
+                         bridge_url: Optional[str] = None) -> List[Optional[str]]:
+    """cached_download for (message_id, chat_jid) pairs; misses are fetched concurrently."""
+    from bridge_client import get_bridge_client
+    cache = get_media_cache()
+    items = list(items)
+    paths = [cache.lookup(*item) for item in items]
+    misses = [i for i, path in enumerate(paths) if path is None]
+    if misses:
+        client = get_bridge_client(bridge_url)
+        fetched = client.download_many([items[i] for i in misses])
+        for i, path in zip(misses, fetched):
+            if path:
+                paths[i] = cache.add_file(*items[i], path)
+    return paths
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='WhatsApp media cache')
+    parser.add_argument('--evict', action='store_true', help='Evict down to the size cap now')
+    args = parser.parse_args()
+
+    cache = get_media_cache()
+    if args.evict:
+        cache.evict()
+    stats = cache.stats()
+    logger.info(f"📦 Media cache ({cache.root}): {stats['blobs']} blobs for {stats['messages']} messages, "
+                f"{stats['bytes'] / 1024 ** 2:.0f} MB of {cache.max_bytes / 1024 ** 3:g} GB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Per-Consumer Message Cursors
+============================
+
+Incremental reads of messages.db keyed on rowid instead of timestamps.
+
+New messages get a rowid above every existing one, so "everything after
+rowid N" is an index range scan on the table's primary b-tree and a consumer
+that persists N after processing doesn't skip anything - no timezone
+arithmetic or clock skew involved.
+
+A higher rowid doesn't always mean a new message, though: the bridge writes
+with INSERT OR REPLACE, so a message it stores again (edit, history sync)
+is deleted and re-inserted under a new rowid, and a history sync appends
+old messages at the end. CursorStore.drop_replayed() filters those out
+against what the consumer has already processed:
+- messages older than the newest one processed minus
+  WA_CURSOR_REPLAY_WINDOW seconds are old history, not new traffic
+- within that window (late deliveries are normal), messages whose ID the
+  consumer already processed are dropped
+
+Cursors live in a small SQLite file (WA_CURSOR_STATE_PATH) with one row per
+consumer, shared by the message dispatcher's handlers and standalone monitors.
+
+Usage:
+    store = get_cursor_store()
+    after = store.get('realtime_drop_monitor')
+    rows, high_water = read_messages_after(MESSAGES_DB_PATH, after, chat_jids)
+    rows = store.drop_replayed('realtime_drop_monitor', rows)
+    ...process rows...
+    store.set('realtime_drop_monitor', high_water, rows)
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlite_pool import get_read_connection
+
+logger = logging.getLogger(__name__)
+
+CURSOR_STATE_PATH = os.getenv(
+    'WA_CURSOR_STATE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'message_cursors.db')
+)
+
+# How far behind the newest processed message a message can arrive and still count as new
+CURSOR_REPLAY_WINDOW = float(os.getenv('WA_CURSOR_REPLAY_WINDOW', '3600'))
+
+MESSAGE_COLUMNS = """rowid, id, chat_jid, sender, content, timestamp, is_from_me,
+       media_type, filename, file_length"""
+
+def _epoch(message: Dict) -> Optional[float]:
+    timestamp = message.get('timestamp')
+    return timestamp.timestamp() if timestamp else None
+
+class CursorStore:
+    """Persisted last-processed rowid per consumer, plus recently processed message IDs."""
+
+    def __init__(self, state_path: str = CURSOR_STATE_PATH):
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(state_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS message_cursors (
+                consumer TEXT PRIMARY KEY,
+                last_rowid INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                newest_ts REAL
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(message_cursors)")}
+        if 'newest_ts' not in columns:
+            self._conn.execute("ALTER TABLE message_cursors ADD COLUMN newest_ts REAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cursor_recent_messages (
+                consumer TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                chat_jid TEXT NOT NULL,
+                ts REAL NOT NULL,
+                PRIMARY KEY (consumer, message_id, chat_jid)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, consumer: str) -> Optional[int]:
+        """Last rowid the consumer finished, or None if it has never run."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_rowid FROM message_cursors WHERE consumer = ?", (consumer,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_all(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT consumer, last_rowid FROM message_cursors").fetchall())
+
+    def set(self, consumer: str, rowid: int, processed: Iterable[Dict] = ()):
+        """Move a consumer's cursor to rowid, recording the messages it processed on the way."""
+        recent = [(consumer, msg['id'], msg['chat_jid'], _epoch(msg)) for msg in processed if _epoch(msg)]
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT newest_ts FROM message_cursors WHERE consumer = ?", (consumer,)
+            ).fetchone()
+            newest_ts = max([ts for *_, ts in recent] + ([row[0]] if row and row[0] else []), default=None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO message_cursors(consumer, last_rowid, updated_at, newest_ts) VALUES (?, ?, ?, ?)",
+                (consumer, rowid, datetime.now().isoformat(), newest_ts)
+            )
+            if recent:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cursor_recent_messages(consumer, message_id, chat_jid, ts) VALUES (?, ?, ?, ?)",
+                    recent
+                )
+                self._conn.execute(
+                    "DELETE FROM cursor_recent_messages WHERE consumer = ? AND ts < ?",
+                    (consumer, newest_ts - CURSOR_REPLAY_WINDOW)
+                )
+            self._conn.commit()
+
+    def drop_replayed(self, consumer: str, messages: List[Dict]) -> List[Dict]:
+        """Messages that are really new to the consumer (see module docstring).
+
+        Messages re-inserted by the bridge or appended by a history sync have
+        a fresh rowid but were either processed already or are old history.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT newest_ts FROM message_cursors WHERE consumer = ?", (consumer,)
+            ).fetchone()
+            if not messages or not row or row[0] is None:
+                return messages
+            cutoff = row[0] - CURSOR_REPLAY_WINDOW
+            seen = set(self._conn.execute(
+                "SELECT message_id, chat_jid FROM cursor_recent_messages WHERE consumer = ?", (consumer,)
+            ).fetchall())
+
+        fresh = [
+            msg for msg in messages
+            if (msg['id'], msg['chat_jid']) not in seen
+            and (_epoch(msg) is None or _epoch(msg) >= cutoff)
+        ]
+        if len(fresh) < len(messages):
+            logger.info(f"⏭️  {consumer}: skipped {len(messages) - len(fresh)} re-inserted or backfilled messages")
+        return fresh
+
+_stores: Dict[str, CursorStore] = {}
+_stores_lock = threading.Lock()
+
+def get_cursor_store(state_path: str = CURSOR_STATE_PATH) -> CursorStore:
+    """Get the shared cursor store for state_path."""
+    key = os.path.abspath(state_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = CursorStore(key)
+            _stores[key] = store
+    return store
+
+def max_rowid(db_path: str) -> int:
+    """Current end of the messages table."""
+    conn = get_read_connection(db_path)
+    return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages").fetchone()[0]
+
+def rowid_before(db_path: str, since: datetime) -> int:
+    """Cursor position just before the first message at/after `since`.
+
+    Walks back from the newest message, so it only touches recent rows. Used to
+    turn an old timestamp-based checkpoint (or "1 hour ago") into a cursor.
+    """
+    conn = get_read_connection(db_path)
+    position = 0
+    for rowid, timestamp in conn.execute("SELECT rowid, timestamp FROM messages ORDER BY rowid DESC"):
+        try:
+            when = datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            continue
+        if when.tzinfo is None or since.tzinfo is None:
+            when, cutoff = when.replace(tzinfo=None), since.replace(tzinfo=None)
+        else:
+            cutoff = since
+        if when < cutoff:
+            position = rowid
+            break
+    return position
+
+def message_from_row(row: Tuple) -> Dict:
+    """Turn a MESSAGE_COLUMNS row into the message dict consumers work with."""
+    try:
+        timestamp = datetime.fromisoformat(row[5])
+    except (TypeError, ValueError):
+        timestamp = None
+    return {
+        'rowid': row[0],
+        'id': row[1],
+        'chat_jid': row[2],
+        'sender': row[3],
+        'content': row[4] or '',
+        'timestamp': timestamp,
+        'is_from_me': bool(row[6]),
+        'media_type': row[7],
+        'filename': row[8],
+        'file_length': row[9],
+    }
+
+def read_messages_after(db_path: str, after_rowid: int,
+                        chat_jids: Optional[Iterable[str]] = None,
+                        limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """Read messages inserted after a cursor position.
+
+    Args:
+        db_path: Path of messages.db
+        after_rowid: Cursor position (last rowid already processed)
+        chat_jids: Only return messages from these chats
+        limit: Maximum rowid range to scan (after_rowid + limit). Rowids
+            can have gaps (REPLACEd or deleted rows), so this bounds the
+            rows read, it doesn't guarantee that many come back
+
+    Returns:
+        (messages in rowid order, new cursor position). The new position
+        covers every row scanned, including rows from other chats, so the
+        next read starts after them. Pass the messages through
+        CursorStore.drop_replayed() before acting on them.
+    """
+    conn = get_read_connection(db_path)
+    high_water = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages").fetchone()[0]
+    if limit:
+        high_water = min(high_water, after_rowid + limit)
+    if high_water <= after_rowid:
+        return [], after_rowid
+
+    where = "rowid > ? AND rowid <= ?"
+    params: List = [after_rowid, high_water]
+    if chat_jids is not None:
+        chat_jids = list(chat_jids)
+        where += f" AND chat_jid IN ({','.join('?' * len(chat_jids))})"
+        params.extend(chat_jids)
+
+    rows = conn.execute(
+        f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE {where} ORDER BY rowid", params
+    ).fetchall()
+    return [message_from_row(row) for row in rows], high_water
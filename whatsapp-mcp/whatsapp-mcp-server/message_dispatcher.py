@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Message Dispatcher
+===========================
+
+One process that reads every new message from the bridge's messages.db exactly
+once and fans it out to registered handlers, replacing the separate pollers
+that each opened the database and scanned the same groups on their own timers.
+
+Built-in handlers:
+- kill_switch            unified_kill_switch.handle_messages (runs first)
+- drop_monitor           realtime_drop_monitor.handle_messages
+- velo_resubmissions     whatsapp_message_monitor.handle_messages
+- mohadin_resubmissions  mohadin_message_monitor.handle_messages
+- photo_uploads          foto_uploads/simple_photo_upload.py (if available)
+
+Each handler has its own rowid cursor (see message_cursor.py, consumer name
+"dispatcher:<handler>"), so a failing handler retries its own backlog without
+making the others reprocess anything. A handler without a cursor yet starts at
+the current end of the message table.
+
+Plugin API:
+    dispatcher = MessageDispatcher()
+    dispatcher.register('my_handler', callback, chat_jids={'1203...@g.us'})
+    dispatcher.run()
+
+`callback(messages)` receives a list of dicts with rowid, id, chat_jid,
+sender, content, timestamp (datetime), is_from_me, media_type, filename and
+file_length, in insertion order.
+
+Usage:
+    python message_dispatcher.py [--interval 30] [--dry-run] [--handlers drop_monitor,kill_switch]
+"""
+
+import os
+import sys
+import signal
+import sqlite3
+import logging
+import argparse
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlite_pool import get_read_connection
+from message_watcher import get_watcher
+from message_cursor import CURSOR_STATE_PATH, MESSAGE_COLUMNS, get_cursor_store, max_rowid, message_from_row
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+MESSAGES_DB_PATH = os.getenv('WHATSAPP_DB_PATH', '../whatsapp-bridge/store/messages.db')
+FOTO_UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'foto_uploads')
+DISPATCH_BATCH_SIZE = 500
+# Consecutive failures on the same batch before a handler skips past it
+DISPATCH_MAX_RETRIES = 5
+
+running = True
+
+@dataclass
+class RegisteredHandler:
+    name: str
+    callback: Callable[[List[Dict]], None]
+    chat_jids: Optional[Set[str]] = None
+    failures: int = 0
+
+class MessageDispatcher:
+    """Reads new messages once and delivers them to every registered handler."""
+
+    def __init__(self, db_path: str = MESSAGES_DB_PATH,
+                 state_path: str = CURSOR_STATE_PATH,
+                 batch_size: int = DISPATCH_BATCH_SIZE):
+        self.db_path = os.path.abspath(db_path)
+        self.batch_size = batch_size
+        self.handlers: List[RegisteredHandler] = []
+        self._cursors = get_cursor_store(state_path)
+        self._checkpoints: Dict[str, int] = {}
+
+    def register(self, name: str, callback: Callable[[List[Dict]], None],
+                 chat_jids: Optional[Iterable[str]] = None):
+        """Register a handler. Handlers run in registration order for each batch."""
+        chat_jids = set(chat_jids) if chat_jids is not None else None
+        self.handlers.append(RegisteredHandler(name, callback, chat_jids))
+        checkpoint = self._cursors.get(f"dispatcher:{name}")
+        if checkpoint is None:
+            checkpoint = max_rowid(self.db_path)
+            self._save_checkpoint(name, checkpoint)
+            logger.info(f"🆕 Handler '{name}' starts at message rowid {checkpoint}")
+        self._checkpoints[name] = checkpoint
+        logger.info(f"🔌 Registered handler '{name}'" + (f" for {len(chat_jids)} chat(s)" if chat_jids is not None else ""))
+
+    def _save_checkpoint(self, name: str, rowid: int, processed: Iterable[Dict] = ()):
+        self._checkpoints[name] = rowid
+        self._cursors.set(f"dispatcher:{name}", rowid, processed)
+
+    def _read_batch(self, after_rowid: int) -> List[Dict]:
+        conn = get_read_connection(self.db_path)
+        rows = conn.execute(f"""
+            SELECT {MESSAGE_COLUMNS}
+            FROM messages
+            WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?
+        """, (after_rowid, self.batch_size)).fetchall()
+        return [message_from_row(row) for row in rows]
+
+    def _deliver(self, handler: RegisteredHandler, batch: List[Dict]) -> bool:
+        """Run one handler over its share of the batch. Returns False if it should stop this cycle."""
+        checkpoint = self._checkpoints[handler.name]
+        messages = [
+            msg for msg in batch
+            if msg['rowid'] > checkpoint
+            and (handler.chat_jids is None or msg['chat_jid'] in handler.chat_jids)
+        ]
+        # A new rowid isn't always a new message (bridge REPLACE, history sync)
+        messages = self._cursors.drop_replayed(f"dispatcher:{handler.name}", messages)
+        try:
+            if messages:
+                handler.callback(messages)
+        except SystemExit:
+            # Handler is shutting the process down (kill switch) - don't replay this batch on restart
+            self._save_checkpoint(handler.name, batch[-1]['rowid'], messages)
+            raise
+        except Exception as e:
+            handler.failures += 1
+            if handler.failures < DISPATCH_MAX_RETRIES:
+                logger.error(f"❌ Handler '{handler.name}' failed ({handler.failures}/{DISPATCH_MAX_RETRIES}): {e}")
+                return False
+            logger.error(f"❌ Handler '{handler.name}' failed {handler.failures} times - skipping {len(messages)} messages: {e}")
+
+        handler.failures = 0
+        self._save_checkpoint(handler.name, batch[-1]['rowid'], messages)
+        return True
+
+    def dispatch_once(self) -> int:
+        """Deliver all pending messages to every handler. Returns messages read."""
+        if not self.handlers:
+            return 0
+
+        blocked: Set[str] = set()
+        total = 0
+        while True:
+            pending = [h for h in self.handlers if h.name not in blocked]
+            if not pending:
+                break
+            batch = self._read_batch(min(self._checkpoints[h.name] for h in pending))
+            if not batch:
+                break
+            total += len(batch)
+
+            for handler in pending:
+                if self._checkpoints[handler.name] >= batch[-1]['rowid']:
+                    continue
+                if not self._deliver(handler, batch):
+                    blocked.add(handler.name)
+
+            if len(batch) < self.batch_size:
+                break
+
+        if total:
+            logger.debug(f"📨 Dispatched {total} messages to {len(self.handlers)} handlers")
+        return total
+
+    def run(self, max_idle: float = 30, should_stop: Optional[Callable[[], bool]] = None):
+        """Dispatch until stopped, waking as soon as the bridge writes new messages."""
+        watcher = get_watcher(self.db_path)
+        while not (should_stop and should_stop()):
+            try:
+                self.dispatch_once()
+            except sqlite3.Error as e:
+                logger.error(f"❌ Error reading messages: {e}")
+            watcher.wait_for_change(max_idle, should_stop)
+
+def register_default_handlers(dispatcher: MessageDispatcher, dry_run: bool = False,
+                              only: Optional[Set[str]] = None):
+    """Register the built-in handlers whose dependencies are available."""
+
+    def wanted(name: str) -> bool:
+        return only is None or name in only
+
+    # Kill switch first, so nothing else acts on a batch containing KILL
+    if wanted('kill_switch'):
+        try:
+            import unified_kill_switch
+            dispatcher.register(
+                'kill_switch', unified_kill_switch.handle_messages,
+                [c['group_jid'] for c in unified_kill_switch.GROUP_CONFIG.values() if c['enabled']]
+            )
+        except (ImportError, SystemExit) as e:
+            logger.warning(f"⚠️  Kill switch handler unavailable: {e}")
+
+    if wanted('drop_monitor'):
+        try:
+            import realtime_drop_monitor
+            dispatcher.register(
+                'drop_monitor', lambda msgs: realtime_drop_monitor.handle_messages(msgs, dry_run),
+                [c['group_jid'] for c in realtime_drop_monitor.PROJECTS.values()]
+            )
+        except (ImportError, SystemExit) as e:
+            logger.warning(f"⚠️  Drop monitor handler unavailable: {e}")
+
+    if wanted('velo_resubmissions'):
+        try:
+            import whatsapp_message_monitor
+            dispatcher.register(
+                'velo_resubmissions', lambda msgs: whatsapp_message_monitor.handle_messages(msgs, dry_run),
+                [whatsapp_message_monitor.VELO_TEST_GROUP_JID]
+            )
+        except (ImportError, SystemExit) as e:
+            logger.warning(f"⚠️  Velo Test resubmission handler unavailable: {e}")
+
+    if wanted('mohadin_resubmissions'):
+        try:
+            import mohadin_message_monitor
+            dispatcher.register(
+                'mohadin_resubmissions', lambda msgs: mohadin_message_monitor.handle_messages(msgs, dry_run),
+                [mohadin_message_monitor.MOHADIN_GROUP_JID]
+            )
+        except (ImportError, SystemExit) as e:
+            logger.warning(f"⚠️  Mohadin resubmission handler unavailable: {e}")
+
+    if wanted('photo_uploads'):
+        try:
+            sys.path.insert(0, os.path.abspath(FOTO_UPLOADS_DIR))
+            import simple_photo_upload
+            if dry_run:
+                logger.info("🔍 DRY RUN: photo_uploads handler not registered")
+            else:
+                uploader = simple_photo_upload.SimplePhotoUpload()
+                dispatcher.register(
+                    'photo_uploads', uploader.handle_messages,
+                    [jid for jid, c in simple_photo_upload.TEST_GROUPS.items() if c.get('enabled', True)]
+                )
+        except (ImportError, SystemExit) as e:
+            logger.warning(f"⚠️  Photo upload handler unavailable: {e}")
+
+def signal_handler(signum, frame):
+    """Handle graceful shutdown."""
+    global running
+    logger.info(f"Received signal {signum}. Shutting down gracefully...")
+    running = False
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('message_dispatcher.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    parser = argparse.ArgumentParser(description='WhatsApp message dispatcher for all monitors')
+    parser.add_argument('--interval', type=int, default=30,
+                        help='Maximum idle seconds between checks (default: 30)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Preview mode - handlers don\'t write anything')
+    parser.add_argument('--handlers', type=str, default=None,
+                        help='Comma-separated handler names to run (default: all available)')
+    args = parser.parse_args()
+
+    if not os.path.exists(MESSAGES_DB_PATH):
+        logger.error(f"❌ WhatsApp database not found at {MESSAGES_DB_PATH}")
+        sys.exit(1)
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    logger.info("🚀 Starting WhatsApp Message Dispatcher...")
+    logger.info(f"{'📋 DRY RUN MODE' if args.dry_run else '💾 LIVE MODE'}")
+
+    dispatcher = MessageDispatcher()
+    only = {name.strip() for name in args.handlers.split(',')} if args.handlers else None
+    register_default_handlers(dispatcher, args.dry_run, only)
+
+    if not dispatcher.handlers:
+        logger.error("❌ No handlers available - nothing to do")
+        sys.exit(1)
+
+    dispatcher.run(args.interval, should_stop=lambda: not running)
+    logger.info("🛑 Message dispatcher stopped")
+
+if __name__ == "__main__":
+    main()
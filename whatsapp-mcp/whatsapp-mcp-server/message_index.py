@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Message Search Indexes (FTS5 + drop mentions sidecar)
+=====================================================
+
+The bridge owns messages.db and the monitors mount it read-only, so we can't
+add triggers or virtual tables to it. Instead this module keeps a sidecar
+SQLite file with an FTS5 `trigram` index over messages.content, filled
+incrementally from a rowid high-water mark.
+
+Index entries are keyed on the message id (id, chat_jid), not messages.rowid:
+the bridge rewrites messages with INSERT OR REPLACE and messages has no
+INTEGER PRIMARY KEY, so a message's rowid isn't stable. A re-stored message
+lands above the high-water mark and its entry is replaced in place.
+
+The trigram tokenizer gives case-insensitive substring matching, i.e. the
+same results as `content LIKE '%term%'`, for terms of 3+ characters.
+
+Callers don't query the index directly - they ask for a WHERE fragment:
+
+    conn = get_read_connection(MESSAGES_DB_PATH)
+    clause, params = content_filter(conn, MESSAGES_DB_PATH, "DR1234", "messages")
+    conn.execute(f"SELECT ... FROM messages WHERE {clause}", params)
+
+The fragment matches indexed rows through FTS and falls back to LIKE for the
+not-yet-indexed tail (rowid above the high-water mark), so results are never
+stale. Queries never wait for indexing - they kick off the sync in a
+background thread, so the first search after a fresh install runs as a LIKE
+scan while the initial build catches up. If FTS5 is unavailable, the index
+can't be written, or the term is too short for trigrams, it degrades to a
+plain LIKE.
+
+The same pass also fills `drop_mentions` - one row per DR number per message -
+so "where was DR123 first posted", "all drops in the last 7 days" and "the
+original message to reply to" are indexed lookups via get_drop_mentions()
+instead of regex passes over the whole message history. Messages above the
+drop_mentions high-water mark are covered by a regex pass over just that
+rowid range, the same way content_filter() covers its LIKE tail.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import re
+import logging
+from datetime import datetime
+from typing import Optional, Tuple, List, Dict, Iterable
+
+from sqlite_pool import get_read_connection
+
+logger = logging.getLogger(__name__)
+
+INDEX_DB_PATH = os.getenv(
+    'WA_INDEX_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'message_index.db')
+)
+INDEX_ALIAS = 'msgidx'
+SYNC_BATCH_SIZE = 5000
+# Minimum seconds between incremental syncs triggered by queries
+SYNC_MIN_INTERVAL = 2.0
+# Trigram index can't answer terms shorter than this
+MIN_FTS_TERM_LENGTH = 3
+# Whole words only - "ADDR123" or "DR12ABC" aren't drop numbers
+DROP_PATTERN = r'\bDR\d+\b'
+_drop_regex = re.compile(DROP_PATTERN, re.IGNORECASE)
+# Bump when extract_drop_numbers() changes, so drop_mentions is rebuilt with the new rules
+DROPS_INDEX_VERSION = 2
+# Bump when messages_fts entries change shape, so the FTS index is rebuilt
+# (2: keyed on message id instead of messages.rowid)
+FTS_INDEX_VERSION = 2
+
+# index_state keys - each index keeps its own high-water mark
+FTS_STATE_KEY = 'messages_fts'
+DROPS_STATE_KEY = 'drop_mentions'
+DROPS_VERSION_KEY = 'drop_mentions_version'
+FTS_VERSION_KEY = 'messages_fts_version'
+
+_write_conn: Optional[sqlite3.Connection] = None
+_write_lock = threading.Lock()
+_last_sync = {}
+_sync_threads: Dict[str, threading.Thread] = {}
+_sync_threads_lock = threading.Lock()
+_fts_disabled_reason: Optional[str] = None
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    msg_id UNINDEXED,
+    chat_jid UNINDEXED,
+    tokenize = 'trigram'
+);
+CREATE TABLE IF NOT EXISTS fts_keys (
+    fts_rowid INTEGER PRIMARY KEY,
+    msg_id TEXT NOT NULL,
+    chat_jid TEXT NOT NULL,
+    UNIQUE (msg_id, chat_jid)
+);
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS drop_mentions (
+    drop_number TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    chat_jid TEXT NOT NULL,
+    sender TEXT,
+    timestamp TEXT,
+    ts_epoch REAL,
+    msg_rowid INTEGER NOT NULL,
+    PRIMARY KEY (drop_number, message_id, chat_jid)
+);
+CREATE INDEX IF NOT EXISTS idx_drop_mentions_drop_ts ON drop_mentions(drop_number, ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_drop_mentions_chat_ts ON drop_mentions(chat_jid, ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_drop_mentions_ts ON drop_mentions(ts_epoch);
+"""
+
+def extract_drop_numbers(content: Optional[str]) -> List[str]:
+    """All distinct drop numbers (upper-cased, in order) mentioned in a message."""
+    if not content:
+        return []
+    seen = []
+    for match in _drop_regex.findall(content):
+        drop = match.upper()
+        if drop not in seen:
+            seen.append(drop)
+    return seen
+
+def _to_epoch(timestamp) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(timestamp)).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def _get_write_connection() -> sqlite3.Connection:
+    """Get the process-wide writable connection to the index file."""
+    global _write_conn
+    if _write_conn is None:
+        conn = sqlite3.connect(INDEX_DB_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _write_conn = conn
+    return _write_conn
+
+def get_high_water(state_key: str = FTS_STATE_KEY) -> int:
+    """Highest messages.rowid already written to the given index."""
+    conn = _get_write_connection()
+    row = conn.execute("SELECT value FROM index_state WHERE key = ?", (state_key,)).fetchone()
+    return row[0] if row else 0
+
+def sync_message_index(messages_db_path: str) -> int:
+    """Index messages added since the last sync. Returns messages read.
+
+    One pass over the new rows feeds both the FTS index and drop_mentions.
+    Safe to run from several processes at once: each batch runs in an
+    IMMEDIATE transaction that re-reads the high-water marks.
+    """
+    global _fts_disabled_reason
+    source = get_read_connection(messages_db_path)
+    indexed = 0
+
+    with _write_lock:
+        try:
+            conn = _get_write_connection()
+        except sqlite3.Error as e:
+            _fts_disabled_reason = str(e)
+            logger.warning(f"⚠️  Message search index unavailable ({e}) - using LIKE scans")
+            return 0
+
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = dict(conn.execute("SELECT key, value FROM index_state").fetchall())
+                fts_high = state.get(FTS_STATE_KEY, 0)
+                drops_high = state.get(DROPS_STATE_KEY, 0)
+
+                if state.get(FTS_VERSION_KEY) != FTS_INDEX_VERSION:
+                    # Entries were written under the old keying - index every message again
+                    conn.execute("DELETE FROM messages_fts")
+                    conn.execute("DELETE FROM fts_keys")
+                    conn.execute("INSERT OR REPLACE INTO index_state(key, value) VALUES (?, ?)",
+                                 (FTS_VERSION_KEY, FTS_INDEX_VERSION))
+                    fts_high = 0
+
+                if state.get(DROPS_VERSION_KEY) != DROPS_INDEX_VERSION:
+                    # Extraction rules changed - re-extract every message
+                    conn.execute("DELETE FROM drop_mentions")
+                    conn.execute("INSERT OR REPLACE INTO index_state(key, value) VALUES (?, ?)",
+                                 (DROPS_VERSION_KEY, DROPS_INDEX_VERSION))
+                    drops_high = 0
+
+                if indexed == 0 and max(fts_high, drops_high):
+                    max_rowid = source.execute("SELECT MAX(rowid) FROM messages").fetchone()[0] or 0
+                    if max_rowid < max(fts_high, drops_high):
+                        # messages.db was recreated - start the indexes over
+                        logger.warning("⚠️  messages.db is behind the search index - rebuilding index")
+                        conn.execute("DELETE FROM messages_fts")
+                        conn.execute("DELETE FROM fts_keys")
+                        conn.execute("DELETE FROM drop_mentions")
+                        fts_high = drops_high = 0
+
+                rows = source.execute("""
+                    SELECT rowid, content, id, chat_jid, sender, timestamp
+                    FROM messages
+                    WHERE rowid > ?
+                    ORDER BY rowid
+                    LIMIT ?
+                """, (min(fts_high, drops_high), SYNC_BATCH_SIZE)).fetchall()
+
+                if not rows:
+                    conn.execute("COMMIT")
+                    break
+
+                fts_rows = [(r[2], r[3], r[1]) for r in rows if r[0] > fts_high and r[1]]
+                # One fts rowid per message id, so a re-stored message replaces its entry
+                conn.executemany(
+                    "INSERT OR IGNORE INTO fts_keys(msg_id, chat_jid) VALUES (?, ?)",
+                    [r[:2] for r in fts_rows]
+                )
+                conn.executemany(
+                    """INSERT OR REPLACE INTO messages_fts(rowid, content, msg_id, chat_jid)
+                       SELECT fts_rowid, ?3, msg_id, chat_jid FROM fts_keys
+                       WHERE msg_id = ?1 AND chat_jid = ?2""",
+                    fts_rows
+                )
+                conn.executemany(
+                    """INSERT OR REPLACE INTO drop_mentions
+                       (drop_number, message_id, chat_jid, sender, timestamp, ts_epoch, msg_rowid)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    [
+                        (drop, r[2], r[3], r[4], r[5], _to_epoch(r[5]), r[0])
+                        for r in rows if r[0] > drops_high
+                        for drop in extract_drop_numbers(r[1])
+                    ]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO index_state(key, value) VALUES (?, ?)",
+                    [(FTS_STATE_KEY, rows[-1][0]), (DROPS_STATE_KEY, rows[-1][0])]
+                )
+                conn.execute("COMMIT")
+                indexed += len(rows)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            if len(rows) < SYNC_BATCH_SIZE:
+                break
+
+    if indexed:
+        logger.debug(f"🔎 Indexed {indexed} messages for search and drop lookups")
+    return indexed
+
+def rebuild_message_index(messages_db_path: str) -> int:
+    """Drop and rebuild the whole index (e.g. after the bridge DB was reset)."""
+    with _write_lock:
+        conn = _get_write_connection()
+        conn.execute("DELETE FROM messages_fts")
+        conn.execute("DELETE FROM fts_keys")
+        conn.execute("DELETE FROM drop_mentions")
+        conn.execute("DELETE FROM index_state")
+        conn.commit()
+    _last_sync.pop(os.path.abspath(messages_db_path), None)
+    return sync_message_index(messages_db_path)
+
+def _sync_quietly(messages_db_path: str):
+    try:
+        sync_message_index(messages_db_path)
+    except Exception as e:
+        logger.warning(f"⚠️  Background message index sync failed: {e}")
+
+def _sync_in_background(messages_db_path: str):
+    """Start a sync thread unless one is running or one started very recently."""
+    key = os.path.abspath(messages_db_path)
+    with _sync_threads_lock:
+        thread = _sync_threads.get(key)
+        if thread is not None and thread.is_alive():
+            return
+        now = time.monotonic()
+        if now - _last_sync.get(key, 0) < SYNC_MIN_INTERVAL:
+            return
+        _last_sync[key] = now
+        thread = threading.Thread(target=_sync_quietly, args=(messages_db_path,),
+                                  name="message-index-sync", daemon=True)
+        _sync_threads[key] = thread
+        thread.start()
+
+def _attach_index(conn: sqlite3.Connection):
+    """Attach the index file to a (pooled) read connection once."""
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    if INDEX_ALIAS not in attached:
+        conn.execute(f"ATTACH DATABASE ? AS {INDEX_ALIAS}", (INDEX_DB_PATH,))
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def _like_filter(term: str, column: str) -> Tuple[str, List]:
+    return f"LOWER({column}) LIKE LOWER(?)", [f"%{term}%"]
+
+def content_filter(conn: sqlite3.Connection, messages_db_path: str, term: str,
+                   table: str = 'messages') -> Tuple[str, List]:
+    """Build a WHERE fragment matching rows of `table` whose content contains term.
+
+    Args:
+        conn: Read connection to messages.db the fragment will run on
+        messages_db_path: Path of that database (synced in the background)
+        term: Text to look for (case-insensitive substring)
+        table: Name or alias of the messages table in the caller's query
+
+    Returns:
+        (sql_fragment, params) to AND into the caller's WHERE clause
+    """
+    column = f"{table}.content"
+    if _fts_disabled_reason or len(term) < MIN_FTS_TERM_LENGTH:
+        return _like_filter(term, column)
+
+    try:
+        _sync_in_background(messages_db_path)
+        _attach_index(conn)
+        state = dict(conn.execute(
+            f"SELECT key, value FROM {INDEX_ALIAS}.index_state WHERE key IN (?, ?)",
+            (FTS_STATE_KEY, FTS_VERSION_KEY)
+        ).fetchall())
+    except sqlite3.Error as e:
+        logger.debug(f"Full-text index not usable ({e}) - falling back to LIKE")
+        return _like_filter(term, column)
+
+    if state.get(FTS_VERSION_KEY) != FTS_INDEX_VERSION:
+        # Not built yet, or still holding old-style entries until the sync rebuilds it
+        return _like_filter(term, column)
+
+    high_water = state.get(FTS_STATE_KEY, 0)
+    clause = (
+        f"(({table}.id, {table}.chat_jid) IN"
+        f" (SELECT msg_id, chat_jid FROM {INDEX_ALIAS}.messages_fts WHERE messages_fts MATCH ?)"
+        f" OR ({table}.rowid > ? AND LOWER({column}) LIKE LOWER(?)))"
+    )
+    return clause, [_fts_phrase(term), high_water, f"%{term}%"]
+
+def _scan_drop_mentions(messages_db_path: str, drop_number: Optional[str],
+                        chat_jids: Optional[Iterable[str]], since_epoch: Optional[float],
+                        until_epoch: Optional[float], after_rowid: int = 0) -> List[Dict]:
+    """Regex over matching messages above after_rowid (all of them if the sidecar is unusable)."""
+    conn = get_read_connection(messages_db_path)
+    where = ["rowid > ?", "LOWER(content) LIKE LOWER(?)"]
+    params = [after_rowid, f"%{drop_number or 'DR'}%"]
+    if chat_jids:
+        chat_jids = list(chat_jids)
+        where.append(f"chat_jid IN ({','.join('?' * len(chat_jids))})")
+        params.extend(chat_jids)
+
+    mentions = []
+    for rowid, content, msg_id, chat_jid, sender, timestamp in conn.execute(f"""
+        SELECT rowid, content, id, chat_jid, sender, timestamp
+        FROM messages
+        WHERE {' AND '.join(where)}
+    """, params):
+        epoch = _to_epoch(timestamp)
+        if since_epoch is not None and (epoch is None or epoch < since_epoch):
+            continue
+        if until_epoch is not None and (epoch is None or epoch > until_epoch):
+            continue
+        for drop in extract_drop_numbers(content):
+            if drop_number and drop != drop_number:
+                continue
+            mentions.append((drop, msg_id, chat_jid, sender, timestamp, epoch, rowid))
+    return mentions
+
+def get_drop_mentions(messages_db_path: str,
+                      drop_number: Optional[str] = None,
+                      chat_jids: Optional[Iterable[str]] = None,
+                      since: Optional[datetime] = None,
+                      until: Optional[datetime] = None,
+                      newest_first: bool = False,
+                      limit: Optional[int] = None,
+                      with_content: bool = False) -> List[Dict]:
+    """Look up messages that mention drop numbers.
+
+    Args:
+        messages_db_path: Path of the bridge messages.db the index is built from
+        drop_number: Only mentions of this drop (e.g. "DR1234567")
+        chat_jids: Only mentions in these chats
+        since: Only messages at or after this time
+        until: Only messages at or before this time
+        newest_first: Order by message time descending instead of ascending
+        limit: Maximum number of mentions to return
+        with_content: Also return the message text (one extra lookup by message id)
+
+    Returns:
+        List of dicts with drop_number, message_id, chat_jid, sender,
+        timestamp (datetime) and, if requested, content
+    """
+    drop_number = drop_number.upper() if drop_number else None
+    since_epoch = since.timestamp() if since else None
+    until_epoch = until.timestamp() if until else None
+    chat_jids = list(chat_jids) if chat_jids else None
+
+    rows = []
+    high_water = 0
+    try:
+        _sync_in_background(messages_db_path)
+        conn = get_read_connection(INDEX_DB_PATH)
+        state = dict(conn.execute(
+            "SELECT key, value FROM index_state WHERE key IN (?, ?)",
+            (DROPS_STATE_KEY, DROPS_VERSION_KEY)
+        ).fetchall())
+
+        # Not built yet, or built under old extraction rules: scan everything until the sync catches up
+        if state.get(DROPS_VERSION_KEY) == DROPS_INDEX_VERSION:
+            where = []
+            params = []
+            if drop_number:
+                where.append("drop_number = ?")
+                params.append(drop_number)
+            if chat_jids:
+                where.append(f"chat_jid IN ({','.join('?' * len(chat_jids))})")
+                params.extend(chat_jids)
+            if since_epoch is not None:
+                where.append("ts_epoch >= ?")
+                params.append(since_epoch)
+            if until_epoch is not None:
+                where.append("ts_epoch <= ?")
+                params.append(until_epoch)
+
+            query = """
+                SELECT drop_number, message_id, chat_jid, sender, timestamp, ts_epoch, msg_rowid
+                FROM drop_mentions
+            """
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            query += f" ORDER BY ts_epoch {'DESC' if newest_first else 'ASC'}, msg_rowid {'DESC' if newest_first else 'ASC'}"
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+            rows = conn.execute(query, params).fetchall()
+            high_water = state.get(DROPS_STATE_KEY, 0)
+    except sqlite3.Error as e:
+        logger.debug(f"Drop index not usable ({e}) - scanning messages")
+        rows, high_water = [], 0
+
+    # Messages the sync hasn't reached yet
+    tail = _scan_drop_mentions(messages_db_path, drop_number, chat_jids, since_epoch, until_epoch,
+                               after_rowid=high_water)
+    if tail:
+        # A message re-stored above the high-water mark replaces its indexed row
+        merged = {r[:3]: r for r in rows}
+        merged.update((r[:3], r) for r in tail)
+        rows = sorted(merged.values(), key=lambda r: (r[5] or 0, r[6]), reverse=newest_first)
+        if limit:
+            rows = rows[:limit]
+
+    contents = {}
+    if with_content and rows:
+        source = get_read_connection(messages_db_path)
+        keys = list({(r[1], r[2]) for r in rows})
+        for i in range(0, len(keys), 400):
+            chunk = keys[i:i + 400]
+            for msg_id, chat_jid, content in source.execute(
+                f"SELECT id, chat_jid, content FROM messages WHERE (id, chat_jid) IN (VALUES {','.join(['(?, ?)'] * len(chunk))})",
+                [value for key in chunk for value in key]
+            ):
+                contents[(msg_id, chat_jid)] = content
+
+    mentions = []
+    for drop, msg_id, chat_jid, sender, timestamp, epoch, rowid in rows:
+        try:
+            when = datetime.fromisoformat(str(timestamp))
+        except ValueError:
+            when = None
+        mention = {
+            'drop_number': drop,
+            'message_id': msg_id,
+            'chat_jid': chat_jid,
+            'sender': sender,
+            'timestamp': when,
+        }
+        if with_content:
+            mention['content'] = contents.get((msg_id, chat_jid), '')
+        mentions.append(mention)
+    return mentions
+
+def first_drop_mention(messages_db_path: str, drop_number: str,
+                       chat_jids: Optional[Iterable[str]] = None) -> Optional[Dict]:
+    """Where a drop number was first posted (or None)."""
+    mentions = get_drop_mentions(messages_db_path, drop_number, chat_jids, limit=1)
+    return mentions[0] if mentions else None
+
+def latest_drop_mention(messages_db_path: str, drop_number: str,
+                        chat_jids: Optional[Iterable[str]] = None) -> Optional[Dict]:
+    """Most recent message mentioning a drop number (or None)."""
+    mentions = get_drop_mentions(messages_db_path, drop_number, chat_jids, newest_first=True, limit=1)
+    return mentions[0] if mentions else None
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+messages.db Change Notification
+===============================
+
+Lets the monitors block until the bridge actually writes something instead of
+sleeping a fixed interval and re-querying.
+
+Detection is two-staged so idle cost stays near zero:
+1. stat() the database and its -wal file every WATCH_POLL_INTERVAL seconds
+   (no SQLite open, no query) and compare size/mtime
+2. only when the files changed, confirm with `PRAGMA data_version`, which
+   changes whenever another connection (the Go bridge) commits
+
+We deliberately don't rely on inotify: the monitors run in Docker against a
+bind-mounted messages.db, and inotify events from writers outside the
+container are not delivered reliably on every host. stat() polling at
+sub-second cadence gives the same latency without a native dependency.
+
+Usage:
+    from message_watcher import wait_for_new_messages
+    while running:
+        process_new_messages()
+        # returns as soon as the bridge commits, or after max_wait seconds
+        wait_for_new_messages(MESSAGES_DB_PATH, max_wait=check_interval,
+                              should_stop=lambda: not running)
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlite_pool import get_read_connection
+
+logger = logging.getLogger(__name__)
+
+# Seconds between stat() checks of the database files
+WATCH_POLL_INTERVAL = float(os.getenv('WA_WATCH_POLL_INTERVAL', '0.5'))
+
+class MessageDBWatcher:
+    """Detects commits to a SQLite database made by other processes."""
+
+    def __init__(self, db_path: str, poll_interval: float = WATCH_POLL_INTERVAL):
+        self.db_path = os.path.abspath(db_path)
+        self.poll_interval = poll_interval
+        self._fingerprint = self._stat_fingerprint()
+        self._data_version = self._read_data_version()
+
+    def _stat_fingerprint(self) -> Tuple:
+        fingerprint = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                st = os.stat(path)
+                fingerprint.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except OSError:
+                fingerprint.append(None)
+        return tuple(fingerprint)
+
+    def _read_data_version(self) -> Optional[int]:
+        try:
+            return get_read_connection(self.db_path).execute("PRAGMA data_version").fetchone()[0]
+        except Exception as e:
+            logger.debug(f"Could not read data_version of {self.db_path}: {e}")
+            return None
+
+    def has_changed(self) -> bool:
+        """Non-blocking check: has the database been written since the last call?"""
+        fingerprint = self._stat_fingerprint()
+        if fingerprint == self._fingerprint:
+            return False
+        self._fingerprint = fingerprint
+
+        data_version = self._read_data_version()
+        if data_version is None or data_version != self._data_version:
+            self._data_version = data_version
+            return True
+        # Files touched without a new commit (e.g. a WAL checkpoint)
+        return False
+
+    def wait_for_change(self, max_wait: float,
+                        should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        """Block until the database changes or max_wait seconds pass.
+
+        Returns:
+            bool: True if a change was detected, False on timeout or stop
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            if should_stop and should_stop():
+                return False
+            if self.has_changed():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+_watchers: Dict[Tuple[str, int], MessageDBWatcher] = {}
+_watchers_lock = threading.Lock()
+
+def get_watcher(db_path: str) -> MessageDBWatcher:
+    """Get the calling thread's watcher for db_path (watchers keep per-caller state)."""
+    key = (os.path.abspath(db_path), threading.get_ident())
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None:
+            watcher = MessageDBWatcher(db_path)
+            _watchers[key] = watcher
+    return watcher
+
+def wait_for_new_messages(db_path: str, max_wait: float,
+                          should_stop: Optional[Callable[[], bool]] = None) -> bool:
+    """Sleep until the bridge commits to db_path (True) or max_wait elapses (False)."""
+    return get_watcher(db_path).wait_for_change(max_wait, should_stop)
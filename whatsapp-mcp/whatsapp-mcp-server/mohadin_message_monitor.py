@@ -19,7 +19,8 @@ import argparse
 # Google Sheets imports
 try:
     from google.oauth2.service_account import Credentials
-    from googleapiclient.discovery import build
+    # Availability probe only - services are built with sheets_quota.build_sheets_service()
+    import googleapiclient.discovery
     GOOGLE_AVAILABLE = True
 except ImportError:
     GOOGLE_AVAILABLE = False
@@ -30,6 +31,9 @@ except ImportError:
 # Import WhatsApp functionality
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import whatsapp
+from message_watcher import get_watcher
+from sheets_mirror import find_drop_row, find_drop_row_live, patch_row
+from sheets_quota import build_sheets_service
 
 # Initialize logger at module level
 logging.basicConfig(
@@ -57,7 +61,7 @@ def get_sheets_service():
         credentials = Credentials.from_service_account_file(
             GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
         )
-        return build("sheets", "v4", credentials=credentials, cache_discovery=False)
+        return build_sheets_service(credentials)
     except Exception as e:
         logger.error(f"Failed to create Google Sheets service: {e}")
         return None
@@ -65,11 +69,9 @@ def get_sheets_service():
 def get_recent_whatsapp_messages(hours_back: int = 1) -> List[whatsapp.Message]:
     """Get recent WhatsApp messages from Velo Test group"""
     try:
-        import sqlite3
-        
         since_time = datetime.now() - timedelta(hours=hours_back)
         
-        conn = sqlite3.connect(whatsapp.MESSAGES_DB_PATH)
+        conn = whatsapp.get_db_connection()
         cursor = conn.cursor()
         
         # Query messages directly from database
@@ -100,7 +102,6 @@ def get_recent_whatsapp_messages(hours_back: int = 1) -> List[whatsapp.Message]:
             messages.append(message)
         
         cursor.close()
-        conn.close()
         
         return messages
         
@@ -137,26 +138,8 @@ def is_resubmission_message(content: str) -> bool:
 def get_sheet_row_by_drop_number(drop_number: str) -> Optional[Dict]:
     """Find the row in Google Sheet that contains the specified drop number"""
     try:
-        service = get_sheets_service()
-        if not service:
-            return None
-        
-        # Get all data from the sheet
-        result = service.spreadsheets().values().get(
-            spreadsheetId=GSHEET_ID,
-            range=f"{SHEET_NAME}!A:Z"
-        ).execute()
-        
-        values = result.get('values', [])
-        
-        for row_index, row in enumerate(values):
-            if len(row) > 1 and row[1].strip().upper() == drop_number:
-                return {
-                    'row_number': row_index + 1,  # 1-based for sheets API
-                    'data': row
-                }
-        
-        return None
+        # Indexed lookup in the local sheet mirror (no Sheets API read)
+        return find_drop_row(SHEET_NAME, drop_number)
         
     except Exception as e:
         logger.error(f"Error searching sheet for drop {drop_number}: {e}")
@@ -169,8 +152,9 @@ def update_sheet_for_resubmission(drop_number: str, resubmission_time: datetime)
         if not service:
             return False
         
-        # Find the row
-        row_info = get_sheet_row_by_drop_number(drop_number)
+        # Find the row - the mirror's row number is checked in the live sheet
+        # before we write to it
+        row_info = find_drop_row_live(SHEET_NAME, drop_number, service)
         if not row_info:
             logger.warning(f"Drop {drop_number} not found in sheet")
             return False
@@ -184,6 +168,7 @@ def update_sheet_for_resubmission(drop_number: str, resubmission_time: datetime)
             valueInputOption='RAW',
             body={'values': [['TRUE']]}
         ).execute()
+        patch_row(SHEET_NAME, row_number, {'W': 'TRUE'})
         
         logger.info(f"✅ Ticked Resubmitted checkbox for {drop_number}")
         return True
@@ -236,9 +221,10 @@ def ensure_sheet_headers() -> bool:
         logger.error(f"Error updating sheet headers: {e}")
         return False
 
-def process_resubmission_messages(dry_run: bool = False) -> int:
-    """Process recent WhatsApp messages for resubmissions"""
-    messages = get_recent_whatsapp_messages()
+def process_resubmission_messages(dry_run: bool = False, messages: Optional[List[whatsapp.Message]] = None) -> int:
+    """Process recent WhatsApp messages (or the given ones) for resubmissions"""
+    if messages is None:
+        messages = get_recent_whatsapp_messages()
     resubmissions_processed = 0
     
     if not messages:
@@ -277,18 +263,36 @@ def process_resubmission_messages(dry_run: bool = False) -> int:
     
     return resubmissions_processed
 
+def handle_messages(messages: List[Dict], dry_run: bool = False):
+    """Message dispatcher handler: resubmission keywords in this group"""
+    group_messages = [
+        whatsapp.Message(
+            timestamp=msg['timestamp'],
+            sender=msg['sender'],
+            content=msg['content'] or '',
+            is_from_me=msg['is_from_me'],
+            chat_jid=msg['chat_jid'],
+            id=msg['id'],
+            media_type=msg['media_type']
+        )
+        for msg in messages if msg['chat_jid'] == MOHADIN_GROUP_JID
+    ]
+    if group_messages:
+        process_resubmission_messages(dry_run, group_messages)
+
 def monitor_whatsapp_messages(dry_run: bool = False, check_interval: int = 30):
     """Main monitoring loop for WhatsApp messages"""
     
     logger.info("🚀 Starting WhatsApp Message Monitor...")
     logger.info(f"{'📋 DRY RUN MODE' if dry_run else '💾 LIVE MODE'}")
-    logger.info(f"⏰ Check interval: {check_interval} seconds")
+    logger.info(f"⏰ Max idle interval: {check_interval} seconds (wakes on new messages)")
     logger.info(f"📱 Monitoring group: Mohadin Activations")
     logger.info(f"🔍 Looking for: resubmission messages with drop numbers")
     logger.info("=" * 70)
     
     # Ensure headers exist
     ensure_sheet_headers()
+    watcher = get_watcher(whatsapp.MESSAGES_DB_PATH)
     
     while True:
         try:
@@ -299,7 +303,8 @@ def monitor_whatsapp_messages(dry_run: bool = False, check_interval: int = 30):
             else:
                 logger.debug("📊 No resubmissions found")
             
-            time.sleep(check_interval)
+            # Wait for the bridge to write new messages (or the interval to pass)
+            watcher.wait_for_change(check_interval)
             
         except KeyboardInterrupt:
             logger.info("⚠️  Received keyboard interrupt. Shutting down...")
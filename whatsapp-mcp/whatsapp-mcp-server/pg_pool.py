@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Shared Postgres (Neon) Connection Pool
+======================================
+
+Every service used to call psycopg2.connect(NEON_DB_URL) per operation, paying
+a TLS handshake to the remote pooler each time. This module keeps a small,
+bounded set of connections per database URL and hands them out again.
+
+- Bounded: at most PG_POOL_MAX_SIZE connections per URL; callers wait up to
+  PG_POOL_TIMEOUT seconds for a free one
+- Health-checked: a connection idle for more than PG_HEALTH_CHECK_IDLE seconds
+  is pinged (SELECT 1) on checkout and replaced if it is dead
+- Reconnects with exponential backoff + jitter on connection failures
+- Statement timeout on every connection (startup option, or a session-level
+  SET right after connecting when the pooler rejects startup options)
+
+Drop-in usage - `close()` returns the connection to the pool (uncommitted
+work is rolled back, same as closing a psycopg2 connection):
+    import pg_pool
+    conn = pg_pool.connect(NEON_DB_URL)
+    cursor = conn.cursor()
+    ...
+    conn.commit()
+    conn.close()
+
+or as a context manager that commits on success and rolls back on error:
+    with pg_pool.connect(NEON_DB_URL) as conn:
+        ...
+"""
+
+import os
+import time
+import random
+import threading
+import logging
+from typing import Dict, List, Tuple
+
+import psycopg2
+import psycopg2.pool
+
+logger = logging.getLogger(__name__)
+
+PG_POOL_MAX_SIZE = int(os.getenv('PG_POOL_MAX_SIZE', '5'))
+# Seconds to wait for a free connection before giving up
+PG_POOL_TIMEOUT = float(os.getenv('PG_POOL_TIMEOUT', '30'))
+PG_CONNECT_TIMEOUT = int(os.getenv('PG_CONNECT_TIMEOUT', '10'))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv('PG_STATEMENT_TIMEOUT_MS', '30000'))
+# Ping connections that sat idle longer than this before reusing them
+PG_HEALTH_CHECK_IDLE = float(os.getenv('PG_HEALTH_CHECK_IDLE', '30'))
+PG_CONNECT_RETRIES = int(os.getenv('PG_CONNECT_RETRIES', '3'))
+PG_RECONNECT_BACKOFF = float(os.getenv('PG_RECONNECT_BACKOFF', '0.5'))
+
+class PostgresPool:
+    """Bounded pool of psycopg2 connections to one database URL."""
+
+    def __init__(self, dsn: str, max_size: int = PG_POOL_MAX_SIZE):
+        self.dsn = dsn
+        self.max_size = max_size
+        self._idle: List[Tuple[object, float]] = []
+        self._lock = threading.RLock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._startup_options = True
+
+    def _open(self):
+        kwargs = {'connect_timeout': PG_CONNECT_TIMEOUT, 'keepalives': 1, 'keepalives_idle': 30}
+        if self._startup_options:
+            try:
+                return psycopg2.connect(
+                    self.dsn, options=f"-c statement_timeout={PG_STATEMENT_TIMEOUT_MS}", **kwargs
+                )
+            except psycopg2.OperationalError as e:
+                if 'options' not in str(e).lower():
+                    raise
+                # PgBouncer-style poolers reject startup options
+                self._startup_options = False
+                logger.info("ℹ️  Postgres pooler rejects startup options - setting statement_timeout per session")
+        conn = psycopg2.connect(self.dsn, **kwargs)
+        try:
+            # Session-level (not SET LOCAL, which ends with the first transaction);
+            # committed so putconn()'s rollback doesn't undo it
+            cursor = conn.cursor()
+            cursor.execute("SET statement_timeout = %s", (PG_STATEMENT_TIMEOUT_MS,))
+            cursor.close()
+            conn.commit()
+        except psycopg2.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _connect(self):
+        delay = PG_RECONNECT_BACKOFF
+        for attempt in range(1, PG_CONNECT_RETRIES + 1):
+            try:
+                return self._open()
+            except psycopg2.OperationalError as e:
+                if attempt == PG_CONNECT_RETRIES:
+                    raise
+                logger.warning(f"⚠️  Postgres connect failed (attempt {attempt}/{PG_CONNECT_RETRIES}): {e}")
+                time.sleep(delay + random.uniform(0, delay / 2))
+                delay *= 2
+
+    def _healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < PG_HEALTH_CHECK_IDLE:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Check out a healthy connection (blocks while the pool is full)."""
+        if not self._slots.acquire(timeout=PG_POOL_TIMEOUT):
+            raise psycopg2.pool.PoolError(f"No free Postgres connection after {PG_POOL_TIMEOUT}s")
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    idle = self._idle.pop() if self._idle else None
+                if idle is None:
+                    conn = self._connect()
+                elif self._healthy(*idle):
+                    conn = idle[0]
+                else:
+                    logger.info("🔌 Dropping dead pooled Postgres connection")
+                    self._close_quietly(idle[0])
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Return a connection; uncommitted work is rolled back."""
+        try:
+            if not conn.closed:
+                conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        except psycopg2.Error:
+            self._close_quietly(conn)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+class PooledConnection:
+    """psycopg2 connection borrowed from a PostgresPool; close() gives it back."""
+
+    def __init__(self, pool: PostgresPool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(conn, name)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.putconn(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._conn is not None and not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+    def __del__(self):
+        # Safety net for code paths that bail out before close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+_pools: Dict[str, PostgresPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(dsn: str) -> PostgresPool:
+    """Get (or create) the shared pool for a database URL."""
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = PostgresPool(dsn)
+            _pools[dsn] = pool
+    return pool
+
+def connect(dsn: str) -> PooledConnection:
+    """Borrow a connection to dsn from the shared pool."""
+    pool = get_pool(dsn)
+    return PooledConnection(pool, pool.getconn())
+
+def close_all_pools():
+    """Close all idle pooled connections (call on shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -6,8 +6,7 @@ to installation agents requesting missing photos for specific steps.
 """
 
 import argparse
-import psycopg2
-import time
+import pg_pool
 import logging
 import sys
 import os
@@ -17,6 +16,7 @@ from typing import List, Dict, Optional
 # Add whatsapp module to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import whatsapp
+from qa_steps import QAState, mask_sql, masks_from_rows
 
 # Initialize logger at module level
 logging.basicConfig(
@@ -48,24 +48,6 @@ PROJECTS = {
     }
 }
 
-# QA Step descriptions for clear feedback
-QA_STEPS = {
-    'step_01_property_frontage': '1. Property Frontage Photo',
-    'step_02_location_before_install': '2. Location Before Installation',
-    'step_03_outside_cable_span': '3. Outside Cable Span',
-    'step_04_home_entry_outside': '4. Home Entry Outside',
-    'step_05_home_entry_inside': '5. Home Entry Inside',
-    'step_06_fibre_entry_to_ont': '6. Fibre Entry to ONT',
-    'step_07_patched_labelled_drop': '7. Patched & Labelled Drop',
-    'step_08_work_area_completion': '8. Work Area Completion',
-    'step_09_ont_barcode_scan': '9. ONT Barcode Scan',
-    'step_10_ups_serial_number': '10. UPS Serial Number',
-    'step_11_powermeter_reading': '11. Power Meter Reading',
-    'step_12_powermeter_at_ont': '12. Power Meter at ONT',
-    'step_13_active_broadband_light': '13. Active Broadband Light',
-    'step_14_customer_signature': '14. Customer Signature'
-}
-
 def setup_logging():
     """Set up logging configuration (already done at module level)."""
     return logger
@@ -73,38 +55,23 @@ def setup_logging():
 def get_incomplete_qa_reviews(hours_back: int = 24) -> List[Dict]:
     """Get QA reviews marked as incomplete from Google Sheets (PRIMARY) and database (fallback)."""
     
-    # First try to get from Google Sheets (more accurate)
+    # First try to get from Google Sheets (more accurate) - via the local sheet mirror
     try:
-        from google.oauth2.service_account import Credentials
-        from googleapiclient.discovery import build
         import os
+        from sheets_mirror import QA_SHEET_NAMES, read_tab
         
         GSHEET_ID = os.getenv("GSHEET_ID", "1TYxDLyCqDHr0Imb5j7X4uJhxccgJTO0KrDVAD0Ja0Dk")
         GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
         
         if GSHEET_ID and GOOGLE_APPLICATION_CREDENTIALS:
-            logger.info("📊 Reading QA reviews from Google Sheets (primary source)")
-            
-            # Get Google Sheets service
-            credentials = Credentials.from_service_account_file(
-                GOOGLE_APPLICATION_CREDENTIALS, 
-                scopes=["https://www.googleapis.com/auth/spreadsheets"]
-            )
-            service = build("sheets", "v4", credentials=credentials, cache_discovery=False)
+            logger.info("📊 Reading QA reviews from Google Sheets mirror (primary source)")
             
             # Get sheet data from multiple sheets
-            sheet_names = ["Velo Test", "Mohadin"]
             all_reviews = []
             
-            for sheet_name in sheet_names:
+            for sheet_name in QA_SHEET_NAMES:
                 try:
-                    result = service.spreadsheets().values().get(
-                        spreadsheetId=GSHEET_ID,
-                        range=f"{sheet_name}!A:X"
-                    ).execute()
-                    
-                    values = result.get('values', [])
-                    sheet_reviews = []
+                    values = read_tab(sheet_name)
                     
                     # Process this sheet's data
                     sheet_reviews = process_sheet_data_for_qa(values, sheet_name)
@@ -122,25 +89,19 @@ def get_incomplete_qa_reviews(hours_back: int = 24) -> List[Dict]:
     
     # Fallback to database method
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
+        conn = pg_pool.connect(NEON_DB_URL)
         cursor = conn.cursor()
         
         # Get incomplete reviews that haven't had feedback sent yet
         since_time = datetime.now() - timedelta(hours=hours_back)
         
-        query = """
+        query = f"""
         SELECT 
             qa.drop_number,
             qa.project,
             qa.assigned_agent,
             qa.user_name,
-            qa.step_01_property_frontage, qa.step_02_location_before_install,
-            qa.step_03_outside_cable_span, qa.step_04_home_entry_outside,
-            qa.step_05_home_entry_inside, qa.step_06_fibre_entry_to_ont,
-            qa.step_07_patched_labelled_drop, qa.step_08_work_area_completion,
-            qa.step_09_ont_barcode_scan, qa.step_10_ups_serial_number,
-            qa.step_11_powermeter_reading, qa.step_12_powermeter_at_ont,
-            qa.step_13_active_broadband_light, qa.step_14_customer_signature,
+            {mask_sql('qa')} AS step_mask,
             qa.comment,
             qa.updated_at
         FROM qa_photo_reviews qa
@@ -161,24 +122,9 @@ def get_incomplete_qa_reviews(hours_back: int = 24) -> List[Dict]:
                 'project': row[1],
                 'assigned_agent': row[2],
                 'user_name': row[3],
-                'steps': {
-                    'step_01_property_frontage': row[4],
-                    'step_02_location_before_install': row[5],
-                    'step_03_outside_cable_span': row[6],
-                    'step_04_home_entry_outside': row[7],
-                    'step_05_home_entry_inside': row[8],
-                    'step_06_fibre_entry_to_ont': row[9],
-                    'step_07_patched_labelled_drop': row[10],
-                    'step_08_work_area_completion': row[11],
-                    'step_09_ont_barcode_scan': row[12],
-                    'step_10_ups_serial_number': row[13],
-                    'step_11_powermeter_reading': row[14],
-                    'step_12_powermeter_at_ont': row[15],
-                    'step_13_active_broadband_light': row[16],
-                    'step_14_customer_signature': row[17]
-                },
-                'comment': row[18],
-                'updated_at': row[19],
+                'steps': QAState(row[4]),
+                'comment': row[5],
+                'updated_at': row[6],
                 'source': 'database'  # Mark as database-based
             }
             reviews.append(review)
@@ -197,6 +143,9 @@ def process_sheet_data_for_qa(values, sheet_name):
     """Process data from a specific sheet for QA reviews"""
     reviews = []
     
+    # Step bitmask of every row in one pass over the tab
+    step_masks = masks_from_rows(values)
+    
     # Parse each row looking for incomplete items
     for row_index, row in enumerate(values):
         if row_index <= 2:  # Skip header rows
@@ -214,30 +163,12 @@ def process_sheet_data_for_qa(values, sheet_name):
         completed = row[23].lower() == 'true' if len(row) > 23 else False
         
         if incomplete and not completed:
-            # Parse QA steps from Google Sheets (ACTUAL status)
-            qa_steps = {
-                'step_01_property_frontage': row[2].lower() == 'true' if len(row) > 2 else False,
-                'step_02_location_before_install': row[3].lower() == 'true' if len(row) > 3 else False,
-                'step_03_outside_cable_span': row[4].lower() == 'true' if len(row) > 4 else False,
-                'step_04_home_entry_outside': row[5].lower() == 'true' if len(row) > 5 else False,
-                'step_05_home_entry_inside': row[6].lower() == 'true' if len(row) > 6 else False,
-                'step_06_fibre_entry_to_ont': row[7].lower() == 'true' if len(row) > 7 else False,
-                'step_07_patched_labelled_drop': row[8].lower() == 'true' if len(row) > 8 else False,
-                'step_08_work_area_completion': row[9].lower() == 'true' if len(row) > 9 else False,
-                'step_09_ont_barcode_scan': row[10].lower() == 'true' if len(row) > 10 else False,
-                'step_10_ups_serial_number': row[11].lower() == 'true' if len(row) > 11 else False,
-                'step_11_powermeter_reading': row[12].lower() == 'true' if len(row) > 12 else False,
-                'step_12_powermeter_at_ont': row[13].lower() == 'true' if len(row) > 13 else False,
-                'step_13_active_broadband_light': row[14].lower() == 'true' if len(row) > 14 else False,
-                'step_14_customer_signature': row[15].lower() == 'true' if len(row) > 15 else False,
-            }
-            
             reviews.append({
                 'drop_number': drop_number,
                 'project': sheet_name,
                 'assigned_agent': row[18] if len(row) > 18 else 'Not specified',
                 'user_name': row[18] if len(row) > 18 else 'Not specified',
-                'steps': qa_steps,
+                'steps': QAState(step_masks[row_index]),  # QA steps from Google Sheets (ACTUAL status)
                 'comment': row[20] if len(row) > 20 else '',
                 'updated_at': datetime.now(),
                 'source': 'google_sheets'  # Mark as sheets-based
@@ -245,14 +176,11 @@ def process_sheet_data_for_qa(values, sheet_name):
     
     return reviews
 
-def get_missing_steps(steps_dict: Dict[str, bool]) -> List[str]:
-    """Identify which QA steps are missing (False)."""
-    missing = []
-    for step_key, is_complete in steps_dict.items():
-        if not is_complete:
-            step_description = QA_STEPS.get(step_key, step_key)
-            missing.append(step_description)
-    return missing
+def get_missing_steps(steps) -> List[str]:
+    """Identify which QA steps are missing - from a QAState/bitmask or a step_xx -> bool dict."""
+    if not isinstance(steps, int):
+        steps = QAState.from_dict(steps)
+    return list(QAState(steps).missing_labels())
 
 def create_feedback_message(drop_number: str, missing_steps: List[str], project: str, assigned_agent: str) -> str:
     """Create a WhatsApp feedback message for missing photos."""
@@ -279,8 +207,13 @@ Thank you! 📸✅"""
 
     return message
 
-def send_feedback_to_group(project: str, message: str, dry_run: bool = False) -> bool:
-    """Send feedback message to the appropriate WhatsApp group."""
+def send_feedback_to_group(project: str, message: str, dry_run: bool = False,
+                           drop_number: Optional[str] = None) -> bool:
+    """Send feedback message to the appropriate WhatsApp group.
+    
+    With drop_number, the drop's feedback_sent is set once the message has
+    actually been delivered (not when it's queued).
+    """
     
     project_config = PROJECTS.get(project)
     if not project_config:
@@ -296,11 +229,12 @@ def send_feedback_to_group(project: str, message: str, dry_run: bool = False) ->
         return True
     
     try:
-        # Send message to WhatsApp group
-        success, response = whatsapp.send_message(group_jid, message)
+        # Queue message for the WhatsApp group (delivered, paced and retried by send_queue)
+        on_sent = ('qa_feedback_sent', drop_number) if drop_number else None
+        success, response = whatsapp.queue_message(group_jid, message, on_sent=on_sent)
         
         if success:
-            logger.info(f"✅ Feedback sent to {group_name}")
+            logger.info(f"✅ Feedback queued for {group_name}")
             return True
         else:
             logger.error(f"❌ Failed to send feedback to {group_name}: {response}")
@@ -313,7 +247,7 @@ def send_feedback_to_group(project: str, message: str, dry_run: bool = False) ->
 def mark_feedback_sent(drop_number: str) -> bool:
     """Mark that feedback has been sent for this drop number."""
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
+        conn = pg_pool.connect(NEON_DB_URL)
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -369,17 +303,11 @@ def process_qa_feedback(dry_run: bool = False, hours_back: int = 24):
         # Create feedback message
         message = create_feedback_message(drop_number, missing_steps, project, assigned_agent)
         
-        # Send to appropriate group
-        if send_feedback_to_group(project, message, dry_run):
-            if not dry_run:
-                mark_feedback_sent(drop_number)
+        # Send to appropriate group - feedback_sent is set once it's delivered
+        if send_feedback_to_group(project, message, dry_run, drop_number):
             feedback_sent += 1
-        
-        # Small delay between messages
-        if not dry_run:
-            time.sleep(2)
     
-    logger.info(f"📊 Summary: {feedback_sent} feedback messages sent")
+    logger.info(f"📊 Summary: {feedback_sent} feedback messages queued")
     logger.info("✅ QA Feedback processing completed")
 
 def main():
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+QA Step Bitmask
+===============
+
+The 14 QA photo steps packed into one 14-bit integer (bit 0 = step 1).
+
+QA state used to travel as a 14-key dict built with fourteen
+`.lower() == 'true'` calls per row, and missing steps were found by walking
+that dict against QA_STEPS. A `QAState` is an int, so:
+
+- completeness is `state == ALL_STEPS`, missing steps are `~state & ALL_STEPS`
+- the labels for a missing-step mask are computed once per distinct mask
+  and cached (there are at most 16384)
+- whole sheet tabs convert to an array of masks in one call
+  (`masks_from_rows`) - vectorized with NumPy when it's installed, a plain
+  list of ints otherwise
+- Postgres computes the mask itself (`mask_sql`), so reviews come back as
+  one integer per row instead of 14 booleans
+
+Bulk questions ("which drops are missing step 9 this week") are answered on
+the mask array without building per-row dicts:
+
+    drop_numbers, masks = fetch_review_masks(conn, since)
+    missing_9 = [drop_numbers[i] for i in rows_missing_step(masks, 9)]
+
+Usage:
+    state = QAState.from_cells(row[2:16])
+    if not state.complete:
+        labels = state.missing_labels()
+"""
+
+import logging
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Step columns in qa_photo_reviews, in step order
+STEP_KEYS = (
+    'step_01_property_frontage',
+    'step_02_location_before_install',
+    'step_03_outside_cable_span',
+    'step_04_home_entry_outside',
+    'step_05_home_entry_inside',
+    'step_06_fibre_entry_to_ont',
+    'step_07_patched_labelled_drop',
+    'step_08_work_area_completion',
+    'step_09_ont_barcode_scan',
+    'step_10_ups_serial_number',
+    'step_11_powermeter_reading',
+    'step_12_powermeter_at_ont',
+    'step_13_active_broadband_light',
+    'step_14_customer_signature',
+)
+
+# QA Step descriptions for clear feedback
+QA_STEPS = {
+    'step_01_property_frontage': '1. Property Frontage Photo',
+    'step_02_location_before_install': '2. Location Before Installation',
+    'step_03_outside_cable_span': '3. Outside Cable Span',
+    'step_04_home_entry_outside': '4. Home Entry Outside',
+    'step_05_home_entry_inside': '5. Home Entry Inside',
+    'step_06_fibre_entry_to_ont': '6. Fibre Entry to ONT',
+    'step_07_patched_labelled_drop': '7. Patched & Labelled Drop',
+    'step_08_work_area_completion': '8. Work Area Completion',
+    'step_09_ont_barcode_scan': '9. ONT Barcode Scan',
+    'step_10_ups_serial_number': '10. UPS Serial Number',
+    'step_11_powermeter_reading': '11. Power Meter Reading',
+    'step_12_powermeter_at_ont': '12. Power Meter at ONT',
+    'step_13_active_broadband_light': '13. Active Broadband Light',
+    'step_14_customer_signature': '14. Customer Signature'
+}
+
+STEP_COUNT = len(STEP_KEYS)
+ALL_STEPS = (1 << STEP_COUNT) - 1
+# Column C of the QA tabs holds step 1, column P step 14
+FIRST_STEP_COLUMN = 2
+
+_STEP_BITS = {key: 1 << i for i, key in enumerate(STEP_KEYS)}
+
+def step_bit(step: int) -> int:
+    """Bit for a 1-based step number."""
+    if not 1 <= step <= STEP_COUNT:
+        raise ValueError(f"QA step must be 1-{STEP_COUNT}, got {step}")
+    return 1 << (step - 1)
+
+def _is_checked(cell) -> bool:
+    """Checkbox value - bool from UNFORMATTED_VALUE / Postgres, 'TRUE'/'FALSE' text otherwise"""
+    if isinstance(cell, bool):
+        return cell
+    return cell is not None and str(cell).strip().lower() == 'true'
+
+@lru_cache(maxsize=None)
+def _missing(mask: int) -> Tuple[Tuple[int, ...], Tuple[str, ...]]:
+    missing = ~mask & ALL_STEPS
+    steps = tuple(i + 1 for i in range(STEP_COUNT) if missing >> i & 1)
+    return steps, tuple(QA_STEPS[STEP_KEYS[step - 1]] for step in steps)
+
+class QAState(int):
+    """The 14 QA steps as a bitmask; a set bit means the step's photo is done."""
+
+    __slots__ = ()
+
+    def __new__(cls, mask: int = 0):
+        return super().__new__(cls, int(mask) & ALL_STEPS)
+
+    @classmethod
+    def from_cells(cls, cells: Iterable) -> 'QAState':
+        """From the 14 step cells of a sheet row or result row (short rows are fine)."""
+        mask = 0
+        for i, cell in enumerate(cells):
+            if i >= STEP_COUNT:
+                break
+            if _is_checked(cell):
+                mask |= 1 << i
+        return cls(mask)
+
+    @classmethod
+    def from_dict(cls, steps: Dict[str, bool]) -> 'QAState':
+        """From the old step_xx -> bool dict."""
+        mask = 0
+        for key, done in steps.items():
+            if done and key in _STEP_BITS:
+                mask |= _STEP_BITS[key]
+        return cls(mask)
+
+    def has(self, step: int) -> bool:
+        return bool(self & step_bit(step))
+
+    @property
+    def complete(self) -> bool:
+        return self == ALL_STEPS
+
+    @property
+    def done_count(self) -> int:
+        return bin(self).count('1')
+
+    def missing_steps(self) -> Tuple[int, ...]:
+        """1-based numbers of the steps not done yet."""
+        return _missing(int(self))[0]
+
+    def missing_labels(self) -> Tuple[str, ...]:
+        """QA_STEPS descriptions of the steps not done yet."""
+        return _missing(int(self))[1]
+
+    def to_dict(self) -> Dict[str, bool]:
+        return {key: bool(self & bit) for key, bit in _STEP_BITS.items()}
+
+    def __repr__(self) -> str:
+        return f"QAState({self.done_count}/{STEP_COUNT}, missing={list(self.missing_steps())})"
+
+def mask_sql(alias: str = '') -> str:
+    """SQL expression computing the step bitmask of a qa_photo_reviews row."""
+    prefix = f"{alias}." if alias else ''
+    bits = [f"(COALESCE({prefix}{key}, FALSE)::int << {i})" for i, key in enumerate(STEP_KEYS)]
+    return '(' + ' | '.join(bits) + ')'
+
+def masks_from_rows(rows: Sequence[Sequence], first_column: int = FIRST_STEP_COLUMN):
+    """Step bitmask of every row, e.g. a whole sheet tab in one call.
+
+    Args:
+        rows: Sheet rows or result rows; short rows count as unchecked
+        first_column: Index of the step 1 cell (column C in the QA tabs)
+
+    Returns:
+        uint16 NumPy array with one mask per row (list of ints without NumPy)
+    """
+    last_column = first_column + STEP_COUNT
+    if not NUMPY_AVAILABLE:
+        return [int(QAState.from_cells(row[first_column:last_column])) for row in rows]
+
+    if not rows:
+        return np.zeros(0, dtype=np.uint16)
+    padding = [''] * STEP_COUNT
+    cells = np.array(
+        [(list(row[first_column:last_column]) + padding)[:STEP_COUNT] for row in rows],
+        dtype=object
+    ).astype(str)
+    checked = np.char.lower(np.char.strip(cells)) == 'true'
+    weights = np.left_shift(1, np.arange(STEP_COUNT, dtype=np.uint16)).astype(np.uint16)
+    return (checked.astype(np.uint16) * weights).sum(axis=1).astype(np.uint16)
+
+def rows_missing_step(masks, step: int) -> List[int]:
+    """Indices of the masks whose step is not done."""
+    bit = step_bit(step)
+    if NUMPY_AVAILABLE and isinstance(masks, np.ndarray):
+        return np.flatnonzero((masks & bit) == 0).tolist()
+    return [i for i, mask in enumerate(masks) if not mask & bit]
+
+def incomplete_rows(masks) -> List[int]:
+    """Indices of the masks with at least one step not done."""
+    if NUMPY_AVAILABLE and isinstance(masks, np.ndarray):
+        return np.flatnonzero(masks != ALL_STEPS).tolist()
+    return [i for i, mask in enumerate(masks) if mask != ALL_STEPS]
+
+def step_done_counts(masks) -> List[int]:
+    """How many masks have each step done, indexed by step - 1."""
+    if NUMPY_AVAILABLE and isinstance(masks, np.ndarray):
+        bits = np.left_shift(1, np.arange(STEP_COUNT, dtype=np.uint16)).astype(np.uint16)
+        return ((masks[:, None] & bits) != 0).sum(axis=0).tolist()
+    return [sum(1 for mask in masks if mask >> i & 1) for i in range(STEP_COUNT)]
+
+def fetch_review_masks(conn, since=None):
+    """(drop_numbers, masks) of qa_photo_reviews rows, newest review_date first.
+
+    Args:
+        conn: psycopg2 (or pg_pool) connection
+        since: Only reviews with review_date on/after this date
+    """
+    query = f"SELECT drop_number, {mask_sql()} FROM qa_photo_reviews"
+    params: Tuple = ()
+    if since is not None:
+        query += " WHERE review_date >= %s"
+        params = (since,)
+    query += " ORDER BY review_date DESC, drop_number"
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    drop_numbers = [row[0] for row in rows]
+    if NUMPY_AVAILABLE:
+        return drop_numbers, np.fromiter((row[1] for row in rows), dtype=np.uint16, count=len(rows))
+    return drop_numbers, [row[1] for row in rows]
+
+def drops_missing_step(conn, step: int, since=None) -> List[str]:
+    """Drop numbers with a review (since the given date) that is missing a step."""
+    drop_numbers, masks = fetch_review_masks(conn, since)
+    return list(dict.fromkeys(drop_numbers[i] for i in rows_missing_step(masks, step)))
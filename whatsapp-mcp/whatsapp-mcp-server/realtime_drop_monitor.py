@@ -11,20 +11,28 @@ import argparse
 import re
 import time
 import sqlite3
-import psycopg2
+import pg_pool
 from datetime import datetime, timedelta
-from typing import Set, List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
 import os
 import signal
 import sys
 import json
 from resubmission_handler import handle_drop_resubmission
+from message_watcher import get_watcher
+from message_cursor import get_cursor_store, read_messages_after, rowid_before
+from drop_number_cache import KnownDropNumbers, get_known_drop_numbers
+from drop_ingest import INSERTED, ingest_drops
+from sheets_outbox import get_sheets_outbox
+from sheets_writer import SheetsAppendWriter, get_sheets_writer
+from sheets_quota import build_sheets_service
 
 # Google Sheets imports
 try:
     from google.oauth2.service_account import Credentials
-    from googleapiclient.discovery import build
+    # Availability probe only - services are built with sheets_quota.build_sheets_service()
+    import googleapiclient.discovery
     GOOGLE_AVAILABLE = True
 except ImportError:
     GOOGLE_AVAILABLE = False
@@ -72,11 +80,18 @@ SHEET_MAPPING = {
     '120363421532174586@g.us': 'Mohadin'  # Mohadin group → Mohadin sheet
     # Note: Lawley drops go to Neon only, not Google Sheets
 }
+# 0-based [start, end) column ranges formatted as checkboxes: C-P (steps 1-14), V (Incomplete)
+SHEET_CHECKBOX_COLUMNS = [(2, 16), (21, 22)]
+_sheets_writer = None
 
 # Global variables for graceful shutdown
 running = True
 monitor_start_time = datetime.now()
 STATE_FILE = 'monitor_state.json'
+# Name of this monitor's rowid cursor in the shared cursor store
+CURSOR_NAME = 'realtime_drop_monitor'
+# Replaced by setup_logging() when run as a script; used as-is by the dispatcher
+logger = logging.getLogger(__name__)
 
 def setup_logging():
     """Set up logging configuration."""
@@ -115,8 +130,11 @@ def send_kill_confirmation(group_jid: str, sender: str):
     try:
         import whatsapp
         message = f"🛑 KILL COMMAND RECEIVED\n\nAll monitoring services stopped by: {sender}\nTime: {datetime.now().strftime('%H:%M:%S')}\n\nSystem is now OFFLINE."
-        success, response = whatsapp.send_message(group_jid, message)
+        success, response = whatsapp.queue_message(group_jid, message)
         if success:
+            # Services are stopped right after this - give the sender a moment to deliver it
+            from send_queue import get_send_worker
+            get_send_worker().flush(timeout=10)
             logger.info("✅ Kill confirmation sent")
         else:
             logger.warning(f"⚠️ Could not send kill confirmation: {response}")
@@ -147,56 +165,49 @@ def check_for_kill_command(messages: List[Dict]) -> bool:
     
     return False
 
-def load_monitor_state() -> datetime:
-    """Load the last check timestamp from state file."""
+def load_monitor_state() -> int:
+    """Load the message cursor (last processed messages.rowid)."""
+    last_rowid = get_cursor_store().get(CURSOR_NAME)
+    if last_rowid is not None:
+        logger.info(f"📂 Loaded message cursor: rowid {last_rowid}")
+        return last_rowid
+    
+    # No cursor yet - continue from the old timestamp checkpoint if there is one
+    since = None
     try:
         if os.path.exists(STATE_FILE):
             with open(STATE_FILE, 'r') as f:
                 state = json.load(f)
-                last_check = datetime.fromisoformat(state['last_check_time'])
-                logger.info(f"📂 Loaded last check time from state: {last_check}")
-                return last_check
+                since = datetime.fromisoformat(state['last_check_time'])
+                logger.info(f"📂 Migrating last check time from state file: {since}")
     except Exception as e:
         logger.warning(f"⚠️  Could not load state file: {e}")
     
-    # Default to 1 hour ago to avoid processing too many old messages on first run
-    default_time = datetime.now() - timedelta(hours=1)
-    logger.info(f"🕐 Using default start time (1 hour ago): {default_time}")
-    return default_time
+    if since is None:
+        # Default to 1 hour ago to avoid processing too many old messages on first run
+        since = datetime.now() - timedelta(hours=1)
+        logger.info(f"🕐 Using default start time (1 hour ago): {since}")
+    
+    last_rowid = rowid_before(MESSAGES_DB_PATH, since)
+    logger.info(f"📍 Starting message cursor at rowid {last_rowid}")
+    return last_rowid
 
-def save_monitor_state(last_check_time: datetime, processed_ids: Set[str]):
-    """Save the current monitor state to file."""
+def save_monitor_state(last_rowid: int, processed: List[Dict] = ()):
+    """Persist the message cursor and write the status file read by the dashboards."""
     try:
-        # Keep only last 1000 IDs to prevent file from growing too large
-        processed_list = list(processed_ids)
-        if len(processed_list) > 1000:
-            processed_list = processed_list[-1000:]
+        get_cursor_store().set(CURSOR_NAME, last_rowid, processed)
         
         state = {
-            'last_check_time': last_check_time.isoformat(),
-            'processed_message_ids': processed_list,
+            'last_check_time': datetime.now().isoformat(),
+            'last_rowid': last_rowid,
             'saved_at': datetime.now().isoformat()
         }
         with open(STATE_FILE, 'w') as f:
             json.dump(state, f, indent=2)
-        logger.debug(f"💾 State saved: last_check={last_check_time}")
+        logger.debug(f"💾 State saved: last_rowid={last_rowid}")
     except Exception as e:
         logger.error(f"❌ Could not save state: {e}")
 
-def load_processed_message_ids() -> Set[str]:
-    """Load previously processed message IDs from state file."""
-    try:
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, 'r') as f:
-                state = json.load(f)
-                processed_ids = set(state.get('processed_message_ids', []))
-                logger.info(f"📂 Loaded {len(processed_ids)} processed message IDs")
-                return processed_ids
-    except Exception as e:
-        logger.warning(f"⚠️  Could not load processed IDs: {e}")
-    
-    return set()
-
 def get_sheets_service():
     """Get Google Sheets service connection."""
     if not GOOGLE_AVAILABLE:
@@ -206,7 +217,7 @@ def get_sheets_service():
         credentials = Credentials.from_service_account_file(
             GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
         )
-        return build("sheets", "v4", credentials=credentials, cache_discovery=False)
+        return build_sheets_service(credentials)
     except Exception as e:
         print(f"Failed to create Google Sheets service: {e}")
         try:
@@ -215,6 +226,83 @@ def get_sheets_service():
             pass
         return None
 
+def get_drop_sheets_writer() -> Optional[SheetsAppendWriter]:
+    """Shared append writer for GSHEET_ID (sheet IDs and row cursors stay cached)."""
+    global _sheets_writer
+    if _sheets_writer is None:
+        service = get_sheets_service()
+        if service:
+            _sheets_writer = get_sheets_writer(service, GSHEET_ID)
+    return _sheets_writer
+
+def build_sheet_row(drop_info: Dict, sheet_name: str) -> List:
+    """Row A-V for a new drop in a QA sheet tab."""
+    # Extract user name (same logic as Neon code)
+    user_name = drop_info['contractor_name'].replace('WhatsApp-', '')[:20]
+    
+    # Prepare row data for the sheet
+    today = datetime.now().strftime('%Y/%m/%d')
+    comment = f"Auto-created from WhatsApp {sheet_name} group on {datetime.now().isoformat()}"
+    
+    # Row data matching your sheet structure (A-V columns)
+    # Use boolean values for checkboxes (columns C-P, V)
+    return [
+        today,                                    # A: Date
+        drop_info['drop_number'],                # B: Drop Number  
+        False, False, False, False, False, False, False,  # C-I: Steps 1-7 (checkboxes)
+        False, False, False, False, False, False, False,  # J-P: Steps 8-14 (checkboxes)
+        0,                                       # Q: Completed Photos
+        14,                                      # R: Outstanding Photos
+        user_name,                               # S: User
+        "No",                                    # T: 1MAP Loaded
+        comment,                                 # U: Comment
+        False                                    # V: Incomplete (checkbox for resubmission)
+    ]
+
+def write_drops_to_google_sheets(drops: List[Dict]) -> List[bool]:
+    """
+    Append drops to their Google Sheets tabs - one batchUpdate per tab.
+    
+    Args:
+        drops: Drop information dicts (same as used for Neon)
+        
+    Returns:
+        List[bool]: Success status per drop
+    """
+    results = [False] * len(drops)
+    if not GOOGLE_AVAILABLE or not GSHEET_ID or not GOOGLE_APPLICATION_CREDENTIALS:
+        logger.debug("Google Sheets not configured, skipping sheets write")
+        return results
+    
+    writer = get_drop_sheets_writer()
+    if not writer:
+        return results
+    
+    # Group by sheet tab based on chat JID
+    by_sheet: Dict[str, List[int]] = {}
+    for i, drop_info in enumerate(drops):
+        sheet_name = SHEET_MAPPING.get(drop_info.get('chat_jid'))
+        if not sheet_name:
+            logger.warning(f"Unknown chat JID {drop_info.get('chat_jid')}, skipping Google Sheets write")
+            continue
+        by_sheet.setdefault(sheet_name, []).append(i)
+    
+    for sheet_name, indexes in by_sheet.items():
+        try:
+            first_row = writer.append_rows(
+                sheet_name,
+                [build_sheet_row(drops[i], sheet_name) for i in indexes],
+                checkbox_columns=SHEET_CHECKBOX_COLUMNS
+            )
+            for i in indexes:
+                results[i] = True
+            logger.info(f"📊 ✅ Wrote {', '.join(drops[i]['drop_number'] for i in indexes)} "
+                        f"to Google Sheets '{sheet_name}' tab (from row {first_row})")
+        except Exception as e:
+            logger.error(f"📊 ❌ Failed to write {len(indexes)} drops to Google Sheets '{sheet_name}': {e}")
+    
+    return results
+
 def write_drop_to_google_sheets(drop_info: Dict, dry_run: bool = False) -> bool:
     """
     Write drop number to appropriate Google Sheets tab - called AFTER successful Neon write.
@@ -227,221 +315,41 @@ def write_drop_to_google_sheets(drop_info: Dict, dry_run: bool = False) -> bool:
         bool: Success status
     """
     if dry_run:
-        print(f"🔍 DRY RUN: Would write {drop_info['drop_number']} to Google Sheets")
-        try:
-            logger.info(f"🔍 DRY RUN: Would write {drop_info['drop_number']} to Google Sheets")
-        except NameError:
-            pass
+        logger.info(f"🔍 DRY RUN: Would write {drop_info['drop_number']} to Google Sheets")
         return True
-        
-    if not GOOGLE_AVAILABLE or not GSHEET_ID or not GOOGLE_APPLICATION_CREDENTIALS:
-        try:
-            logger.debug("Google Sheets not configured, skipping sheets write")
-        except NameError:
-            pass
-        return False
-        
-    try:
-        service = get_sheets_service()
-        if not service:
-            return False
-            
-        # Determine which sheet tab to write to based on chat JID
-        chat_jid = drop_info.get('chat_jid')
-        sheet_name = SHEET_MAPPING.get(chat_jid, 'Unknown')
-        if sheet_name == 'Unknown':
-            print(f"Unknown chat JID {chat_jid}, skipping Google Sheets write")
-            try:
-                logger.warning(f"Unknown chat JID {chat_jid}, skipping Google Sheets write")
-            except NameError:
-                pass
-            return False
-            
-        # Extract user name (same logic as Neon code)
-        user_name = drop_info['contractor_name'].replace('WhatsApp-', '')[:20]
-        
-        # Prepare row data for the sheet
-        today = datetime.now().strftime('%Y/%m/%d')
-        comment = f"Auto-created from WhatsApp {sheet_name} group on {datetime.now().isoformat()}"
-        
-        # Row data matching your sheet structure (A-V columns)
-        # Use boolean values for checkboxes (columns C-P, V)
-        row_data = [
-            today,                                    # A: Date
-            drop_info['drop_number'],                # B: Drop Number  
-            False, False, False, False, False, False, False,  # C-I: Steps 1-7 (checkboxes)
-            False, False, False, False, False, False, False,  # J-P: Steps 8-14 (checkboxes)
-            0,                                       # Q: Completed Photos
-            14,                                      # R: Outstanding Photos
-            user_name,                               # S: User
-            "No",                                    # T: 1MAP Loaded
-            comment,                                 # U: Comment
-            False                                    # V: Incomplete (checkbox for resubmission)
-        ]
-        
-        # Find the first empty row (start from row 3 since row 1-2 are headers)
-        # Get current values to find first empty row
-        current_values = service.spreadsheets().values().get(
-            spreadsheetId=GSHEET_ID,
-            range=f"{sheet_name}!A3:A1000"
-        ).execute()
-        
-        existing_rows = current_values.get('values', [])
-        first_empty_row = len(existing_rows) + 3  # +3 because we start from row 3
-        
-        # Write to the specific row (not append to bottom)
-        service.spreadsheets().values().update(
-            spreadsheetId=GSHEET_ID,
-            range=f"{sheet_name}!A{first_empty_row}:V{first_empty_row}",
-            valueInputOption="USER_ENTERED",
-            body={"values": [row_data]}
-        ).execute()
-        
-        # Now format columns C-P as checkboxes (steps 1-14)
-        requests = []
-        
-        # Get sheet ID for the specific sheet tab
-        sheet_metadata = service.spreadsheets().get(spreadsheetId=GSHEET_ID).execute()
-        sheet_id = None
-        for sheet in sheet_metadata['sheets']:
-            if sheet['properties']['title'] == sheet_name:
-                sheet_id = sheet['properties']['sheetId']
-                break
-        
-        if sheet_id is not None:
-            # Format columns C-P (indices 2-15) as checkboxes for QA steps
-            requests.append({
-                "repeatCell": {
-                    "range": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": first_empty_row - 1,  # Convert to 0-based
-                        "endRowIndex": first_empty_row,
-                        "startColumnIndex": 2,  # Column C (0-based)
-                        "endColumnIndex": 16   # Column P (0-based, exclusive)
-                    },
-                    "cell": {
-                        "dataValidation": {
-                            "condition": {
-                                "type": "BOOLEAN"
-                            }
-                        }
-                    },
-                    "fields": "dataValidation"
-                }
-            })
-            
-            # Format column V (index 21) as checkbox for "Incomplete" flag
-            requests.append({
-                "repeatCell": {
-                    "range": {
-                        "sheetId": sheet_id,
-                        "startRowIndex": first_empty_row - 1,  # Convert to 0-based
-                        "endRowIndex": first_empty_row,
-                        "startColumnIndex": 21,  # Column V (0-based)
-                        "endColumnIndex": 22    # Column V (0-based, exclusive)
-                    },
-                    "cell": {
-                        "dataValidation": {
-                            "condition": {
-                                "type": "BOOLEAN"
-                            }
-                        }
-                    },
-                    "fields": "dataValidation"
-                }
-            })
-            
-            # Apply the formatting
-            if requests:
-                service.spreadsheets().batchUpdate(
-                    spreadsheetId=GSHEET_ID,
-                    body={"requests": requests}
-                ).execute()
-        
-        print(f"📊 ✅ Also wrote {drop_info['drop_number']} to Google Sheets '{sheet_name}' tab")
-        # Try to use logger if available, otherwise use print
-        try:
-            logger.info(f"📊 ✅ Also wrote {drop_info['drop_number']} to Google Sheets '{sheet_name}' tab")
-        except NameError:
-            pass
-        return True
-        
-    except Exception as e:
-        print(f"📊 ❌ Failed to write {drop_info['drop_number']} to Google Sheets: {e}")
-        # Try to use logger if available, otherwise use print
-        try:
-            logger.error(f"📊 ❌ Failed to write {drop_info['drop_number']} to Google Sheets: {e}")
-        except NameError:
-            pass
-        return False
+    return write_drops_to_google_sheets([drop_info])[0]
 
-def get_latest_messages_from_sqlite(since_timestamp: datetime, project_filter: str = None) -> Dict[str, List[Dict]]:
-    """Get latest messages from WhatsApp SQLite database for all or specific projects."""
+def get_latest_messages_from_sqlite(after_rowid: int, project_filter: str = None) -> Tuple[Dict[str, List[Dict]], int]:
+    """Get messages inserted after the cursor for all or specific projects.
+    
+    Returns:
+        (messages grouped by project, new cursor position)
+    """
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Format timestamp for SQLite comparison
-        # SQLite timestamps are stored as 'YYYY-MM-DD HH:MM:SS+TZ' format
-        # We need to handle timezone-aware comparison properly
-        if since_timestamp.tzinfo is None:
-            # If since_timestamp has no timezone, assume local timezone
-            from datetime import timezone, timedelta
-            # Assume UTC+2 for consistency with stored timestamps
-            since_timestamp = since_timestamp.replace(tzinfo=timezone(timedelta(hours=2)))
-        
-        timestamp_str = since_timestamp.strftime('%Y-%m-%d %H:%M:%S%z')
-        # Convert to format that matches database (with colon in timezone)
-        if len(timestamp_str) > 19 and timestamp_str[-2:].isdigit():
-            timestamp_str = timestamp_str[:-2] + ':' + timestamp_str[-2:]
-        
-        logger.debug(f"📖 Querying SQLite for messages since: {timestamp_str}")
-        
-        project_messages = {}
-        
         # Get projects to monitor
         projects_to_check = [project_filter] if project_filter else list(PROJECTS.keys())
+        projects_by_jid = {
+            PROJECTS[name]['group_jid']: name for name in projects_to_check if name in PROJECTS
+        }
         
-        for project_name in projects_to_check:
-            if project_name not in PROJECTS:
-                continue
-                
-            project_config = PROJECTS[project_name]
-            group_jid = project_config['group_jid']
-            
-            # Get messages from this project's group since the given timestamp
-            cursor.execute("""
-                SELECT id, content, sender, timestamp, is_from_me
-                FROM messages 
-                WHERE chat_jid = ? AND timestamp > ? AND content != ''
-                ORDER BY timestamp ASC
-            """, (group_jid, timestamp_str))
-            
-            messages = []
-            for row in cursor.fetchall():
-                messages.append({
-                    'id': row[0],
-                    'content': row[1],
-                    'sender': row[2],
-                    'timestamp': datetime.fromisoformat(row[3]),
-                    'is_from_me': bool(row[4]),
-                    'project_name': project_name,
-                    'chat_jid': group_jid
-                })
-            
-            project_messages[project_name] = messages
-            logger.debug(f"📖 Retrieved {len(messages)} messages for {project_name}")
+        logger.debug(f"📖 Querying SQLite for messages after rowid {after_rowid}")
+        messages, last_rowid = read_messages_after(MESSAGES_DB_PATH, after_rowid, projects_by_jid.keys())
+        messages = get_cursor_store().drop_replayed(CURSOR_NAME, messages)
         
-        cursor.close()
-        conn.close()
+        project_messages = {name: [] for name in projects_by_jid.values()}
+        for msg in messages:
+            if not msg['content'] or msg['timestamp'] is None:
+                continue
+            project_name = projects_by_jid[msg['chat_jid']]
+            project_messages[project_name].append(dict(msg, project_name=project_name))
         
         total_messages = sum(len(msgs) for msgs in project_messages.values())
         logger.debug(f"📖 Retrieved {total_messages} messages total from SQLite")
-        return project_messages
+        return project_messages, last_rowid
         
     except Exception as e:
         logger.error(f"Error reading from SQLite: {e}")
-        return {}
+        return {}, after_rowid
 
 def extract_drop_numbers_from_messages(messages: List[Dict]) -> List[Dict]:
     """Extract drop numbers from messages."""
@@ -481,89 +389,9 @@ def extract_drop_numbers_from_messages(messages: List[Dict]) -> List[Dict]:
     
     return found_drops
 
-def get_existing_drop_numbers_from_neon() -> Set[str]:
-    """Get existing DR drop numbers from Neon database."""
-    try:
-        conn = psycopg2.connect(NEON_DB_URL)
-        cursor = conn.cursor()
-        cursor.execute("SELECT drop_number FROM installations WHERE drop_number LIKE 'DR%'")
-        existing = {row[0] for row in cursor.fetchall()}
-        cursor.close()
-        conn.close()
-        return existing
-    except Exception as e:
-        logger.error(f"Error reading from Neon database: {e}")
-        return set()
-
-def create_qa_photo_review(drop_number: str, contractor_name: str, project_name: str = 'Lawley', dry_run: bool = False) -> bool:
-    """Create a QA photo review entry for the drop number."""
-    if dry_run:
-        logger.info(f"🔍 DRY RUN: Would create QA photo review for {drop_number}")
-        return True
-    
-    try:
-        conn = psycopg2.connect(NEON_DB_URL)
-        cursor = conn.cursor()
-        
-        # Check if QA review already exists for today
-        cursor.execute("""
-            SELECT id FROM qa_photo_reviews 
-            WHERE drop_number = %s AND review_date = CURRENT_DATE
-        """, (drop_number,))
-        
-        if cursor.fetchone():
-            logger.debug(f"QA photo review already exists for {drop_number} today")
-            cursor.close()
-            conn.close()
-            return True
-        
-        # Extract user name from contractor (remove WhatsApp- prefix)
-        user_name = contractor_name.replace('WhatsApp-', '')[:20] if contractor_name.startswith('WhatsApp-') else contractor_name[:20]
-        
-        # Insert QA photo review with all steps defaulting to false
-        insert_query = """
-        INSERT INTO qa_photo_reviews (
-            drop_number, 
-            review_date,
-            user_name,
-            project,
-            step_01_property_frontage, step_02_location_before_install,
-            step_03_outside_cable_span, step_04_home_entry_outside,
-            step_05_home_entry_inside, step_06_fibre_entry_to_ont,
-            step_07_patched_labelled_drop, step_08_work_area_completion,
-            step_09_ont_barcode_scan, step_10_ups_serial_number,
-            step_11_powermeter_reading, step_12_powermeter_at_ont,
-            step_13_active_broadband_light, step_14_customer_signature,
-            outstanding_photos_loaded_to_1map,
-            comment
-        ) VALUES (
-            %s, CURRENT_DATE, %s, %s,
-            FALSE, FALSE, FALSE, FALSE, FALSE, FALSE, FALSE,
-            FALSE, FALSE, FALSE, FALSE, FALSE, FALSE, FALSE,
-            FALSE,
-            %s
-        )
-        """
-        
-        comment = f"Auto-created from WhatsApp drop detection on {datetime.now().isoformat()}"
-        
-        cursor.execute(insert_query, (
-            drop_number,
-            user_name,
-            project_name,
-            comment
-        ))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        logger.info(f"📋 Created QA photo review for {drop_number} (user: {user_name})")
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Error creating QA photo review for {drop_number}: {e}")
-        return False
+def get_existing_drop_numbers_from_neon() -> KnownDropNumbers:
+    """Get existing DR drop numbers from Neon (cached, refreshed incrementally)."""
+    return get_known_drop_numbers(NEON_DB_URL)
 
 def insert_drop_numbers_to_neon(drop_data: List[Dict], dry_run: bool = False) -> int:
     """Insert new drop numbers into Neon database and create QA photo reviews."""
@@ -577,67 +405,40 @@ def insert_drop_numbers_to_neon(drop_data: List[Dict], dry_run: bool = False) ->
             logger.info(f"   • Would create QA photo review for {drop['drop_number']}")
         return len(drop_data)
     
+    for drop_info in drop_data:
+        drop_info['agent_notes'] = (
+            f"Auto-imported from WhatsApp on {datetime.now().isoformat()} - "
+            f"Original timestamp: {drop_info['timestamp']} - "
+            f"Message: {drop_info['message_content'][:100]}..."
+        )
+    
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
-        cursor = conn.cursor()
-        
-        insert_query = """
-        INSERT INTO installations (
-            drop_number, 
-            contractor_name, 
-            address, 
-            status, 
-            agent_notes,
-            project_name
-        ) VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        inserted_count = 0
-        for drop_info in drop_data:
-            try:
-                cursor.execute(insert_query, (
-                    drop_info['drop_number'],
-                    drop_info['contractor_name'],
-                    drop_info['address'],
-                    'submitted',
-                    f"Auto-imported from WhatsApp on {datetime.now().isoformat()} - "
-                    f"Original timestamp: {drop_info['timestamp']} - "
-                    f"Message: {drop_info['message_content'][:100]}...",
-                    drop_info.get('project_name', 'Unknown')
-                ))
-                inserted_count += 1
-                logger.info(f"✅ Inserted: {drop_info['drop_number']} from {drop_info['sender']}")
-                
-                # Create QA photo review for this drop
-                create_qa_photo_review(
-                    drop_info['drop_number'], 
-                    drop_info['contractor_name'],
-                    drop_info.get('project_name', 'Unknown'),
-                    dry_run=False
-                )
-                
-                # ✅ DUAL WRITE: Also write to Google Sheets after successful Neon write
-                try:
-                    write_drop_to_google_sheets(drop_info, dry_run=False)
-                except Exception as e:
-                    logger.error(f"Google Sheets dual-write failed for {drop_info['drop_number']}: {e}")
-                    # Continue processing - don't fail if Sheets write fails
-                
-            except Exception as e:
-                logger.error(f"❌ Error inserting {drop_info['drop_number']}: {e}")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        if inserted_count > 0:
-            logger.info(f"🎉 Successfully inserted {inserted_count} new drop numbers!")
-        
-        return inserted_count
-        
+        # Installations + QA photo reviews for the whole batch in one transaction
+        with pg_pool.connect(NEON_DB_URL) as conn:
+            outcomes = ingest_drops(conn, drop_data)
     except Exception as e:
         logger.error(f"❌ Database error during insertion: {e}")
         return 0
+    
+    inserted_drops = []
+    for drop_info in drop_data:
+        if outcomes.get(drop_info['drop_number']) != INSERTED or drop_info['drop_number'] in inserted_drops:
+            continue
+        inserted_drops.append(drop_info['drop_number'])
+        logger.info(f"✅ Inserted: {drop_info['drop_number']} from {drop_info['sender']}")
+        
+        # ✅ DUAL WRITE: queue the Google Sheets row - sheets_outbox.py delivers it with retries
+        if drop_info.get('chat_jid') in SHEET_MAPPING:
+            try:
+                get_sheets_outbox().enqueue('drop_row', drop_info)
+            except Exception as e:
+                logger.error(f"Could not queue Google Sheets write for {drop_info['drop_number']}: {e}")
+    
+    if inserted_drops:
+        get_existing_drop_numbers_from_neon().add(inserted_drops)
+        logger.info(f"🎉 Successfully inserted {len(inserted_drops)} new drop numbers!")
+    
+    return len(inserted_drops)
 
 def send_notification(drop_numbers: List[str], method: str = "log"):
     """Send notification about new drop numbers (placeholder for future implementation)."""
@@ -652,26 +453,101 @@ def send_notification(drop_numbers: List[str], method: str = "log"):
     # - WhatsApp messages to admin
     # - Desktop notifications
 
+def process_new_messages(messages: List[Dict], dry_run: bool = False):
+    """Extract drop numbers from new messages and sync them to Neon / Google Sheets.
+    
+    Messages are dicts with id, content, sender, timestamp, project_name and chat_jid.
+    """
+    # Extract drop numbers from new messages
+    new_drops = extract_drop_numbers_from_messages(messages)
+    
+    if new_drops:
+        logger.info(f"🎯 Found {len(new_drops)} drop numbers in new messages:")
+        for drop in new_drops:
+            logger.info(f"   • {drop['drop_number']} - {drop['timestamp']} - {drop['sender']}")
+        
+        # Check which are actually new vs resubmissions
+        existing_in_neon = get_existing_drop_numbers_from_neon()
+        
+        truly_new_drops = []
+        resubmitted_drops = []
+        
+        for drop in new_drops:
+            if drop['drop_number'] in existing_in_neon:
+                resubmitted_drops.append(drop)
+            else:
+                truly_new_drops.append(drop)
+        
+        # Handle resubmissions first
+        if resubmitted_drops:
+            logger.info(f"🔄 {len(resubmitted_drops)} drop numbers are RESUBMISSIONS")
+            for drop in resubmitted_drops:
+                if not dry_run:
+                    handle_drop_resubmission(
+                        drop['drop_number'],
+                        drop['contractor_name'], 
+                        drop['project_name'],
+                        drop['message_content']
+                    )
+                else:
+                    logger.info(f"🔍 DRY RUN: Would handle resubmission {drop['drop_number']}")
+        
+        # Handle new drops
+        if truly_new_drops:
+            logger.info(f"🆕 {len(truly_new_drops)} drop numbers are new to database")
+            
+            # Send notification
+            new_drop_numbers = [drop['drop_number'] for drop in truly_new_drops]
+            send_notification(new_drop_numbers)
+            
+            # Insert into database
+            inserted = insert_drop_numbers_to_neon(truly_new_drops, dry_run)
+            
+            if inserted > 0:
+                logger.info(f"✅ Successfully synced {inserted} new drop numbers to database!")
+        
+        if not truly_new_drops and not resubmitted_drops:
+            logger.info("ℹ️  No actionable drop numbers found")
+    else:
+        logger.debug("No drop numbers found in new messages")
+
+def handle_messages(messages: List[Dict], dry_run: bool = False):
+    """Message dispatcher handler: drop extraction for all monitored project groups."""
+    projects_by_jid = {config['group_jid']: name for name, config in PROJECTS.items()}
+    project_messages = [
+        dict(msg, project_name=projects_by_jid[msg['chat_jid']])
+        for msg in messages
+        if msg['chat_jid'] in projects_by_jid and msg['content']
+    ]
+    if not project_messages:
+        return
+    
+    # 🚨 CHECK FOR KILL COMMAND FIRST (before any processing)
+    if check_for_kill_command(project_messages):
+        sys.exit(0)
+    
+    process_new_messages(project_messages, dry_run)
+
 def monitor_and_sync(check_interval: int = 30, dry_run: bool = False):
     """Main monitoring loop."""
     global running, monitor_start_time
     
     logger.info("🚀 Starting Real-time Drop Number Monitor...")
     logger.info(f"{'📋 DRY RUN MODE' if dry_run else '💾 LIVE MODE'}")
-    logger.info(f"⏰ Check interval: {check_interval} seconds")
+    logger.info(f"⏰ Max idle interval: {check_interval} seconds (wakes on new messages)")
     logger.info(f"👀 Monitoring groups:")
     for project_name, config in PROJECTS.items():
         logger.info(f"   • {project_name}: {config['group_jid']} ({config['group_description']})")
     logger.info("=" * 70)
     
     # Load persistent state
-    last_check_time = load_monitor_state()
-    processed_message_ids = load_processed_message_ids()
+    last_rowid = load_monitor_state()
+    watcher = get_watcher(MESSAGES_DB_PATH)
     
     while running:
         try:
-            # Get new messages since last check for all projects
-            project_messages = get_latest_messages_from_sqlite(last_check_time)
+            # Get messages inserted since the cursor for all projects
+            project_messages, new_rowid = get_latest_messages_from_sqlite(last_rowid)
             
             # Flatten all messages for processing
             all_new_messages = []
@@ -679,11 +555,12 @@ def monitor_and_sync(check_interval: int = 30, dry_run: bool = False):
                 all_new_messages.extend(messages)
             
             if all_new_messages:
-                logger.info(f"📱 Found {len(all_new_messages)} new messages since {last_check_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                logger.info(f"📱 Found {len(all_new_messages)} new messages after rowid {last_rowid}")
                 
                 # 🚨 CHECK FOR KILL COMMAND FIRST (before any processing)
                 if check_for_kill_command(all_new_messages):
                     # Kill command detected, function will handle stop and exit
+                    save_monitor_state(new_rowid, all_new_messages)
                     sys.exit(0)
                 
                 # Log breakdown by project
@@ -691,86 +568,18 @@ def monitor_and_sync(check_interval: int = 30, dry_run: bool = False):
                     if messages:
                         logger.info(f"   • {project_name}: {len(messages)} messages")
                 
-                # Filter out messages we've already processed
-                unprocessed_messages = [
-                    msg for msg in all_new_messages 
-                    if msg['id'] not in processed_message_ids
-                ]
-                
-                if unprocessed_messages:
-                    # Extract drop numbers from new messages
-                    new_drops = extract_drop_numbers_from_messages(unprocessed_messages)
-                    
-                    if new_drops:
-                        logger.info(f"🎯 Found {len(new_drops)} drop numbers in new messages:")
-                        for drop in new_drops:
-                            logger.info(f"   • {drop['drop_number']} - {drop['timestamp']} - {drop['sender']}")
-                        
-                        # Check which are actually new vs resubmissions
-                        existing_in_neon = get_existing_drop_numbers_from_neon()
-                        
-                        truly_new_drops = []
-                        resubmitted_drops = []
-                        
-                        for drop in new_drops:
-                            if drop['drop_number'] in existing_in_neon:
-                                resubmitted_drops.append(drop)
-                            else:
-                                truly_new_drops.append(drop)
-                        
-                        # Handle resubmissions first
-                        if resubmitted_drops:
-                            logger.info(f"🔄 {len(resubmitted_drops)} drop numbers are RESUBMISSIONS")
-                            for drop in resubmitted_drops:
-                                if not dry_run:
-                                    handle_drop_resubmission(
-                                        drop['drop_number'],
-                                        drop['contractor_name'], 
-                                        drop['project_name'],
-                                        drop['message_content']
-                                    )
-                                else:
-                                    logger.info(f"🔍 DRY RUN: Would handle resubmission {drop['drop_number']}")
-                        
-                        # Handle new drops
-                        if truly_new_drops:
-                            logger.info(f"🆕 {len(truly_new_drops)} drop numbers are new to database")
-                            
-                            # Send notification
-                            new_drop_numbers = [drop['drop_number'] for drop in truly_new_drops]
-                            send_notification(new_drop_numbers)
-                            
-                            # Insert into database
-                            inserted = insert_drop_numbers_to_neon(truly_new_drops, dry_run)
-                            
-                            if inserted > 0:
-                                logger.info(f"✅ Successfully synced {inserted} new drop numbers to database!")
-                        
-                        if not truly_new_drops and not resubmitted_drops:
-                            logger.info("ℹ️  No actionable drop numbers found")
-                    else:
-                        logger.debug("No drop numbers found in new messages")
-                    
-                    # Mark messages as processed
-                    for msg in unprocessed_messages:
-                        processed_message_ids.add(msg['id'])
-                else:
-                    logger.debug("No unprocessed messages found")
-            else:
-                logger.debug(f"📶 No new messages since {last_check_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            # Update last check time to the most recent message timestamp or now
-            if all_new_messages:
-                last_check_time = max(msg['timestamp'] for msg in all_new_messages)
+                process_new_messages(all_new_messages, dry_run)
             else:
-                last_check_time = datetime.now()
+                logger.debug(f"📶 No new messages after rowid {last_rowid}")
             
-            # Save state after processing
-            save_monitor_state(last_check_time, processed_message_ids)
+            # Advance the cursor only once the batch is processed
+            if new_rowid != last_rowid:
+                last_rowid = new_rowid
+                save_monitor_state(last_rowid, all_new_messages)
             
-            # Wait before next check
+            # Wait for the bridge to write new messages (or the interval to pass)
             if running:
-                time.sleep(check_interval)
+                watcher.wait_for_change(check_interval, should_stop=lambda: not running)
                 
         except KeyboardInterrupt:
             logger.info("⚠️  Received keyboard interrupt. Shutting down...")
@@ -830,7 +639,7 @@ def main():
     
     # Test Neon connection
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
+        conn = pg_pool.connect(NEON_DB_URL)
         conn.close()
         logger.info("✅ Neon database connection OK")
     except Exception as e:
@@ -5,16 +5,19 @@ Handles resubmissions of the same drop number by updating existing QA reviews
 instead of trying to create duplicates.
 """
 
-import psycopg2
+import pg_pool
 import logging
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
+from sheets_mirror import find_drop_row_live, patch_row
+from sheets_quota import build_sheets_service
 
 # Google Sheets imports
 try:
     from google.oauth2.service_account import Credentials
-    from googleapiclient.discovery import build
+    # Availability probe only - services are built with sheets_quota.build_sheets_service()
+    import googleapiclient.discovery
     GOOGLE_AVAILABLE = True
 except ImportError:
     GOOGLE_AVAILABLE = False
@@ -55,7 +58,7 @@ def get_sheets_service():
         credentials = Credentials.from_service_account_file(
             GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES
         )
-        return build("sheets", "v4", credentials=credentials, cache_discovery=False)
+        return build_sheets_service(credentials)
     except Exception as e:
         logger.error(f"Failed to create Google Sheets service: {e}")
         return None
@@ -74,24 +77,13 @@ def update_sheet_for_resubmission(drop_number: str, project_name: str) -> bool:
             logger.warning("⚠️  Google Sheets service unavailable - skipping sheet update")
             return False
         
-        # Get all data to find the drop number row
-        result = service.spreadsheets().values().get(
-            spreadsheetId=GSHEET_ID,
-            range=f"{sheet_name}!A:X"
-        ).execute()
-        
-        values = result.get('values', [])
-        target_row = None
-        
-        # Find the row with this drop number (Column B)
-        for row_index, row in enumerate(values):
-            if len(row) > 1 and row[1].strip() == drop_number:
-                target_row = row_index + 1  # Convert to 1-based
-                break
-        
-        if not target_row:
+        # Find the row with this drop number (Column B) in the local sheet mirror,
+        # checked against the live sheet so we never tick another drop's row
+        row_info = find_drop_row_live(sheet_name, drop_number, service)
+        if not row_info:
             logger.warning(f"⚠️  Drop {drop_number} not found in Google Sheets")
             return False
+        target_row = row_info['row_number']
         
         # Update the specific cells: V=FALSE (Incomplete), W=TRUE (Resubmitted), X=FALSE (Completed)
         updates = [
@@ -117,6 +109,7 @@ def update_sheet_for_resubmission(drop_number: str, project_name: str) -> bool:
                 "data": updates
             }
         ).execute()
+        patch_row(sheet_name, target_row, {'V': False, 'W': True, 'X': False})
         
         logger.info(f"📊 ✅ Updated Google Sheets for resubmission: {drop_number} → Column W=TRUE (QA notification)")
         return True
@@ -131,7 +124,7 @@ def handle_drop_resubmission(drop_number: str, contractor_name: str, project_nam
     Updates QA review status and creates resubmission log.
     """
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
+        conn = pg_pool.connect(NEON_DB_URL)
         cursor = conn.cursor()
         
         # Check if drop already exists in installations
@@ -258,7 +251,7 @@ def create_fresh_qa_review(cursor, drop_number: str, contractor_name: str, proje
 def get_resubmitted_drops_needing_notification() -> List[Dict]:
     """Get drops that were resubmitted and QA agents need to be notified."""
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
+        conn = pg_pool.connect(NEON_DB_URL)
         cursor = conn.cursor()
         
         # Get resubmitted drops where QA review was reset but not yet reviewed
@@ -15,7 +15,7 @@ import argparse
 import re
 import time
 import sqlite3
-import psycopg2
+import pg_pool
 from datetime import datetime, timedelta
 from typing import Set, List, Dict, Optional, Tuple
 import logging
@@ -24,6 +24,7 @@ import signal
 import sys
 import json
 import traceback
+from drop_ingest import EXISTS, INSERTED, ingest_drops
 
 # Configuration
 LAWLEY_GROUP_JID = '120363418298130331@g.us'
@@ -168,7 +169,7 @@ def test_database_connections() -> bool:
     
     # Test Neon
     try:
-        neon_conn = psycopg2.connect(NEON_DB_URL, connect_timeout=10)
+        neon_conn = pg_pool.connect(NEON_DB_URL)
         cursor = neon_conn.cursor()
         cursor.execute("SELECT 1")
         cursor.fetchone()
@@ -258,7 +259,8 @@ def extract_drop_numbers_from_messages(messages: List[Dict]) -> List[Dict]:
                 'contractor_name': contractor_name,
                 'timestamp': msg['timestamp'],
                 'message_content': content,
-                'address': 'Extracted from WhatsApp Lawley Activation 3 group'
+                'address': 'Extracted from WhatsApp Lawley Activation 3 group',
+                'project_name': 'Lawley'
             }
             
             found_drops.append(drop_info)
@@ -266,67 +268,8 @@ def extract_drop_numbers_from_messages(messages: List[Dict]) -> List[Dict]:
     
     return found_drops
 
-def verify_drop_not_exists(neon_cursor, drop_number: str) -> bool:
-    """Verify drop number doesn't already exist in Neon."""
-    neon_cursor.execute("SELECT id FROM installations WHERE drop_number = %s", (drop_number,))
-    return neon_cursor.fetchone() is None
-
-def create_installation_record(neon_cursor, drop_info: Dict) -> bool:
-    """Create installation record with full error handling."""
-    try:
-        neon_cursor.execute("""
-            INSERT INTO installations (
-                drop_number, contractor_name, address, status,
-                completion_percentage, date_submitted, created_at, updated_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            drop_info['drop_number'],
-            drop_info['contractor_name'],
-            drop_info['address'],
-            'submitted',
-            0,
-            drop_info['timestamp'],
-            drop_info['timestamp'],
-            datetime.now()
-        ))
-        logger.info(f"✅ Created installation record for {drop_info['drop_number']}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to create installation for {drop_info['drop_number']}: {e}")
-        return False
-
-def create_qa_review(neon_cursor, drop_info: Dict) -> bool:
-    """Create QA review with full error handling."""
-    try:
-        user_name = drop_info['contractor_name'].replace('WhatsApp-', '')[:20]
-        
-        neon_cursor.execute("""
-            INSERT INTO qa_photo_reviews (
-                drop_number, review_date, user_name,
-                step_01_property_frontage, step_02_location_before_install, 
-                step_03_outside_cable_span, step_04_home_entry_outside, 
-                step_05_home_entry_inside, step_06_fibre_entry_to_ont,
-                step_07_patched_labelled_drop, step_08_work_area_completion,
-                step_09_ont_barcode_scan, step_10_ups_serial_number,
-                step_11_powermeter_reading, step_12_powermeter_at_ont,
-                step_13_active_broadband_light, step_14_customer_signature,
-                outstanding_photos_loaded_to_1map
-            ) VALUES (%s, CURRENT_DATE, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            drop_info['drop_number'], user_name,
-            False, False, False, False, False, False, False, False,
-            False, False, False, False, False, False, False
-        ))
-        logger.info(f"✅ Created QA review for {drop_info['drop_number']}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to create QA review for {drop_info['drop_number']}: {e}")
-        return False
-
 def process_drop_numbers_to_neon(drop_numbers: List[Dict], dry_run: bool = False) -> int:
-    """Process drop numbers with atomic transactions and validation."""
+    """Process drop numbers (installation + QA review) in one atomic batch."""
     if not drop_numbers:
         return 0
         
@@ -336,53 +279,23 @@ def process_drop_numbers_to_neon(drop_numbers: List[Dict], dry_run: bool = False
             logger.info(f"🔍 Would create records for {drop_info['drop_number']}")
         return len(drop_numbers)
     
-    processed_count = 0
-    
     try:
-        neon_conn = psycopg2.connect(NEON_DB_URL, connect_timeout=30)
-        neon_conn.set_session(autocommit=False)  # Explicit transaction control
-        neon_cursor = neon_conn.cursor()
-        
-        for drop_info in drop_numbers:
-            drop_number = drop_info['drop_number']
-            
-            try:
-                # Start transaction for this drop
-                logger.info(f"🔄 Processing {drop_number}...")
-                
-                # Check if already exists
-                if not verify_drop_not_exists(neon_cursor, drop_number):
-                    logger.info(f"⚠️ {drop_number}: Already exists in database, skipping")
-                    continue
-                
-                # Create installation record
-                if not create_installation_record(neon_cursor, drop_info):
-                    logger.error(f"Failed to create installation for {drop_number}")
-                    continue
-                
-                # Create QA review
-                if not create_qa_review(neon_cursor, drop_info):
-                    logger.error(f"Failed to create QA review for {drop_number}")
-                    # Rollback the installation too
-                    neon_conn.rollback()
-                    continue
-                
-                # Commit this drop's transaction
-                neon_conn.commit()
-                processed_count += 1
-                logger.info(f"🎉 Successfully processed {drop_number}")
-                
-            except Exception as e:
-                logger.error(f"Error processing {drop_number}: {e}")
-                neon_conn.rollback()
-                continue
-        
-        neon_conn.close()
-        
+        with pg_pool.connect(NEON_DB_URL) as neon_conn:
+            outcomes = ingest_drops(neon_conn, drop_numbers)
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         return 0
     
+    processed_count = 0
+    for drop_number, outcome in outcomes.items():
+        if outcome == INSERTED:
+            processed_count += 1
+            logger.info(f"🎉 Successfully processed {drop_number}")
+        elif outcome == EXISTS:
+            logger.info(f"⚠️ {drop_number}: Already exists in database, skipping")
+        else:
+            logger.error(f"Failed to create records for {drop_number}")
+    
     logger.info(f"✅ Successfully processed {processed_count}/{len(drop_numbers)} drop numbers")
     return processed_count
 
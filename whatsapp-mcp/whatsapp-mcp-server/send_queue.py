@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Send Queue
+===================
+
+Durable outbound queue in front of the bridge's /api/send.
+
+Callers used to POST to the bridge inline, with no timeout or retry, and
+each one invented its own pacing (QA feedback slept 2 seconds between
+messages). Now `whatsapp.queue_message()` writes the message to a local
+SQLite file (WA_SEND_QUEUE_PATH) and returns straight away; sender threads
+deliver it:
+
+- Idempotency: a message whose key (given, or derived from recipient +
+  content) was queued or sent in the last WA_SEND_DEDUP_SECONDS is not
+  queued again
+- Per-recipient pacing: at most one message per WA_SEND_RECIPIENT_INTERVAL
+  seconds to the same chat, in the order they were queued
+- Bounded concurrency: WA_SEND_CONCURRENCY sender threads per process
+- Retry with exponential backoff + jitter; after WA_SEND_MAX_ATTEMPTS a
+  message is parked as 'failed' (requeue with --retry-failed)
+- Status tracking per message: pending -> sending -> sent / failed
+- Delivery hooks: a message can name an entry of SENT_HOOKS to run once it
+  has actually been delivered (e.g. recording QA feedback as sent), in
+  whichever process delivers it
+
+Claims, pacing and ordering are decided inside one SQLite write transaction,
+so several processes sharing the file never send a message twice. A
+message claimed by a process that died is picked up again once its lease
+(WA_SEND_LEASE_SECONDS) runs out. At exit a process waits up to
+WA_SEND_EXIT_FLUSH_SECONDS for the messages it queued itself; anything
+still queued after that is delivered by the long-running
+`python send_queue.py` service.
+
+Usage:
+    success, response = whatsapp.queue_message(group_jid, message)
+
+    python send_queue.py [--status] [--once] [--retry-failed]
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import importlib
+import atexit
+import random
+import sqlite3
+import hashlib
+import argparse
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WA_SEND_QUEUE_PATH = os.getenv(
+    'WA_SEND_QUEUE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wa_send_queue.db')
+)
+WA_SEND_CONCURRENCY = int(os.getenv('WA_SEND_CONCURRENCY', '2'))
+WA_SEND_RECIPIENT_INTERVAL = float(os.getenv('WA_SEND_RECIPIENT_INTERVAL', '2'))
+WA_SEND_DEDUP_SECONDS = float(os.getenv('WA_SEND_DEDUP_SECONDS', '3600'))
+WA_SEND_MAX_ATTEMPTS = int(os.getenv('WA_SEND_MAX_ATTEMPTS', '8'))
+WA_SEND_RETRY_BASE_SECONDS = float(os.getenv('WA_SEND_RETRY_BASE_SECONDS', '5'))
+WA_SEND_RETRY_MAX_SECONDS = float(os.getenv('WA_SEND_RETRY_MAX_SECONDS', '600'))
+WA_SEND_LEASE_SECONDS = float(os.getenv('WA_SEND_LEASE_SECONDS', '120'))
+WA_SEND_POLL_SECONDS = float(os.getenv('WA_SEND_POLL_SECONDS', '2'))
+WA_SEND_EXIT_FLUSH_SECONDS = float(os.getenv('WA_SEND_EXIT_FLUSH_SECONDS', '30'))
+# Sent messages are kept this long for status lookups and dedup
+WA_SEND_KEEP_DAYS = int(os.getenv('WA_SEND_KEEP_DAYS', '7'))
+
+# on_sent hook name -> "module:function", called with the hook's args after delivery
+SENT_HOOKS = {
+    'qa_feedback_sent': 'qa_feedback_communicator:mark_feedback_sent',
+}
+
+running = True
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+def message_key(recipient: str, message: Optional[str] = None, media_path: Optional[str] = None,
+                reply_to: Optional[str] = None) -> str:
+    """Default idempotency key - the same content to the same chat."""
+    content = '\x1f'.join([recipient, message or '', media_path or '', reply_to or ''])
+    return 'sha1:' + hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+class SendQueue:
+    """SQLite-backed queue of outbound WhatsApp messages."""
+
+    def __init__(self, path: str = WA_SEND_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode - write transactions are opened with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS wa_send_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                message TEXT,
+                media_path TEXT,
+                reply_to TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                lease_until REAL,
+                last_error TEXT,
+                response TEXT,
+                created_at TEXT NOT NULL,
+                sent_at REAL,
+                on_sent TEXT
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(wa_send_queue)")}
+        if 'on_sent' not in columns:
+            # Queue files created before delivery hooks existed
+            self._conn.execute("ALTER TABLE wa_send_queue ADD COLUMN on_sent TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_wa_send_due ON wa_send_queue(status, next_attempt_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_wa_send_key ON wa_send_queue(idempotency_key)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_wa_send_recipient ON wa_send_queue(recipient, status, id)"
+        )
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS wa_send_pacing (
+                recipient TEXT PRIMARY KEY,
+                next_send_at REAL NOT NULL
+            )
+        """)
+
+    def _write(self, fn):
+        """Run fn(conn) in one write transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, recipient: str, message: Optional[str] = None, media_path: Optional[str] = None,
+                reply_to: Optional[str] = None, idempotency_key: Optional[str] = None,
+                on_sent: Optional[Tuple] = None) -> Tuple[int, bool]:
+        """Queue a message. Returns (job id, False) - or (existing id, True) if it's a duplicate.
+
+        Args:
+            on_sent: (hook name, *args) - SENT_HOOKS entry to call once the message is delivered
+        """
+        key = idempotency_key or message_key(recipient, message, media_path, reply_to)
+        encoded_hook = json.dumps(list(on_sent)) if on_sent else None
+
+        def insert(conn):
+            existing = conn.execute("""
+                SELECT id FROM wa_send_queue
+                WHERE idempotency_key = ?
+                  AND (status IN ('pending', 'sending') OR COALESCE(sent_at, 0) >= ?)
+                ORDER BY id DESC LIMIT 1
+            """, (key, time.time() - WA_SEND_DEDUP_SECONDS)).fetchone()
+            if existing:
+                return existing[0], True
+            cursor = conn.execute("""
+                INSERT INTO wa_send_queue(idempotency_key, recipient, message, media_path, reply_to,
+                                          next_attempt_at, created_at, on_sent)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key, recipient, message, media_path, reply_to, time.time(), datetime.now().isoformat(),
+                  encoded_hook))
+            return cursor.lastrowid, False
+
+        return self._write(insert)
+
+    def claim(self) -> Optional[Dict]:
+        """Claim the next deliverable message, honouring per-recipient order and pacing."""
+        def claim_one(conn):
+            now = time.time()
+            # Messages held by a process that died
+            conn.execute("""
+                UPDATE wa_send_queue SET status = 'pending'
+                WHERE status = 'sending' AND lease_until < ?
+            """, (now,))
+            row = conn.execute("""
+                SELECT q.id, q.recipient, q.message, q.media_path, q.reply_to, q.attempts, q.on_sent
+                FROM wa_send_queue q
+                LEFT JOIN wa_send_pacing p ON p.recipient = q.recipient
+                WHERE q.status = 'pending' AND q.next_attempt_at <= ?
+                  AND COALESCE(p.next_send_at, 0) <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM wa_send_queue e
+                      WHERE e.recipient = q.recipient AND e.id < q.id
+                        AND e.status IN ('pending', 'sending')
+                  )
+                ORDER BY q.id
+                LIMIT 1
+            """, (now, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE wa_send_queue SET status = 'sending', lease_until = ? WHERE id = ?",
+                (now + WA_SEND_LEASE_SECONDS, row[0])
+            )
+            conn.execute("""
+                INSERT INTO wa_send_pacing(recipient, next_send_at) VALUES (?, ?)
+                ON CONFLICT(recipient) DO UPDATE SET next_send_at = excluded.next_send_at
+            """, (row[1], now + WA_SEND_RECIPIENT_INTERVAL))
+            return {
+                'id': row[0], 'recipient': row[1], 'message': row[2],
+                'media_path': row[3], 'reply_to': row[4], 'attempts': row[5],
+                'on_sent': json.loads(row[6]) if row[6] else None,
+            }
+
+        return self._write(claim_one)
+
+    def mark_sent(self, job: Dict, response: str):
+        self._write(lambda conn: conn.execute("""
+            UPDATE wa_send_queue
+            SET status = 'sent', attempts = attempts + 1, sent_at = ?, response = ?, lease_until = NULL
+            WHERE id = ?
+        """, (time.time(), (response or '')[:500], job['id'])))
+
+    def mark_failed(self, job: Dict, error: str):
+        """Schedule a retry with backoff, or park the message after too many attempts."""
+        attempts = job['attempts'] + 1
+        delay = min(WA_SEND_RETRY_BASE_SECONDS * 2 ** (attempts - 1), WA_SEND_RETRY_MAX_SECONDS)
+        delay += random.uniform(0, delay / 4)
+        status = FAILED if attempts >= WA_SEND_MAX_ATTEMPTS else PENDING
+        self._write(lambda conn: conn.execute("""
+            UPDATE wa_send_queue
+            SET attempts = ?, status = ?, next_attempt_at = ?, last_error = ?, lease_until = NULL
+            WHERE id = ?
+        """, (attempts, status, time.time() + delay, (error or '')[:500], job['id'])))
+        if status == FAILED:
+            logger.error(f"📤 ❌ WhatsApp message {job['id']} to {job['recipient']} "
+                         f"gave up after {attempts} attempts: {error}")
+        else:
+            logger.warning(f"📤 ⚠️  WhatsApp message {job['id']} to {job['recipient']} failed "
+                           f"(attempt {attempts}), retrying in {delay:.1f}s: {error}")
+
+    def status(self, job_id: int) -> Optional[Dict]:
+        """Delivery status of one message."""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT status, attempts, last_error, response, created_at, sent_at
+                FROM wa_send_queue WHERE id = ?
+            """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': job_id, 'status': row[0], 'attempts': row[1], 'last_error': row[2],
+            'response': row[3], 'created_at': row[4],
+            'sent_at': datetime.fromtimestamp(row[5]).isoformat() if row[5] else None,
+        }
+
+    def unfinished(self, job_ids: List[int]) -> int:
+        """How many of these messages are still pending or being sent."""
+        if not job_ids:
+            return 0
+        placeholders = ','.join('?' * len(job_ids))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM wa_send_queue WHERE status IN ('pending', 'sending') AND id IN ({placeholders})",
+                job_ids
+            ).fetchone()[0]
+
+    def retry_failed(self) -> int:
+        """Requeue parked messages. Returns how many."""
+        return self._write(lambda conn: conn.execute("""
+            UPDATE wa_send_queue SET status = 'pending', attempts = 0, next_attempt_at = ?
+            WHERE status = 'failed'
+        """, (time.time(),)).rowcount)
+
+    def purge(self, keep_days: int = WA_SEND_KEEP_DAYS) -> int:
+        """Delete sent messages older than keep_days."""
+        cutoff = time.time() - keep_days * 86400
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM wa_send_queue WHERE status = 'sent' AND sent_at < ?", (cutoff,)
+        ).rowcount)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of messages per status."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM wa_send_queue GROUP BY status"
+            ).fetchall())
+
+def run_sent_hook(job: Dict):
+    """Call a delivered message's on_sent hook (errors are logged, never raised)."""
+    if not job.get('on_sent'):
+        return
+    name, *args = job['on_sent']
+    try:
+        module_name, function_name = SENT_HOOKS[name].split(':')
+        getattr(importlib.import_module(module_name), function_name)(*args)
+    except Exception as e:
+        logger.error(f"❌ on_sent hook {name}{tuple(args)} for WhatsApp message {job['id']} failed: {e}")
+
+def deliver(job: Dict) -> Tuple[bool, str]:
+    """Send one queued message through the bridge."""
+    import whatsapp
+    if job['media_path']:
+        return whatsapp.send_file(job['recipient'], job['media_path'])
+    if job['reply_to']:
+        return whatsapp.send_message_reply(job['recipient'], job['message'], job['reply_to'])
+    return whatsapp.send_message(job['recipient'], job['message'])
+
+class SendQueueWorker:
+    """Sender threads draining a SendQueue."""
+
+    def __init__(self, queue: SendQueue, concurrency: int = WA_SEND_CONCURRENCY):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._own_ids: List[int] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._run, name=f"wa-sender-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self, job_id: Optional[int] = None):
+        """A message was queued - wake a sender."""
+        if job_id is not None:
+            with self._lock:
+                self._own_ids.append(job_id)
+        self._wake.set()
+
+    def deliver_one(self) -> bool:
+        """Claim and deliver one message. Returns False if nothing was deliverable."""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        try:
+            success, response = deliver(job)
+        except Exception as e:
+            success, response = False, f"Unexpected error: {e}"
+        if success:
+            self.queue.mark_sent(job, response)
+            logger.info(f"📤 ✅ WhatsApp message {job['id']} delivered to {job['recipient']}")
+            run_sent_hook(job)
+        else:
+            self.queue.mark_failed(job, response)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.deliver_one():
+                    continue
+            except sqlite3.Error as e:
+                logger.error(f"❌ Send queue error: {e}")
+            # Nothing deliverable right now (empty, paced or backing off)
+            self._wake.wait(WA_SEND_POLL_SECONDS)
+            self._wake.clear()
+
+    def flush(self, timeout: float = WA_SEND_EXIT_FLUSH_SECONDS) -> int:
+        """Wait for the messages this process queued. Returns how many are still unsent."""
+        with self._lock:
+            own_ids = list(self._own_ids)
+        deadline = time.monotonic() + timeout
+        remaining = self.queue.unfinished(own_ids)
+        while remaining and time.monotonic() < deadline:
+            self._wake.set()
+            time.sleep(0.2)
+            remaining = self.queue.unfinished(own_ids)
+        if remaining:
+            logger.warning(f"📤 {remaining} queued WhatsApp messages not delivered yet - "
+                           f"they stay in {self.queue.path}")
+        return remaining
+
+_queues: Dict[str, SendQueue] = {}
+_workers: Dict[str, SendQueueWorker] = {}
+_queues_lock = threading.Lock()
+
+def get_send_queue(path: str = WA_SEND_QUEUE_PATH) -> SendQueue:
+    """Get the shared queue for path."""
+    key = os.path.abspath(path)
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = SendQueue(key)
+            _queues[key] = queue
+    return queue
+
+def get_send_worker(path: str = WA_SEND_QUEUE_PATH) -> SendQueueWorker:
+    """Get this process's running sender for path (started on first use)."""
+    key = os.path.abspath(path)
+    queue = get_send_queue(key)
+    with _queues_lock:
+        worker = _workers.get(key)
+        if worker is None:
+            worker = SendQueueWorker(queue)
+            _workers[key] = worker
+            atexit.register(worker.flush)
+    worker.start()
+    return worker
+
+def queue_message(recipient: str, message: Optional[str] = None, media_path: Optional[str] = None,
+                  reply_to: Optional[str] = None, idempotency_key: Optional[str] = None,
+                  on_sent: Optional[Tuple] = None) -> Tuple[bool, str]:
+    """Queue a message for delivery and return immediately.
+
+    Args:
+        on_sent: (hook name, *args) - SENT_HOOKS entry to call once the message is delivered
+
+    Returns:
+        Tuple of (queued: bool, response_message: str). Duplicates count as queued.
+    """
+    if not recipient:
+        return False, "Recipient must be provided"
+    if not message and not media_path:
+        return False, "Message or media path must be provided"
+    if media_path and not os.path.isfile(media_path):
+        return False, f"Media file not found: {media_path}"
+
+    try:
+        worker = get_send_worker()
+        job_id, duplicate = worker.queue.enqueue(recipient, message, media_path, reply_to, idempotency_key,
+                                                 on_sent)
+        status = worker.queue.status(job_id) if duplicate and on_sent else None
+    except sqlite3.Error as e:
+        return False, f"Send queue error: {e}"
+
+    if duplicate:
+        logger.info(f"📤 Duplicate WhatsApp message to {recipient} skipped (already job {job_id})")
+        if status and status['status'] == SENT:
+            # Already delivered - the hook's condition holds now
+            run_sent_hook({'id': job_id, 'on_sent': list(on_sent)})
+        return True, f"Duplicate of queued message {job_id}"
+    worker.notify(job_id)
+    return True, f"Queued as message {job_id}"
+
+def message_status(job_id: int) -> Optional[Dict]:
+    """Delivery status of a queued message."""
+    return get_send_queue().status(job_id)
+
+def signal_handler(signum, frame):
+    """Handle graceful shutdown."""
+    global running
+    logger.info(f"Received signal {signum}. Shutting down gracefully...")
+    running = False
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('send_queue.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    parser = argparse.ArgumentParser(description='WhatsApp outbound send queue')
+    parser.add_argument('--status', action='store_true', help='Show queue counts and exit')
+    parser.add_argument('--once', action='store_true', help='Deliver what is deliverable and exit')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Requeue messages that exhausted their retries')
+    args = parser.parse_args()
+
+    queue = get_send_queue()
+    if args.retry_failed:
+        logger.info(f"🔄 Requeued {queue.retry_failed()} failed WhatsApp messages")
+    if args.status:
+        logger.info(f"📋 Send queue ({queue.path}): {queue.counts() or 'empty'}")
+        return
+
+    logger.info(f"🧹 Purged {queue.purge()} old sent messages")
+    worker = SendQueueWorker(queue)
+    if args.once:
+        delivered = 0
+        while worker.deliver_one():
+            delivered += 1
+        logger.info(f"📤 Delivered/attempted {delivered} messages")
+        return
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    logger.info(f"🚀 Starting WhatsApp send queue worker ({queue.path})")
+    worker.start()
+    last_report = time.monotonic()
+    while running:
+        time.sleep(1)
+        if time.monotonic() - last_report >= 60:
+            logger.info(f"📋 Queue: {queue.counts() or 'empty'}")
+            last_report = time.monotonic()
+    worker.stop()
+    logger.info("🛑 Send queue worker stopped")
+
+if __name__ == "__main__":
+    main()
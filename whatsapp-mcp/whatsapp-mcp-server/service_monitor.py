@@ -58,10 +58,10 @@ SERVICES = {
         "groups": ["All"],
         "critical": True
     },
-    "realtime_drop_monitor": {
-        "name": "Real-time Drop Monitor",
-        "description": "Monitors all groups for DR numbers",
-        "script": "realtime_drop_monitor.py --interval 15",
+    "message_dispatcher": {
+        "name": "Message Dispatcher",
+        "description": "Fans new messages out to the kill switch, drop extraction and resubmission handlers",
+        "script": "message_dispatcher.py --interval 15",
         "groups": ["Lawley", "Velo Test", "Mohadin"],
         "critical": True
     },
@@ -72,18 +72,18 @@ SERVICES = {
         "groups": ["Velo Test", "Mohadin"],
         "critical": True
     },
-    "whatsapp_message_monitor": {
-        "name": "Velo Test Resubmission Monitor",
-        "description": "Monitors Velo Test for resubmissions",
-        "script": "whatsapp_message_monitor.py --interval 30",
-        "groups": ["Velo Test"],
+    "sheets_outbox": {
+        "name": "Google Sheets Writer",
+        "description": "Delivers queued Google Sheets rows with retries",
+        "script": "sheets_outbox.py --interval 5",
+        "groups": ["Velo Test", "Mohadin"],
         "critical": False
     },
-    "mohadin_message_monitor": {
-        "name": "Mohadin Resubmission Monitor",
-        "description": "Monitors Mohadin for resubmissions",
-        "script": "mohadin_message_monitor.py --interval 30",
-        "groups": ["Mohadin"],
+    "send_queue": {
+        "name": "WhatsApp Sender",
+        "description": "Delivers queued WhatsApp messages and runs their sent hooks",
+        "script": "send_queue.py",
+        "groups": ["Lawley", "Velo Test", "Mohadin"],
         "critical": False
     }
 }
@@ -119,10 +119,10 @@ def check_service_status(service_name, service_info):
 def get_last_log_info(script_name):
     """Get last log entry info for a script"""
     log_files = {
-        "realtime_drop_monitor": "realtime_monitor.log",
+        "message_dispatcher": "message_dispatcher.log",
         "google_sheets_qa_monitor": "google_sheets_qa_monitor.log",
-        "whatsapp_message_monitor": "whatsapp_message_monitor.log",
-        "mohadin_message_monitor": "mohadin_message_monitor.log"
+        "sheets_outbox": "sheets_outbox.log",
+        "send_queue": "send_queue.log"
     }
 
     log_file = log_files.get(script_name)
@@ -169,11 +169,11 @@ def get_monitor_state():
                 state = json.load(f)
                 return {
                     "last_check": state.get("last_check_time", "Unknown"),
-                    "processed_messages": len(state.get("processed_message_ids", []))
+                    "last_rowid": state.get("last_rowid", "Unknown")
                 }
     except Exception:
         pass
-    return {"last_check": "Unknown", "processed_messages": 0}
+    return {"last_check": "Unknown", "last_rowid": "Unknown"}
 
 # Header
 st.title("📱 WA_Tool Service Monitoring Dashboard")
@@ -271,7 +271,7 @@ with col1:
     st.subheader("Monitor State")
     monitor_state = get_monitor_state()
     st.write(f"**Last Check:** {monitor_state['last_check']}")
-    st.write(f"**Processed Messages:** {monitor_state['processed_messages']}")
+    st.write(f"**Message Cursor (rowid):** {monitor_state['last_rowid']}")
 
 with col2:
     st.subheader("Database Status")
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Local Mirror of the QA Google Sheet Tabs
+========================================
+
+SQLite copy (SHEETS_MIRROR_PATH) of the QA tabs ("Velo Test", "Mohadin"),
+one row per sheet row, indexed by drop number.
+
+Readers that used to download whole tabs - sometimes once per drop, just to
+find one row by scanning column B - query the mirror instead:
+- read_tab(sheet)                 all rows, same shape as values.get
+- find_drop_row(sheet, drop)      {'row_number', 'data'} via the drop index
+- find_drop_row_live(sheet, drop) same, with the row checked in the real sheet
+                                  first - use it to pick the row to write to
+- patch_row(sheet, row, {...})    write-through after updating the real sheet
+
+Keeping it fresh:
+- google_sheets_qa_monitor already polls every tab (one batchGet, only when
+  the spreadsheet changed) and feeds each poll into the mirror
+- `python sheets_mirror.py --interval 60` does the same standalone
+- a reader that finds its tab older than SHEETS_MIRROR_MAX_AGE (sync service
+  down) refreshes it with one batchGet; a drop-number miss triggers one
+  refresh if the tab is older than SHEETS_MIRROR_MISS_REFRESH_AGE (row added
+  since the last sync)
+
+A mirrored row number can be up to SHEETS_MIRROR_MAX_AGE old, and rows may
+have been inserted, deleted or sorted in the meantime, so writers go through
+find_drop_row_live: it reads B{row} from the real sheet and, if that no
+longer holds the drop, refreshes the tab and looks the drop up again.
+
+Only rows whose content changed are rewritten on sync. Cell values are stored
+as the Sheets API formats them by default ('TRUE'/'FALSE', '14', ...), so
+existing row parsers work unchanged.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import sqlite3
+import hashlib
+import argparse
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SHEETS_MIRROR_PATH = os.getenv(
+    'SHEETS_MIRROR_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sheets_mirror.db')
+)
+# A tab older than this is refreshed by the reader itself
+SHEETS_MIRROR_MAX_AGE = float(os.getenv('SHEETS_MIRROR_MAX_AGE', '300'))
+# On a drop-number miss, refresh once if the tab is older than this
+SHEETS_MIRROR_MISS_REFRESH_AGE = float(os.getenv('SHEETS_MIRROR_MISS_REFRESH_AGE', '15'))
+
+QA_SHEET_NAMES = ["Velo Test", "Mohadin"]
+MIRROR_COLUMNS = "A:Z"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+GSHEET_ID = os.getenv("GSHEET_ID")
+GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+
+running = True
+
+def normalise_cell(value) -> str:
+    """Cell value as the Sheets API's default FORMATTED_VALUE rendering would give it."""
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def column_index(letter: str) -> int:
+    """0-based index of a column letter (A-Z)."""
+    return ord(letter.upper()) - ord('A')
+
+class SheetsMirror:
+    """SQLite mirror of Google Sheet tabs, indexed by drop number."""
+
+    def __init__(self, path: str = SHEETS_MIRROR_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sheet_rows (
+                sheet_name TEXT NOT NULL,
+                row_number INTEGER NOT NULL,
+                drop_number TEXT,
+                row_hash TEXT NOT NULL,
+                row_values TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (sheet_name, row_number)
+            );
+            CREATE INDEX IF NOT EXISTS idx_sheet_rows_drop ON sheet_rows(sheet_name, drop_number);
+            CREATE TABLE IF NOT EXISTS sheet_sync (
+                sheet_name TEXT PRIMARY KEY,
+                synced_at REAL NOT NULL,
+                row_count INTEGER NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _drop_number(row: List[str]) -> Optional[str]:
+        # Column B is drop number
+        drop_number = row[1].strip().upper() if len(row) > 1 else ''
+        return drop_number or None
+
+    def apply_tab(self, sheet_name: str, values: List[List]) -> int:
+        """Replace a tab's contents with a fresh read. Returns rows changed."""
+        rows = [[normalise_cell(v) for v in row] for row in values]
+        now = datetime.now().isoformat()
+        with self._lock:
+            known = dict(self._conn.execute(
+                "SELECT row_number, row_hash FROM sheet_rows WHERE sheet_name = ?", (sheet_name,)
+            ).fetchall())
+
+            changed = []
+            for row_index, row in enumerate(rows):
+                row_number = row_index + 1
+                encoded = json.dumps(row)
+                row_hash = hashlib.sha1(encoded.encode()).hexdigest()
+                if known.get(row_number) != row_hash:
+                    changed.append((sheet_name, row_number, self._drop_number(row), row_hash, encoded, now))
+
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO sheet_rows
+                (sheet_name, row_number, drop_number, row_hash, row_values, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, changed)
+            self._conn.execute(
+                "DELETE FROM sheet_rows WHERE sheet_name = ? AND row_number > ?", (sheet_name, len(rows))
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sheet_sync(sheet_name, synced_at, row_count) VALUES (?, ?, ?)",
+                (sheet_name, time.time(), len(rows))
+            )
+            self._conn.commit()
+
+        if changed:
+            logger.debug(f"🪞 Mirror '{sheet_name}': {len(changed)} rows changed")
+        return len(changed)
+
+    def touch(self, sheet_names: Iterable[str]):
+        """Mark already-synced tabs as current (the sheet is known to be unchanged)."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE sheet_sync SET synced_at = ? WHERE sheet_name = ?",
+                [(time.time(), sheet_name) for sheet_name in sheet_names]
+            )
+            self._conn.commit()
+
+    def age(self, sheet_name: str) -> Optional[float]:
+        """Seconds since the tab was last synced (None if never)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM sheet_sync WHERE sheet_name = ?", (sheet_name,)
+            ).fetchone()
+        return time.time() - row[0] if row else None
+
+    def get_tab_values(self, sheet_name: str) -> List[List[str]]:
+        """All rows of a tab in sheet order (like values.get)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_number, row_values FROM sheet_rows WHERE sheet_name = ? ORDER BY row_number",
+                (sheet_name,)
+            ).fetchall()
+        values: List[List[str]] = []
+        for row_number, encoded in rows:
+            while len(values) < row_number - 1:
+                values.append([])
+            values.append(json.loads(encoded))
+        return values
+
+    def get_drop_row(self, sheet_name: str, drop_number: str) -> Optional[Dict]:
+        """First row of a tab with this drop number in column B."""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT row_number, row_values FROM sheet_rows
+                WHERE sheet_name = ? AND drop_number = ?
+                ORDER BY row_number LIMIT 1
+            """, (sheet_name, drop_number.strip().upper())).fetchone()
+        if not row:
+            return None
+        return {'row_number': row[0], 'data': json.loads(row[1])}
+
+    def patch_row(self, sheet_name: str, row_number: int, updates: Dict[str, object]):
+        """Apply cell updates ({'W': True, ...}) we just made to the real sheet."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_values FROM sheet_rows WHERE sheet_name = ? AND row_number = ?",
+                (sheet_name, row_number)
+            ).fetchone()
+            if not row:
+                return
+            values = json.loads(row[0])
+            for letter, value in updates.items():
+                index = column_index(letter)
+                values.extend([''] * (index + 1 - len(values)))
+                values[index] = normalise_cell(value)
+            encoded = json.dumps(values)
+            # The next sync rewrites the row if the real sheet differs
+            self._conn.execute("""
+                UPDATE sheet_rows SET row_values = ?, row_hash = ?, drop_number = ?, updated_at = ?
+                WHERE sheet_name = ? AND row_number = ?
+            """, (encoded, hashlib.sha1(encoded.encode()).hexdigest(), self._drop_number(values),
+                  datetime.now().isoformat(), sheet_name, row_number))
+            self._conn.commit()
+
+_mirrors: Dict[str, SheetsMirror] = {}
+_mirrors_lock = threading.Lock()
+_service = None
+
+def get_sheets_mirror(path: str = SHEETS_MIRROR_PATH) -> SheetsMirror:
+    """Get the shared mirror for path."""
+    key = os.path.abspath(path)
+    with _mirrors_lock:
+        mirror = _mirrors.get(key)
+        if mirror is None:
+            mirror = SheetsMirror(key)
+            _mirrors[key] = mirror
+    return mirror
+
+def _get_service():
+    global _service
+    if _service is None:
+        from google.oauth2.service_account import Credentials
+        from sheets_quota import build_sheets_service
+        credentials = Credentials.from_service_account_file(GOOGLE_APPLICATION_CREDENTIALS, scopes=SCOPES)
+        _service = build_sheets_service(credentials)
+    return _service
+
+def fetch_tabs(sheet_names: Iterable[str], service=None) -> Dict[str, List[List]]:
+    """Read tabs from Google Sheets with one batchGet."""
+    sheet_names = list(sheet_names)
+    service = service or _get_service()
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=GSHEET_ID,
+        ranges=[f"'{sheet}'!{MIRROR_COLUMNS}" for sheet in sheet_names]
+    ).execute()
+    value_ranges = result.get('valueRanges', [])
+    return {
+        sheet: (value_ranges[i].get('values', []) if i < len(value_ranges) else [])
+        for i, sheet in enumerate(sheet_names)
+    }
+
+def refresh(sheet_names: Optional[Iterable[str]] = None, service=None) -> bool:
+    """Sync tabs from Google Sheets into the mirror. Returns success."""
+    sheet_names = list(sheet_names or QA_SHEET_NAMES)
+    if not GSHEET_ID or not GOOGLE_APPLICATION_CREDENTIALS:
+        logger.warning("⚠️  Google Sheets not configured - sheet mirror can't refresh")
+        return False
+    try:
+        mirror = get_sheets_mirror()
+        for sheet_name, values in fetch_tabs(sheet_names, service).items():
+            mirror.apply_tab(sheet_name, values)
+        return True
+    except Exception as e:
+        logger.error(f"❌ Could not refresh sheet mirror ({', '.join(sheet_names)}): {e}")
+        return False
+
+def read_tab(sheet_name: str, max_age: float = SHEETS_MIRROR_MAX_AGE) -> List[List[str]]:
+    """All rows of a tab from the mirror, refreshing it first if stale."""
+    mirror = get_sheets_mirror()
+    age = mirror.age(sheet_name)
+    if age is None or age > max_age:
+        refresh([sheet_name])
+    return mirror.get_tab_values(sheet_name)
+
+def find_drop_row(sheet_name: str, drop_number: str,
+                  max_age: float = SHEETS_MIRROR_MAX_AGE) -> Optional[Dict]:
+    """Row holding drop_number in a tab ({'row_number', 'data'}), or None."""
+    mirror = get_sheets_mirror()
+    age = mirror.age(sheet_name)
+    if age is None or age > max_age:
+        refresh([sheet_name])
+        age = 0.0
+    row = mirror.get_drop_row(sheet_name, drop_number)
+    if row is None and age > SHEETS_MIRROR_MISS_REFRESH_AGE:
+        # Possibly added since the last sync
+        if refresh([sheet_name]):
+            row = mirror.get_drop_row(sheet_name, drop_number)
+    return row
+
+def read_live_drop_number(sheet_name: str, row_number: int, service=None) -> Optional[str]:
+    """Column B of one row, read from the real sheet."""
+    service = service or _get_service()
+    result = service.spreadsheets().values().get(
+        spreadsheetId=GSHEET_ID, range=f"'{sheet_name}'!B{row_number}"
+    ).execute()
+    values = result.get('values', [])
+    drop_number = normalise_cell(values[0][0]).strip().upper() if values and values[0] else ''
+    return drop_number or None
+
+def find_drop_row_live(sheet_name: str, drop_number: str, service=None) -> Optional[Dict]:
+    """Like find_drop_row, but the row is checked against the real sheet first.
+
+    The mirror's row number can be stale (rows inserted, deleted or sorted
+    since the last sync), so B{row} is read live; if it holds another drop,
+    the tab is refreshed and the drop looked up again. Returns None if the
+    drop isn't in the sheet.
+    """
+    drop_number = drop_number.strip().upper()
+    row = find_drop_row(sheet_name, drop_number)
+    if row is None:
+        return None
+    if read_live_drop_number(sheet_name, row['row_number'], service) == drop_number:
+        return row
+
+    logger.info(f"🪞 Mirror row {sheet_name}!{row['row_number']} no longer holds {drop_number} - refreshing")
+    if not refresh([sheet_name], service):
+        return None
+    return get_sheets_mirror().get_drop_row(sheet_name, drop_number)
+
+def patch_row(sheet_name: str, row_number: int, updates: Dict[str, object]):
+    """Write-through of cells just updated in the real sheet (never raises)."""
+    try:
+        get_sheets_mirror().patch_row(sheet_name, row_number, updates)
+    except Exception as e:
+        logger.warning(f"⚠️  Could not update sheet mirror row {sheet_name}!{row_number}: {e}")
+
+def signal_handler(signum, frame):
+    """Handle graceful shutdown."""
+    global running
+    logger.info(f"Received signal {signum}. Shutting down gracefully...")
+    running = False
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('sheets_mirror.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    parser = argparse.ArgumentParser(description='Keep the local mirror of the QA sheet tabs in sync')
+    parser.add_argument('--interval', type=float, default=60,
+                        help='Seconds between syncs (default: 60)')
+    parser.add_argument('--once', action='store_true', help='Sync once and exit')
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    logger.info(f"🪞 Syncing {', '.join(QA_SHEET_NAMES)} into {get_sheets_mirror().path}")
+    while running:
+        refresh()
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Google Sheets Outbox
+====================
+
+Durable queue between the Neon insert path and Google Sheets.
+
+The drop monitor used to call the Sheets API inline for every new drop, so
+detection-to-Neon latency depended on Google, and a failed Sheets call lost
+the row for good. Now the monitor only appends a job to a local SQLite file
+(SHEETS_OUTBOX_PATH) and a separate worker drains it:
+
+- Jobs are claimed in batches of SHEETS_OUTBOX_BATCH_SIZE, oldest first
+- A failed job is retried with exponential backoff + jitter
+  (SHEETS_RETRY_BASE_SECONDS doubling up to SHEETS_RETRY_MAX_SECONDS)
+- After SHEETS_OUTBOX_MAX_ATTEMPTS failures a job is parked as 'failed'
+  (kept for inspection, requeue with --retry-failed)
+- Delivered jobs are deleted
+
+Job kinds:
+- drop_row   new drop -> row in the project's QA sheet tab
+             (realtime_drop_monitor.write_drops_to_google_sheets)
+
+Writers receive all due payloads of their kind at once and return a success
+flag per payload, so a batch of drops becomes one Sheets append per tab.
+
+Usage:
+    from sheets_outbox import get_sheets_outbox
+    get_sheets_outbox().enqueue('drop_row', drop_info)
+
+    python sheets_outbox.py [--interval 5] [--once] [--retry-failed]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import sqlite3
+import argparse
+import threading
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+SHEETS_OUTBOX_PATH = os.getenv(
+    'SHEETS_OUTBOX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sheets_outbox.db')
+)
+SHEETS_OUTBOX_BATCH_SIZE = int(os.getenv('SHEETS_OUTBOX_BATCH_SIZE', '50'))
+SHEETS_OUTBOX_MAX_ATTEMPTS = int(os.getenv('SHEETS_OUTBOX_MAX_ATTEMPTS', '12'))
+SHEETS_RETRY_BASE_SECONDS = float(os.getenv('SHEETS_RETRY_BASE_SECONDS', '5'))
+SHEETS_RETRY_MAX_SECONDS = float(os.getenv('SHEETS_RETRY_MAX_SECONDS', '1800'))
+
+running = True
+
+class SheetsOutbox:
+    """SQLite-backed queue of pending Google Sheets writes."""
+
+    def __init__(self, path: str = SHEETS_OUTBOX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sheets_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TEXT NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sheets_outbox_due ON sheets_outbox(status, next_attempt_at)"
+        )
+        self._conn.commit()
+
+    def enqueue(self, kind: str, payload: Dict) -> int:
+        """Add a job; it becomes due immediately. Returns the job id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO sheets_outbox(kind, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload, default=str), time.time(), datetime.now().isoformat())
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def due(self, limit: int = SHEETS_OUTBOX_BATCH_SIZE) -> List[Dict]:
+        """Pending jobs whose retry time has come, oldest first."""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT id, kind, payload, attempts FROM sheets_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY id
+                LIMIT ?
+            """, (time.time(), limit)).fetchall()
+        return [
+            {'id': row[0], 'kind': row[1], 'payload': json.loads(row[2]), 'attempts': row[3]}
+            for row in rows
+        ]
+
+    def mark_done(self, job_ids: List[int]):
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM sheets_outbox WHERE id = ?", [(i,) for i in job_ids])
+            self._conn.commit()
+
+    def mark_failed(self, job: Dict, error: str):
+        """Schedule a retry with backoff, or park the job after too many attempts."""
+        attempts = job['attempts'] + 1
+        delay = min(SHEETS_RETRY_BASE_SECONDS * 2 ** (attempts - 1), SHEETS_RETRY_MAX_SECONDS)
+        delay += random.uniform(0, delay / 4)
+        status = 'failed' if attempts >= SHEETS_OUTBOX_MAX_ATTEMPTS else 'pending'
+        with self._lock:
+            self._conn.execute("""
+                UPDATE sheets_outbox
+                SET attempts = ?, status = ?, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            """, (attempts, status, time.time() + delay, error[:500], job['id']))
+            self._conn.commit()
+        if status == 'failed':
+            logger.error(f"📊 ❌ Sheets job {job['id']} ({job['kind']}) gave up after {attempts} attempts: {error}")
+
+    def retry_failed(self) -> int:
+        """Requeue parked jobs. Returns how many."""
+        with self._lock:
+            cursor = self._conn.execute("""
+                UPDATE sheets_outbox SET status = 'pending', attempts = 0, next_attempt_at = ?
+                WHERE status = 'failed'
+            """, (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM sheets_outbox GROUP BY status"
+            ).fetchall())
+
+_outboxes: Dict[str, SheetsOutbox] = {}
+_outboxes_lock = threading.Lock()
+
+def get_sheets_outbox(path: str = SHEETS_OUTBOX_PATH) -> SheetsOutbox:
+    """Get the shared outbox for path."""
+    key = os.path.abspath(path)
+    with _outboxes_lock:
+        outbox = _outboxes.get(key)
+        if outbox is None:
+            outbox = SheetsOutbox(key)
+            _outboxes[key] = outbox
+    return outbox
+
+def default_writers() -> Dict[str, Callable[[List[Dict]], List[bool]]]:
+    """Batch writer per job kind. Each returns one success flag per payload."""
+    from realtime_drop_monitor import write_drops_to_google_sheets
+    return {
+        'drop_row': write_drops_to_google_sheets,
+    }
+
+def drain_once(outbox: SheetsOutbox, writers: Dict[str, Callable[[List[Dict]], List[bool]]],
+               batch_size: int = SHEETS_OUTBOX_BATCH_SIZE) -> int:
+    """Deliver every due job. Returns the number delivered."""
+    delivered = 0
+    while running:
+        jobs = outbox.due(batch_size)
+        if not jobs:
+            break
+
+        by_kind: Dict[str, List[Dict]] = {}
+        for job in jobs:
+            by_kind.setdefault(job['kind'], []).append(job)
+
+        done = []
+        for kind, kind_jobs in by_kind.items():
+            writer = writers.get(kind)
+            if writer is None:
+                for job in kind_jobs:
+                    outbox.mark_failed(job, f"No writer for job kind '{kind}'")
+                continue
+            try:
+                results = writer([job['payload'] for job in kind_jobs])
+                error = 'writer reported failure'
+            except Exception as e:
+                results, error = [False] * len(kind_jobs), str(e)
+            for job, ok in zip(kind_jobs, results):
+                if ok:
+                    done.append(job['id'])
+                else:
+                    outbox.mark_failed(job, error)
+
+        outbox.mark_done(done)
+        delivered += len(done)
+        if len(done) < len(jobs):
+            # Something is failing - let the backoff schedule take over
+            break
+
+    if delivered:
+        logger.info(f"📊 Delivered {delivered} queued Google Sheets writes")
+    return delivered
+
+def signal_handler(signum, frame):
+    """Handle graceful shutdown."""
+    global running
+    logger.info(f"Received signal {signum}. Shutting down gracefully...")
+    running = False
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('sheets_outbox.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    parser = argparse.ArgumentParser(description='Drain the Google Sheets outbox')
+    parser.add_argument('--interval', type=float, default=5,
+                        help='Seconds between outbox checks (default: 5)')
+    parser.add_argument('--once', action='store_true',
+                        help='Deliver what is due and exit')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Requeue jobs that exhausted their retries')
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    outbox = get_sheets_outbox()
+    if args.retry_failed:
+        logger.info(f"🔄 Requeued {outbox.retry_failed()} failed Sheets jobs")
+
+    import realtime_drop_monitor
+    if not (realtime_drop_monitor.GOOGLE_AVAILABLE and realtime_drop_monitor.GSHEET_ID
+            and realtime_drop_monitor.GOOGLE_APPLICATION_CREDENTIALS):
+        logger.error("❌ Google Sheets not configured (GSHEET_ID / GOOGLE_APPLICATION_CREDENTIALS) - jobs stay queued")
+        sys.exit(1)
+
+    writers = default_writers()
+    logger.info(f"🚀 Starting Google Sheets outbox worker ({outbox.path})")
+    logger.info(f"📋 Queue: {outbox.counts() or 'empty'}")
+
+    while running:
+        try:
+            drain_once(outbox, writers)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Outbox error: {e}")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+    logger.info("🛑 Sheets outbox worker stopped")
+
+if __name__ == "__main__":
+    main()
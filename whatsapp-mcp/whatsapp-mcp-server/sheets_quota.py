@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Google Sheets API Quota Limiter
+===============================
+
+One token bucket for every process that talks to the QA spreadsheet.
+
+The drop monitor, QA monitor, resubmission monitors and the feedback
+communicator all call the Sheets API on their own schedule. Bursts ran into
+the per-minute quota and the 429s surfaced as logged errors and lost writes.
+Now every Sheets request built with `build_sheets_service()` goes through a
+token bucket stored in SQLite (SHEETS_QUOTA_PATH, on the shared logs volume),
+so all processes share one budget:
+
+- SHEETS_QUOTA_PER_MINUTE tokens per minute, bursts of up to SHEETS_QUOTA_BURST
+- Reads (get / batchGet) may not take the last SHEETS_QUOTA_WRITE_RESERVE
+  tokens, so polling can't starve writes
+- 429 / rateLimitExceeded: the bucket is put in a cooldown for every process
+  and the request is retried with jittered exponential backoff
+- 5xx: retried with the same backoff, up to SHEETS_QUOTA_RETRIES times
+- Counters (requests, throttled waits, quota errors, retries, failures) are
+  kept in the same file
+
+Usage:
+    from sheets_quota import build_sheets_service
+    service = build_sheets_service(credentials)
+
+    python sheets_quota.py            # show quota usage counters
+    python sheets_quota.py --reset    # reset the counters
+"""
+
+import os
+import time
+import random
+import sqlite3
+import argparse
+import threading
+import logging
+from typing import Dict
+
+try:
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import HttpRequest
+    GOOGLE_AVAILABLE = True
+except ImportError:
+    GOOGLE_AVAILABLE = False
+    HttpRequest = object
+
+logger = logging.getLogger(__name__)
+
+SHEETS_QUOTA_PATH = os.getenv(
+    'SHEETS_QUOTA_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sheets_quota.db')
+)
+# Google's default is 60 read and 60 write requests per minute per user; stay under it
+SHEETS_QUOTA_PER_MINUTE = float(os.getenv('SHEETS_QUOTA_PER_MINUTE', '50'))
+SHEETS_QUOTA_BURST = float(os.getenv('SHEETS_QUOTA_BURST', '10'))
+SHEETS_QUOTA_WRITE_RESERVE = float(os.getenv('SHEETS_QUOTA_WRITE_RESERVE', '3'))
+# Longest a request waits for a token before giving up
+SHEETS_QUOTA_MAX_WAIT = float(os.getenv('SHEETS_QUOTA_MAX_WAIT', '120'))
+SHEETS_QUOTA_RETRIES = int(os.getenv('SHEETS_QUOTA_RETRIES', '5'))
+SHEETS_BACKOFF_BASE_SECONDS = float(os.getenv('SHEETS_BACKOFF_BASE_SECONDS', '2'))
+SHEETS_BACKOFF_MAX_SECONDS = float(os.getenv('SHEETS_BACKOFF_MAX_SECONDS', '64'))
+
+READ_METHODS = ('get', 'batchGet', 'getByDataFilter', 'batchGetByDataFilter')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class SheetsQuotaTimeout(Exception):
+    """No token became available within SHEETS_QUOTA_MAX_WAIT."""
+
+class SheetsQuotaBucket:
+    """SQLite-backed token bucket shared by every process using the same file."""
+
+    def __init__(self, path: str = SHEETS_QUOTA_PATH,
+                 per_minute: float = SHEETS_QUOTA_PER_MINUTE,
+                 burst: float = SHEETS_QUOTA_BURST,
+                 write_reserve: float = SHEETS_QUOTA_WRITE_RESERVE):
+        self.path = path
+        self.rate = per_minute / 60.0
+        self.burst = max(burst, write_reserve + 1)
+        self.write_reserve = write_reserve
+        self._lock = threading.Lock()
+        # Autocommit mode - transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS quota_bucket (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                cooldown_until REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS quota_counters (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO quota_bucket(name, tokens, updated_at) VALUES ('sheets', ?, ?)",
+            (self.burst, time.time())
+        )
+
+    def _bump(self, counters: Dict[str, float]):
+        self._conn.executemany("""
+            INSERT INTO quota_counters(name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, list(counters.items()))
+
+    def _try_take(self, write: bool) -> float:
+        """Take a token if one is free. Returns 0 on success, else seconds to wait."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated_at, cooldown_until = self._conn.execute(
+                    "SELECT tokens, updated_at, cooldown_until FROM quota_bucket WHERE name = 'sheets'"
+                ).fetchone()
+                now = time.time()
+                tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+                needed = 1 if write else 1 + self.write_reserve
+
+                if now < cooldown_until:
+                    wait = cooldown_until - now
+                elif tokens >= needed:
+                    tokens -= 1
+                    wait = 0.0
+                    self._bump({'write_requests' if write else 'read_requests': 1})
+                else:
+                    wait = (needed - tokens) / self.rate
+
+                self._conn.execute(
+                    "UPDATE quota_bucket SET tokens = ?, updated_at = ? WHERE name = 'sheets'",
+                    (tokens, now)
+                )
+                self._conn.execute("COMMIT")
+                return wait
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def acquire(self, write: bool, max_wait: float = SHEETS_QUOTA_MAX_WAIT) -> float:
+        """Block until a token is taken. Returns the seconds spent waiting."""
+        started = time.monotonic()
+        while True:
+            wait = self._try_take(write)
+            waited = time.monotonic() - started
+            if wait <= 0:
+                if waited > 0.01:
+                    self.count(throttled=1, wait_seconds=waited)
+                return waited
+            if waited + wait > max_wait:
+                self.count(timeouts=1)
+                raise SheetsQuotaTimeout(
+                    f"No Sheets API quota for {'write' if write else 'read'} after {waited:.0f}s"
+                )
+            # Small jitter so waiting processes don't all wake at once
+            time.sleep(wait + random.uniform(0, 0.1))
+
+    def cooldown(self, seconds: float):
+        """Pause every process's requests for a while (after a quota error)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("""
+                    UPDATE quota_bucket SET tokens = 0, updated_at = ?,
+                        cooldown_until = MAX(cooldown_until, ?)
+                    WHERE name = 'sheets'
+                """, (time.time(), time.time() + seconds))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count(self, **counters: float):
+        """Add to the named usage counters."""
+        with self._lock:
+            self._bump(counters)
+
+    def counters(self) -> Dict[str, float]:
+        """Usage counters since the last reset."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, value FROM quota_counters ORDER BY name").fetchall())
+
+    def reset_counters(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM quota_counters")
+
+_buckets: Dict[str, SheetsQuotaBucket] = {}
+_buckets_lock = threading.Lock()
+
+def get_quota_bucket(path: str = SHEETS_QUOTA_PATH) -> SheetsQuotaBucket:
+    """Get the shared bucket for path."""
+    key = os.path.abspath(path)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = SheetsQuotaBucket(key)
+            _buckets[key] = bucket
+    return bucket
+
+def _is_quota_error(error) -> bool:
+    if error.resp.status == 429:
+        return True
+    # Older quota errors come back as 403 with a rateLimitExceeded reason
+    return error.resp.status == 403 and b'rateLimitExceeded' in (error.content or b'')
+
+def backoff_delay(attempt: int) -> float:
+    """Jittered exponential backoff for retry number attempt (0-based)."""
+    delay = min(SHEETS_BACKOFF_BASE_SECONDS * 2 ** attempt, SHEETS_BACKOFF_MAX_SECONDS)
+    return random.uniform(delay / 2, delay)
+
+class RateLimitedRequest(HttpRequest):
+    """HttpRequest that takes a quota token before executing and retries quota errors."""
+
+    def execute(self, http=None, num_retries=0):
+        method = (self.methodId or '').rsplit('.', 1)[-1]
+        write = method not in READ_METHODS
+        bucket = get_quota_bucket()
+
+        for attempt in range(SHEETS_QUOTA_RETRIES + 1):
+            bucket.acquire(write)
+            try:
+                return super().execute(http=http, num_retries=num_retries)
+            except HttpError as e:
+                quota_error = _is_quota_error(e)
+                if not quota_error and e.resp.status not in RETRY_STATUSES:
+                    raise
+                if attempt == SHEETS_QUOTA_RETRIES:
+                    bucket.count(failures=1)
+                    raise
+
+                delay = backoff_delay(attempt)
+                if quota_error:
+                    bucket.count(quota_errors=1, retries=1)
+                    bucket.cooldown(delay)  # acquire() waits it out, as do the other processes
+                else:
+                    bucket.count(server_errors=1, retries=1)
+                    time.sleep(delay)
+                logger.warning(f"⏳ Sheets {method} got HTTP {e.resp.status} - "
+                               f"retry {attempt + 1}/{SHEETS_QUOTA_RETRIES} in {delay:.1f}s")
+
+def build_sheets_service(credentials):
+    """Sheets v4 service whose requests go through the shared quota bucket."""
+    return build("sheets", "v4", credentials=credentials, cache_discovery=False,
+                 requestBuilder=RateLimitedRequest)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Google Sheets API quota usage')
+    parser.add_argument('--reset', action='store_true', help='Reset the usage counters')
+    args = parser.parse_args()
+
+    bucket = get_quota_bucket()
+    if args.reset:
+        bucket.reset_counters()
+        logger.info("🔄 Sheets quota counters reset")
+        return
+
+    logger.info(f"📊 Sheets quota ({bucket.path}): {SHEETS_QUOTA_PER_MINUTE:g}/min, "
+                f"burst {bucket.burst:g}, {bucket.write_reserve:g} reserved for writes")
+    counters = bucket.counters()
+    if not counters:
+        logger.info("   No requests recorded yet")
+    for name, value in counters.items():
+        logger.info(f"   {name}: {value:g}")
+
+if __name__ == "__main__":
+    main()
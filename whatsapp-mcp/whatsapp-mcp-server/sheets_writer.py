@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Batched Google Sheets Append Writer
+===================================
+
+Appends rows to a QA sheet tab without re-discovering the sheet every time.
+
+The old per-drop write read `{tab}!A3:A1000` to find the first empty row
+(silently overwriting row 1000 forever once the tab grew past it), fetched the
+whole spreadsheet metadata for the sheetId and sent one checkbox-formatting
+request per row. This writer keeps per tab:
+
+- the sheetId and grid size (one metadata fetch, fields-filtered)
+- the append cursor (next free row), found once by reading the open-ended
+  column `A3:A` - no row limit
+
+and writes N rows plus their checkbox validation in a single batchUpdate
+(`appendDimension` if the grid is too small, `pasteData` for the values with
+USER_ENTERED parsing, one `repeatCell` per checkbox column range).
+
+Before each batch the target cells of column A are read; if another writer
+(or a person) already used them, the cursor is resynced and the batch goes
+below the existing data instead of overwriting it. Any API error drops the
+cached state so the next batch starts from a fresh resync.
+
+Usage:
+    writer = get_sheets_writer(service, GSHEET_ID)
+    first_row = writer.append_rows('Velo Test', rows, checkbox_columns=[(2, 16), (21, 22)])
+"""
+
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rows 1-2 of the QA tabs are headers
+FIRST_DATA_ROW = 3
+# Extra grid rows to add when a tab is full, so we don't grow it on every batch
+GRID_GROWTH_ROWS = 500
+
+def _paste_cell(value) -> str:
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if value is None:
+        return ''
+    # Tabs and newlines would split the pasted cell
+    return str(value).replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+
+class SheetsAppendWriter:
+    """Appends rows to tabs of one spreadsheet with cached sheet IDs and cursors."""
+
+    def __init__(self, service, spreadsheet_id: str):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self._sheets: Dict[str, Dict] = {}
+        self._next_row: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _load_sheets(self):
+        metadata = self.service.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id,
+            fields='sheets.properties(sheetId,title,gridProperties.rowCount)'
+        ).execute()
+        self._sheets = {
+            sheet['properties']['title']: {
+                'sheet_id': sheet['properties']['sheetId'],
+                'row_count': sheet['properties'].get('gridProperties', {}).get('rowCount', 1000),
+            }
+            for sheet in metadata.get('sheets', [])
+        }
+
+    def _sheet(self, tab: str) -> Dict:
+        if tab not in self._sheets:
+            self._load_sheets()
+        if tab not in self._sheets:
+            raise ValueError(f"Sheet tab '{tab}' not found in spreadsheet")
+        return self._sheets[tab]
+
+    def _resync(self, tab: str) -> int:
+        """Find the first free row below the data in column A."""
+        result = self.service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{tab}!A{FIRST_DATA_ROW}:A",
+            majorDimension='COLUMNS'
+        ).execute()
+        column = (result.get('values') or [[]])[0]
+        self._next_row[tab] = len(column) + FIRST_DATA_ROW
+        logger.info(f"📊 '{tab}' append cursor at row {self._next_row[tab]}")
+        return self._next_row[tab]
+
+    def _rows_free(self, tab: str, start: int, count: int) -> bool:
+        # Rows past the grid don't exist yet (so they're free), and reading them
+        # is a 400 "exceeds grid limits" - only check the part inside the grid
+        end = min(start + count - 1, self._sheets[tab]['row_count'])
+        if start > end:
+            return True
+        result = self.service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{tab}!A{start}:A{end}"
+        ).execute()
+        return not any(row for row in result.get('values', []))
+
+    def append_rows(self, tab: str, rows: List[List],
+                    checkbox_columns: Iterable[Tuple[int, int]] = ()) -> Optional[int]:
+        """Append rows to a tab in one batchUpdate.
+
+        Args:
+            tab: Sheet tab title
+            rows: Row values starting at column A (bools become checkboxes'
+                TRUE/FALSE, strings are parsed as if typed by a user)
+            checkbox_columns: (start, end) 0-based column ranges, end exclusive,
+                that get BOOLEAN data validation on the new rows
+
+        Returns:
+            1-based sheet row of the first appended row (None if rows is empty)
+        """
+        if not rows:
+            return None
+
+        with self._lock:
+            try:
+                sheet = self._sheet(tab)
+                start = self._next_row.get(tab) or self._resync(tab)
+                if not self._rows_free(tab, start, len(rows)):
+                    logger.warning(f"⚠️  '{tab}' rows from {start} already in use - resyncing append cursor")
+                    start = self._resync(tab)
+                end = start + len(rows) - 1
+
+                requests = []
+                if end > sheet['row_count']:
+                    grow_by = end - sheet['row_count'] + GRID_GROWTH_ROWS
+                    requests.append({
+                        "appendDimension": {
+                            "sheetId": sheet['sheet_id'],
+                            "dimension": "ROWS",
+                            "length": grow_by
+                        }
+                    })
+
+                requests.append({
+                    "pasteData": {
+                        "coordinate": {
+                            "sheetId": sheet['sheet_id'],
+                            "rowIndex": start - 1,  # Convert to 0-based
+                            "columnIndex": 0
+                        },
+                        "data": '\n'.join('\t'.join(_paste_cell(v) for v in row) for row in rows),
+                        "type": "PASTE_NORMAL",
+                        "delimiter": '\t'
+                    }
+                })
+
+                for start_col, end_col in checkbox_columns:
+                    requests.append({
+                        "repeatCell": {
+                            "range": {
+                                "sheetId": sheet['sheet_id'],
+                                "startRowIndex": start - 1,
+                                "endRowIndex": end,
+                                "startColumnIndex": start_col,
+                                "endColumnIndex": end_col
+                            },
+                            "cell": {
+                                "dataValidation": {
+                                    "condition": {
+                                        "type": "BOOLEAN"
+                                    }
+                                }
+                            },
+                            "fields": "dataValidation"
+                        }
+                    })
+
+                self.service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={"requests": requests}
+                ).execute()
+            except Exception:
+                # Don't trust cached layout after a failure
+                self._sheets.clear()
+                self._next_row.pop(tab, None)
+                raise
+
+            if end > sheet['row_count']:
+                sheet['row_count'] = end + GRID_GROWTH_ROWS
+            self._next_row[tab] = end + 1
+            return start
+
+_writers: Dict[str, SheetsAppendWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_sheets_writer(service, spreadsheet_id: str) -> SheetsAppendWriter:
+    """Get the shared writer for a spreadsheet (the first service passed in is kept)."""
+    with _writers_lock:
+        writer = _writers.get(spreadsheet_id)
+        if writer is None:
+            writer = SheetsAppendWriter(service, spreadsheet_id)
+            _writers[spreadsheet_id] = writer
+    return writer
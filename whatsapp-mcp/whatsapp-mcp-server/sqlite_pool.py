@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Shared Read-Only SQLite Connection Pool
+=======================================
+
+Keeps one long-lived, read-only connection per thread for each SQLite file
+(normally the bridge's messages.db) so that MCP tool calls and monitors stop
+paying connect + schema-parse cost on every query.
+
+- Opens with a `mode=ro` URI and `PRAGMA query_only`, so nothing here can
+  ever write to the bridge database
+- Large statement cache, so repeated queries reuse their prepared statements
+- WAL-aware: autocommit reads never hold a snapshot open between calls, and
+  if the read-only open fails (WAL database on a read-only mount without its
+  -shm file) we fall back to a normal open guarded by `query_only`
+- Reconnects automatically if the database file is replaced (new inode)
+
+Usage:
+    from sqlite_pool import get_read_connection
+    conn = get_read_connection(MESSAGES_DB_PATH)
+    rows = conn.execute("SELECT ...", params).fetchall()
+    # do NOT close the connection - it belongs to the pool
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+from typing import Dict, Optional
+from urllib.request import pathname2url
+
+logger = logging.getLogger(__name__)
+
+# Prepared statements kept per connection (sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 256
+# Seconds to wait on a lock held by the bridge's writer
+BUSY_TIMEOUT = 10
+
+class ReadOnlyConnectionPool:
+    """Per-thread read-only connections to a single SQLite database file."""
+
+    def __init__(self, db_path: str):
+        self.db_path = os.path.abspath(db_path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self.journal_mode = None
+
+    def _file_id(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.db_path)
+            return (st.st_dev, st.st_ino)
+        except OSError:
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{pathname2url(self.db_path)}?mode=ro"
+        try:
+            conn = sqlite3.connect(
+                uri, uri=True, timeout=BUSY_TIMEOUT,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            # Force the open now so a missing -shm surfaces here, not mid-query
+            self.journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        except sqlite3.OperationalError as e:
+            if not os.path.exists(self.db_path):
+                raise
+            logger.debug(f"Read-only open of {self.db_path} failed ({e}); using query_only connection")
+            conn = sqlite3.connect(
+                self.db_path, timeout=BUSY_TIMEOUT,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            self.journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+        conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening (or re-opening) it if needed."""
+        conn = getattr(self._local, 'conn', None)
+        file_id = self._file_id()
+
+        if conn is not None and file_id != getattr(self._local, 'file_id', None):
+            # Database file was replaced underneath us - drop the stale handle
+            self.discard()
+            conn = None
+
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.file_id = file_id
+        return conn
+
+    def discard(self):
+        """Close and forget this thread's connection (e.g. after an error)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        """Close every connection opened by this pool (all threads)."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+_pools: Dict[str, ReadOnlyConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str) -> ReadOnlyConnectionPool:
+    """Get (or create) the shared pool for a database path."""
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ReadOnlyConnectionPool(key)
+                _pools[key] = pool
+    return pool
+
+def get_read_connection(db_path: str) -> sqlite3.Connection:
+    """Get the calling thread's pooled read-only connection for db_path."""
+    return get_pool(db_path).connection()
+
+def discard_connection(db_path: str):
+    """Drop the calling thread's connection for db_path so the next call reconnects."""
+    get_pool(db_path).discard()
+
+def close_all_pools():
+    """Close all pooled connections (call on shutdown)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -95,17 +95,17 @@ echo -e "\n${BLUE}Starting Monitoring Services...${NC}"
 
 # Service definitions
 declare -A SERVICES=(
-    ["realtime_drop_monitor"]="source .venv/bin/activate && nohup python realtime_drop_monitor.py --interval 15 > realtime_monitor.log 2>&1 &"
+    ["message_dispatcher"]="source .venv/bin/activate && nohup python message_dispatcher.py --interval 15 --handlers kill_switch,drop_monitor,velo_resubmissions,mohadin_resubmissions > message_dispatcher_stdout.log 2>&1 &"
     ["google_sheets_qa_monitor"]="source .venv/bin/activate && nohup python google_sheets_qa_monitor.py --interval 60 > google_sheets_qa_monitor.log 2>&1 &"
-    ["whatsapp_message_monitor"]="source .venv/bin/activate && nohup python whatsapp_message_monitor.py --interval 30 > whatsapp_message_monitor.log 2>&1 &"
-    ["mohadin_message_monitor"]="source .venv/bin/activate && nohup python mohadin_message_monitor.py --interval 30 > mohadin_message_monitor.log 2>&1 &"
+    ["sheets_outbox"]="source .venv/bin/activate && nohup python sheets_outbox.py --interval 5 > sheets_outbox_stdout.log 2>&1 &"
+    ["send_queue"]="source .venv/bin/activate && nohup python send_queue.py > send_queue_stdout.log 2>&1 &"
 )
 
 declare -A DESCRIPTIONS=(
-    ["realtime_drop_monitor"]="Real-time Drop Monitor (All Groups: Lawley, Velo Test, Mohadin)"
+    ["message_dispatcher"]="Message Dispatcher (Kill Switch + Drop Monitor: Lawley, Velo Test, Mohadin + Resubmissions: Velo Test, Mohadin)"
     ["google_sheets_qa_monitor"]="Google Sheets QA Monitor (Velo Test, Mohadin)"
-    ["whatsapp_message_monitor"]="Velo Test Resubmission Monitor (Velo Test)"
-    ["mohadin_message_monitor"]="Mohadin Resubmission Monitor (Mohadin)"
+    ["sheets_outbox"]="Google Sheets Writer (queued drop rows for Velo Test, Mohadin)"
+    ["send_queue"]="WhatsApp Sender (queued messages and QA feedback)"
 )
 
 # Start all services
@@ -124,12 +124,10 @@ echo -e "${BLUE}============================================${NC}"
 
 echo -e "\n${GREEN}✅ Running Services:${NC}"
 echo -e "  • WhatsApp Bridge (Core Service)"
-echo -e "  • Real-time Drop Monitor (Lawley, Velo Test, Mohadin)"
+echo -e "  • Message Dispatcher (kill switch; drops: Lawley, Velo Test, Mohadin; resubmissions: Velo Test, Mohadin)"
 echo -e "  • Google Sheets QA Monitor (Velo Test, Mohadin)"
-
-echo -e "\n${YELLOW}⚠️  Manual Check Required:${NC}"
-echo -e "  • Velo Test Resubmission Monitor (Velo Test)"
-echo -e "  • Mohadin Resubmission Monitor (Mohadin)"
+echo -e "  • Google Sheets Writer (queued drop rows)"
+echo -e "  • WhatsApp Sender (queued messages)"
 
 if [ ${#failed_services[@]} -gt 0 ]; then
     echo -e "\n${RED}❌ Failed Services:${NC}"
@@ -142,16 +140,17 @@ fi
 echo -e "\n${GREEN}🎉 All critical services started successfully!${NC}"
 
 echo -e "\n${BLUE}Monitoring Information:${NC}"
-echo -e "• Real-time Monitor: Checks every 15 seconds for DR numbers"
+echo -e "• Message Dispatcher: Wakes on every new WhatsApp message (kill switch, DR numbers + resubmissions)"
 echo -e "• QA Monitor: Checks every 60 seconds for incomplete drops"
-echo -e "• Resubmission Monitors: Check every 30 seconds for resubmissions"
+echo -e "• Sheets Writer: Delivers queued Google Sheets rows with retries"
+echo -e "• WhatsApp Sender: Delivers queued messages, including retries left by short-lived scripts"
 
 echo -e "\n${BLUE}Log Files:${NC}"
 echo -e "• Bridge Log: ../whatsapp-bridge/bridge.log"
-echo -e "• Real-time Monitor: realtime_monitor.log"
+echo -e "• Message Dispatcher: message_dispatcher.log"
 echo -e "• QA Monitor: google_sheets_qa_monitor.log"
-echo -e "• Velo Test Monitor: whatsapp_message_monitor.log"
-echo -e "• Mohadin Monitor: mohadin_message_monitor.log"
+echo -e "• Sheets Writer: sheets_outbox.log"
+echo -e "• WhatsApp Sender: send_queue.log"
 
 echo -e "\n${BLUE}To view the monitoring dashboard:${NC}"
 echo -e "streamlit run service_monitor.py"
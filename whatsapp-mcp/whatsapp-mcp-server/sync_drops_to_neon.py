@@ -5,10 +5,11 @@ Usage: uv run python sync_drops_to_neon.py [--days N] [--today] [--dry-run]
 """
 
 import argparse
-import re
-import psycopg2
+import pg_pool
 from datetime import datetime, timedelta
-from whatsapp import list_messages
+from whatsapp import MESSAGES_DB_PATH, resolve_sender_names
+from message_index import get_drop_mentions
+from drop_ingest import FAILED, INSERTED, ingest_drops
 from urllib.parse import urlparse
 import os
 
@@ -44,14 +45,12 @@ def get_whatsapp_drop_numbers(days=7, today_only=False, project_filter=None):
     
     # Set date filter
     if today_only:
-        after_date = datetime.now().date().isoformat()
-        print(f"   Filter: Today only ({after_date})")
+        after_date = datetime.combine(datetime.now().date(), datetime.min.time())
+        print(f"   Filter: Today only ({after_date.date().isoformat()})")
     else:
-        after_date = (datetime.now() - timedelta(days=days)).isoformat()
-        print(f"   Filter: Last {days} days (since {after_date})")
+        after_date = datetime.now() - timedelta(days=days)
+        print(f"   Filter: Last {days} days (since {after_date.isoformat()})")
     
-    # Extract drop numbers from all specified projects
-    drop_pattern = r'DR\d+'
     found_drops = {}
     
     for project_name in projects_to_check:
@@ -63,50 +62,44 @@ def get_whatsapp_drop_numbers(days=7, today_only=False, project_filter=None):
         
         print(f"   Processing {project_name} project ({project_config['group_description']})...")
         
-        # Get messages containing DR for this project
-        messages = list_messages(
-            chat_jid=group_jid, 
-            query='DR', 
-            after=after_date, 
-            limit=200
+        # Indexed lookup of drop mentions for this project, newest first
+        mentions = get_drop_mentions(
+            MESSAGES_DB_PATH,
+            chat_jids=[group_jid],
+            since=after_date,
+            newest_first=True
         )
+        sender_names = resolve_sender_names([m['sender'] for m in mentions])
         
-        message_lines = messages.split('\n')
-        
-        for line in message_lines:
-            drops_in_line = re.findall(drop_pattern, line, re.IGNORECASE)
+        for mention in mentions:
+            drop_upper = mention['drop_number']
             
-            for drop in drops_in_line:
-                drop_upper = drop.upper()
-                
-                # Extract timestamp and sender info
-                timestamp_match = re.search(r'\[([\d\-\s:]+)\]', line)
-                sender_match = re.search(r'From:\s*([^:]+):', line)
-                
-                timestamp = timestamp_match.group(1) if timestamp_match else 'Unknown time'
-                sender = sender_match.group(1) if sender_match else 'Unknown sender'
-                
-                # Project-specific address
-                address = f'Extracted from WhatsApp {project_config["group_description"]}'
-                
-                # Keep the latest occurrence of each drop number (with project info)
-                drop_key = f"{drop_upper}-{project_name}"  # Ensure unique keys per project
-                if drop_key not in found_drops or timestamp > found_drops[drop_key]['timestamp']:
-                    found_drops[drop_key] = {
-                        'drop_number': drop_upper,
-                        'timestamp': timestamp,
-                        'sender': sender,
-                        'contractor_name': f'WhatsApp-{sender[:20]}...' if len(sender) > 20 else f'WhatsApp-{sender}',
-                        'address': address,
-                        'project_name': project_name
-                    }
+            # Keep the latest occurrence of each drop number (with project info)
+            drop_key = f"{drop_upper}-{project_name}"  # Ensure unique keys per project
+            if drop_key in found_drops:
+                continue
+            
+            timestamp = f"{mention['timestamp']:%Y-%m-%d %H:%M:%S}" if mention['timestamp'] else 'Unknown time'
+            sender = sender_names.get(mention['sender']) or 'Unknown sender'
+            
+            # Project-specific address
+            address = f'Extracted from WhatsApp {project_config["group_description"]}'
+            
+            found_drops[drop_key] = {
+                'drop_number': drop_upper,
+                'timestamp': timestamp,
+                'sender': sender,
+                'contractor_name': f'WhatsApp-{sender[:20]}...' if len(sender) > 20 else f'WhatsApp-{sender}',
+                'address': address,
+                'project_name': project_name
+            }
     
     return list(found_drops.values())
 
 def connect_to_database():
     """Connect to Neon PostgreSQL database."""
     try:
-        conn = psycopg2.connect(NEON_DB_URL)
+        conn = pg_pool.connect(NEON_DB_URL)
         return conn
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
@@ -127,8 +120,6 @@ def get_existing_drop_numbers(conn):
 def insert_drop_numbers(conn, drop_data, dry_run=False):
     """Insert new drop numbers into the database."""
     try:
-        cursor = conn.cursor()
-        
         # Get existing DR drop numbers
         existing_drops = get_existing_drop_numbers(conn)
         print(f"📊 Found {len(existing_drops)} existing DR drop numbers in database")
@@ -153,47 +144,26 @@ def insert_drop_numbers(conn, drop_data, dry_run=False):
         
         if not new_drops:
             print("✅ No new drop numbers to insert.")
-            cursor.close()
             return True
         
         if dry_run:
             print("\n🔍 DRY RUN - Would insert these drop numbers:")
             for drop_info in new_drops:
                 print(f"   • {drop_info['drop_number']} from {drop_info['contractor_name']}")
-            cursor.close()
             return True
         
-        # Insert new drops
-        insert_query = """
-        INSERT INTO installations (
-            drop_number, 
-            contractor_name, 
-            address, 
-            status, 
-            agent_notes,
-            project_name
-        ) VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        
-        inserted_count = 0
+        # Insert new drops in one batch / transaction
         for drop_info in new_drops:
-            try:
-                cursor.execute(insert_query, (
-                    drop_info['drop_number'],
-                    drop_info['contractor_name'],
-                    drop_info['address'],
-                    'submitted',
-                    f"Auto-imported from WhatsApp on {datetime.now().isoformat()} - Original timestamp: {drop_info['timestamp']}",
-                    drop_info.get('project_name', 'Unknown')
-                ))
+            drop_info['agent_notes'] = f"Auto-imported from WhatsApp on {datetime.now().isoformat()} - Original timestamp: {drop_info['timestamp']}"
+
+        outcomes = ingest_drops(conn, new_drops, create_reviews=False)
+        inserted_count = 0
+        for drop_number, outcome in outcomes.items():
+            if outcome == INSERTED:
                 inserted_count += 1
-                print(f"✅ Inserted: {drop_info['drop_number']}")
-                
-            except Exception as e:
-                print(f"❌ Error inserting {drop_info['drop_number']}: {e}")
-        
-        conn.commit()
-        cursor.close()
+                print(f"✅ Inserted: {drop_number}")
+            elif outcome == FAILED:
+                print(f"❌ Error inserting {drop_number}")
         
         print(f"\n🎉 Successfully inserted {inserted_count} new drop numbers!")
         return True
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test Known Drop Numbers Cache
+=============================
+
+KnownDropNumbers against an in-memory stand-in for the installations table
+(no Postgres needed).
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+import drop_number_cache
+from drop_number_cache import KnownDropNumbers
+
+class FakeInstallations:
+    """pg_pool.connect() stand-in answering the cache's id/drop_number query."""
+
+    def __init__(self):
+        self.rows = []
+        self.queries = []
+
+    def connect(self, db_url):
+        return self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        self.queries.append(params[0])
+        self._result = sorted(row for row in self.rows if row[0] > params[0])
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def installations(monkeypatch):
+    fake = FakeInstallations()
+    monkeypatch.setattr(drop_number_cache.pg_pool, 'connect', fake.connect)
+    return fake
+
+def test_incremental_refresh_picks_up_new_drops(installations):
+    installations.rows = [(1, 'DR1'), (2, 'DR2')]
+    known = KnownDropNumbers('postgres://test', cache_path=None)
+    known.refresh()
+    assert 'DR2' in known and len(known) == 2
+
+    installations.rows.append((3, 'DR3'))
+    known.refresh()
+    assert 'DR3' in known
+
+def test_late_commit_below_max_id_is_not_skipped(installations):
+    installations.rows = [(1, 'DR1'), (3, 'DR3')]
+    known = KnownDropNumbers('postgres://test', cache_path=None)
+    known.refresh()
+
+    # id 2 was allocated before id 3 but its transaction committed later
+    installations.rows.append((2, 'DR2'))
+    known.refresh()
+    assert 'DR2' in known
+    assert installations.queries[-1] == 0  # overlap reaches back past id 2
+
+def test_overlap_is_bounded(installations, monkeypatch):
+    monkeypatch.setattr(drop_number_cache, 'DROP_CACHE_ID_OVERLAP', 10)
+    installations.rows = [(i, f'DR{i}') for i in range(1, 101)]
+    known = KnownDropNumbers('postgres://test', cache_path=None)
+    known.refresh()
+    known.refresh()
+    assert installations.queries == [0, 90]
+
+def test_snapshot_restores_without_full_query(installations, tmp_path):
+    path = str(tmp_path / 'drops.json')
+    installations.rows = [(1, 'DR1'), (2, 'DR2')]
+    KnownDropNumbers('postgres://test', cache_path=path).refresh()
+
+    restored = KnownDropNumbers('postgres://test', cache_path=path)
+    assert 'DR1' in restored
+    restored.refresh()
+    assert installations.queries[-1] == max(0, 2 - drop_number_cache.DROP_CACHE_ID_OVERLAP)
+
+def test_unreachable_database_keeps_last_known_set(installations, monkeypatch):
+    installations.rows = [(1, 'DR1')]
+    known = KnownDropNumbers('postgres://test', cache_path=None)
+    known.refresh()
+
+    def down(db_url):
+        raise OSError("connection refused")
+    monkeypatch.setattr(drop_number_cache.pg_pool, 'connect', down)
+    assert known.refresh() is False
+    assert 'DR1' in known
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test Media Cache
+================
+
+MediaCache on a temporary directory with a fake bridge download.
+"""
+
+import os
+import stat
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from media_cache import MediaCache, file_sha256, place
+
+CHAT = '123@g.us'
+
+@pytest.fixture
+def cache(tmp_path):
+    return MediaCache(str(tmp_path / 'cache'))
+
+@pytest.fixture
+def bridge(tmp_path):
+    """Fake BridgeClient.download writing message content into a 'bridge' folder."""
+    bridge_dir = tmp_path / 'bridge'
+    bridge_dir.mkdir()
+    calls = []
+
+    def download(message_id, chat_jid):
+        calls.append(message_id)
+        path = bridge_dir / f"{message_id}.jpg"
+        path.write_bytes(b'photo-' + message_id.split('-')[0].encode())
+        return str(path), "Downloaded"
+
+    download.calls = calls
+    download.dir = bridge_dir
+    return download
+
+def test_second_get_is_served_from_cache(cache, bridge):
+    path, _ = cache.get('m1', CHAT, bridge)
+    again, message = cache.get('m1', CHAT, bridge)
+    assert again == path and message == "Served from media cache"
+    assert bridge.calls == ['m1']
+
+def test_same_content_is_stored_once(cache, bridge):
+    first, _ = cache.get('a-1', CHAT, bridge)
+    second, _ = cache.get('a-2', '456@g.us', bridge)
+    assert first == second
+    assert cache.stats() == {'blobs': 1, 'bytes': len(b'photo-a'), 'messages': 2}
+
+def test_blob_is_a_read_only_copy_of_the_bridge_file(cache, bridge):
+    blob, _ = cache.get('m1', CHAT, bridge)
+    source = bridge.dir / 'm1.jpg'
+
+    assert not os.path.samefile(blob, source)
+    assert os.stat(blob).st_nlink == 1
+    assert stat.S_IMODE(os.stat(blob).st_mode) == 0o444
+
+    # The bridge reusing its file doesn't touch the cached content
+    source.write_bytes(b'something else')
+    assert open(blob, 'rb').read() == b'photo-m1'
+
+def test_place_links_blob_into_project_folder(cache, bridge, tmp_path):
+    blob, _ = cache.get('m1', CHAT, bridge)
+    target = tmp_path / 'project' / 'DR1' / 'photo.jpg'
+
+    assert place(blob, str(target)) in ('hardlink', 'reflink', 'copy')
+    assert file_sha256(str(target)) == file_sha256(blob)
+    assert place(blob, str(target)) in ('existing', 'reflink', 'copy')
+
+def test_lookup_forgets_blob_removed_behind_its_back(cache, bridge):
+    blob, _ = cache.get('m1', CHAT, bridge)
+    os.remove(blob)
+    assert cache.lookup('m1', CHAT) is None
+    cache.get('m1', CHAT, bridge)
+    assert bridge.calls == ['m1', 'm1']
+
+def test_evicts_least_recently_used_blobs(tmp_path, bridge):
+    cache = MediaCache(str(tmp_path / 'cache'), max_bytes=20)
+    cache.get('a-1', CHAT, bridge)
+    cache.get('b-1', CHAT, bridge)
+    cache.lookup('a-1', CHAT)
+    cache.get('c-1', CHAT, bridge)
+
+    assert cache.lookup('b-1', CHAT) is None
+    assert cache.lookup('a-1', CHAT) and cache.lookup('c-1', CHAT)
+
+def test_failed_fetch_is_not_cached(cache):
+    assert cache.get('m1', CHAT, lambda m, c: (None, "not found")) == (None, "not found")
+    assert cache.lookup('m1', CHAT) is None
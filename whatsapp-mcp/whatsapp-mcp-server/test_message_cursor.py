@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test Message Cursors
+====================
+
+Rowid cursors and the replay guard against a bridge-shaped messages.db that
+is written the way the bridge writes it (INSERT OR REPLACE).
+"""
+
+import os
+import sqlite3
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import message_cursor
+from message_cursor import CursorStore, read_messages_after
+from message_dispatcher import MessageDispatcher
+
+GROUP = '120363418298130331@g.us'
+OTHER = '120363421532174586@g.us'
+
+@pytest.fixture
+def messages_db(tmp_path):
+    path = str(tmp_path / 'messages.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE messages (
+            id TEXT, chat_jid TEXT, sender TEXT, content TEXT, timestamp TIMESTAMP,
+            is_from_me BOOLEAN, media_type TEXT, filename TEXT, file_length INTEGER,
+            PRIMARY KEY (id, chat_jid)
+        )
+    """)
+    conn.commit()
+    conn.close()
+    return path
+
+@pytest.fixture
+def store(tmp_path):
+    return CursorStore(str(tmp_path / 'cursors.db'))
+
+def store_message(path, msg_id, timestamp, content='hi', chat_jid=GROUP):
+    """Write a message the way the bridge does."""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        INSERT OR REPLACE INTO messages (id, chat_jid, sender, content, timestamp, is_from_me)
+        VALUES (?, ?, '27820000000', ?, ?, 0)
+    """, (msg_id, chat_jid, content, timestamp))
+    conn.commit()
+    conn.close()
+
+def read_new(path, store, consumer='test'):
+    after = store.get(consumer) or 0
+    messages, high_water = read_messages_after(path, after)
+    messages = store.drop_replayed(consumer, messages)
+    store.set(consumer, high_water, messages)
+    return [m['id'] for m in messages]
+
+def test_reads_only_rows_after_cursor(messages_db, store):
+    store_message(messages_db, 'm1', '2025-06-01 10:00:00')
+    assert read_new(messages_db, store) == ['m1']
+    store_message(messages_db, 'm2', '2025-06-01 10:01:00')
+    assert read_new(messages_db, store) == ['m2']
+    assert read_new(messages_db, store) == []
+
+def test_chat_filter_still_advances_cursor(messages_db):
+    store_message(messages_db, 'm1', '2025-06-01 10:00:00', chat_jid=OTHER)
+    store_message(messages_db, 'm2', '2025-06-01 10:01:00')
+    messages, high_water = read_messages_after(messages_db, 0, [GROUP])
+    assert [m['id'] for m in messages] == ['m2'] and high_water == 2
+
+def test_replaced_message_is_not_delivered_twice(messages_db, store):
+    store_message(messages_db, 'm1', '2025-06-01 10:00:00')
+    store_message(messages_db, 'm2', '2025-06-01 10:01:00')
+    assert read_new(messages_db, store) == ['m1', 'm2']
+
+    # The bridge stores m1 again (new rowid), and a genuinely new message arrives
+    store_message(messages_db, 'm1', '2025-06-01 10:00:00', content='edited')
+    store_message(messages_db, 'm3', '2025-06-01 10:02:00')
+    assert read_new(messages_db, store) == ['m3']
+
+def test_history_sync_backfill_is_skipped_but_late_messages_are_not(messages_db, store):
+    store_message(messages_db, 'm1', '2025-06-01 10:00:00')
+    assert read_new(messages_db, store) == ['m1']
+
+    store_message(messages_db, 'old', '2025-05-01 08:00:00')
+    store_message(messages_db, 'late', '2025-06-01 09:55:00')
+    assert read_new(messages_db, store) == ['late']
+
+def test_limit_bounds_the_rowid_range(messages_db):
+    for i in range(5):
+        store_message(messages_db, f'm{i}', f'2025-06-01 10:0{i}:00')
+    messages, high_water = read_messages_after(messages_db, 0, limit=2)
+    assert [m['id'] for m in messages] == ['m0', 'm1'] and high_water == 2
+
+def test_recent_ids_outside_window_are_pruned(store, monkeypatch):
+    monkeypatch.setattr(message_cursor, 'CURSOR_REPLAY_WINDOW', 60)
+    first = message_cursor.message_from_row((1, 'm1', GROUP, '', '', '2025-06-01 10:00:00', 0, None, None, None))
+    second = message_cursor.message_from_row((2, 'm2', GROUP, '', '', '2025-06-01 11:00:00', 0, None, None, None))
+    store.set('test', 1, [first])
+    store.set('test', 2, [second])
+    assert store._conn.execute("SELECT message_id FROM cursor_recent_messages").fetchall() == [('m2',)]
+
+def test_dispatcher_handlers_skip_replaced_messages(messages_db, tmp_path):
+    store_message(messages_db, 'm0', '2025-06-01 09:59:00')
+    dispatcher = MessageDispatcher(messages_db, str(tmp_path / 'dispatch.db'))
+    received = []
+    dispatcher.register('collect', lambda msgs: received.extend(m['id'] for m in msgs), [GROUP])
+
+    store_message(messages_db, 'm1', '2025-06-01 10:00:00')
+    dispatcher.dispatch_once()
+    store_message(messages_db, 'm1', '2025-06-01 10:00:00', content='edited')
+    store_message(messages_db, 'm2', '2025-06-01 10:01:00')
+    dispatcher.dispatch_once()
+    assert received == ['m1', 'm2']
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test Message Index
+==================
+
+Drop-number extraction, the FTS content filter and the drop_mentions
+sidecar, built from a small messages.db in a temporary directory.
+"""
+
+import os
+import sqlite3
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import message_index
+from message_index import extract_drop_numbers
+
+CHAT = '120363418298130331@g.us'
+
+@pytest.fixture
+def messages_db(tmp_path, monkeypatch):
+    """Bridge-shaped messages.db plus a fresh index file for each test."""
+    monkeypatch.setattr(message_index, 'INDEX_DB_PATH', str(tmp_path / 'index.db'))
+    monkeypatch.setattr(message_index, '_write_conn', None)
+    monkeypatch.setattr(message_index, '_last_sync', {})
+    monkeypatch.setattr(message_index, '_sync_threads', {})
+
+    path = str(tmp_path / 'messages.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE messages (
+            id TEXT, chat_jid TEXT, sender TEXT, content TEXT, timestamp TIMESTAMP,
+            is_from_me BOOLEAN, PRIMARY KEY (id, chat_jid)
+        )
+    """)
+    conn.commit()
+    conn.close()
+    yield path
+    # Background syncs use the module globals, so let them finish before they're restored
+    wait_for_sync()
+
+def add_messages(path, *messages):
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT OR REPLACE INTO messages (id, chat_jid, sender, content, timestamp, is_from_me) VALUES (?, ?, ?, ?, ?, 0)",
+        [(msg_id, CHAT, '27820000000', content, f'2025-06-01 10:{i:02d}:00')
+         for i, (msg_id, content) in enumerate(messages)]
+    )
+    conn.commit()
+    conn.close()
+
+def test_extracts_whole_word_drop_numbers_only():
+    assert extract_drop_numbers("dr1234567 done, see DR7654321.") == ['DR1234567', 'DR7654321']
+    assert extract_drop_numbers("ADDR123 and DR12ABC") == []
+    assert extract_drop_numbers("(DR1) DR1 dr1") == ['DR1']
+    assert extract_drop_numbers(None) == []
+
+def test_drop_mentions_are_indexed_incrementally(messages_db):
+    add_messages(messages_db, ('m1', 'DR1111111 installed'), ('m2', 'no drop here'))
+    assert [m['message_id'] for m in message_index.get_drop_mentions(messages_db, 'dr1111111')] == ['m1']
+
+    add_messages(messages_db, ('m3', 'DR1111111 resubmitted, ADDR99'))
+    mentions = message_index.get_drop_mentions(messages_db, 'DR1111111', newest_first=True, with_content=True)
+    assert [m['message_id'] for m in mentions] == ['m3', 'm1']
+    assert mentions[0]['content'] == 'DR1111111 resubmitted, ADDR99'
+    assert message_index.get_drop_mentions(messages_db, 'DR99') == []
+
+def test_mentions_indexed_under_old_rules_are_rebuilt(messages_db):
+    add_messages(messages_db, ('m1', 'ADDR123'), ('m2', 'DR5'))
+    message_index.sync_message_index(messages_db)
+
+    # Simulate an index written by an older extractor
+    conn = message_index._get_write_connection()
+    conn.execute("INSERT INTO drop_mentions VALUES ('DR123', 'm1', ?, '', '', 0, 1)", (CHAT,))
+    conn.execute("UPDATE index_state SET value = 1 WHERE key = ?", (message_index.DROPS_VERSION_KEY,))
+    conn.commit()
+
+    message_index.sync_message_index(messages_db)
+    assert message_index.get_drop_mentions(messages_db, 'DR123') == []
+    assert [m['message_id'] for m in message_index.get_drop_mentions(messages_db)] == ['m2']
+
+def search(path, term):
+    conn = sqlite3.connect(path)
+    try:
+        clause, params = message_index.content_filter(conn, path, term, "messages")
+        return [row[0] for row in conn.execute(
+            f"SELECT id FROM messages WHERE {clause} ORDER BY rowid", params
+        )]
+    finally:
+        conn.close()
+
+def wait_for_sync():
+    for thread in list(message_index._sync_threads.values()):
+        thread.join(timeout=10)
+
+def test_first_search_does_not_wait_for_initial_build(messages_db, monkeypatch):
+    add_messages(messages_db, ('m1', 'pole installed at DR1111111'), ('m2', 'nothing'))
+    started = []
+    monkeypatch.setattr(message_index, '_sync_quietly', lambda path: started.append(path))
+
+    assert search(messages_db, 'installed') == ['m1']  # LIKE while nothing is indexed
+    wait_for_sync()
+    assert started == [messages_db]
+
+def test_search_uses_index_and_unindexed_tail(messages_db):
+    add_messages(messages_db, ('m1', 'pole installed'), ('m2', 'nothing'))
+    message_index.sync_message_index(messages_db)
+    add_messages(messages_db, ('m3', 'cable INSTALLED'))
+    assert search(messages_db, 'installed') == ['m1', 'm3']
+
+def test_restored_message_replaces_its_index_entry(messages_db):
+    add_messages(messages_db, ('m1', 'pole installed'), ('m2', 'nothing'))
+    message_index.sync_message_index(messages_db)
+
+    # The bridge stores m1 again with new text - it gets a new rowid
+    add_messages(messages_db, ('m1', 'pole removed'))
+    message_index.sync_message_index(messages_db)
+    assert search(messages_db, 'installed') == []
+    assert search(messages_db, 'removed') == ['m1']
+    wait_for_sync()
+    assert message_index._get_write_connection().execute("SELECT COUNT(*) FROM messages_fts").fetchone()[0] == 2
+
+def test_rowid_keyed_index_is_rebuilt(messages_db):
+    add_messages(messages_db, ('m1', 'pole installed'))
+    message_index.sync_message_index(messages_db)
+    conn = message_index._get_write_connection()
+    conn.execute("DELETE FROM index_state WHERE key = ?", (message_index.FTS_VERSION_KEY,))
+    conn.commit()
+
+    assert search(messages_db, 'installed') == ['m1']
+    wait_for_sync()
+    version = conn.execute("SELECT value FROM index_state WHERE key = ?",
+                           (message_index.FTS_VERSION_KEY,)).fetchone()[0]
+    assert version == message_index.FTS_INDEX_VERSION
+    assert search(messages_db, 'installed') == ['m1']
+
+def test_drop_lookup_does_not_sync_inline(messages_db, monkeypatch):
+    add_messages(messages_db, ('m1', 'DR1111111 installed'), ('m2', 'DR2222222 and DR1111111'))
+    started = []
+    monkeypatch.setattr(message_index, '_sync_quietly', lambda path: started.append(path))
+
+    mentions = message_index.get_drop_mentions(messages_db, 'DR1111111', newest_first=True)
+    assert [m['message_id'] for m in mentions] == ['m2', 'm1']  # scanned, index not built yet
+    wait_for_sync()
+    assert started == [messages_db]
+
+def test_drop_mentions_above_high_water_are_scanned(messages_db, monkeypatch):
+    add_messages(messages_db, ('m1', 'DR1111111 installed'), ('m2', 'DR2222222'))
+    message_index.sync_message_index(messages_db)
+    monkeypatch.setattr(message_index, '_sync_quietly', lambda path: None)
+
+    add_messages(messages_db, ('m3', 'DR1111111 resubmitted'))
+    latest = message_index.latest_drop_mention(messages_db, 'DR1111111')
+    assert latest['message_id'] == 'm3'
+    assert len(message_index.get_drop_mentions(messages_db)) == 3
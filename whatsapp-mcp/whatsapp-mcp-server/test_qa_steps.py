@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test QA Step Bitmask
+====================
+
+QAState and the bulk mask helpers, with and without NumPy.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import qa_steps
+from qa_steps import ALL_STEPS, QA_STEPS, STEP_KEYS, QAState
+
+def sheet_row(done_steps, drop='DR1'):
+    """A QA tab row: date, drop number, then the 14 step checkboxes."""
+    return ['2025-06-01', drop] + [step in done_steps for step in range(1, 15)]
+
+@pytest.fixture(params=['numpy', 'plain'])
+def numpy_mode(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(qa_steps, 'NUMPY_AVAILABLE', False)
+    return request.param
+
+def test_from_cells_accepts_booleans_text_and_short_rows():
+    assert QAState.from_cells([True, 'TRUE', ' true ', 'FALSE', None, False]) == 0b111
+    assert QAState.from_cells([]) == 0
+    assert QAState.from_cells(['TRUE'] * 20).complete
+
+def test_missing_steps_and_labels():
+    state = QAState.from_cells(sheet_row({1, 2, 3, 5})[2:])
+    assert state.missing_steps()[:3] == (4, 6, 7)
+    assert state.missing_labels()[0] == QA_STEPS[STEP_KEYS[3]]
+    assert state.done_count == 4 and not state.complete
+    assert QAState(ALL_STEPS).missing_steps() == ()
+
+def test_dict_round_trip():
+    state = QAState.from_cells(sheet_row({2, 9, 14})[2:])
+    assert QAState.from_dict(state.to_dict()) == state
+    assert QAState.from_dict({'step_09_ont_barcode_scan': True, 'unknown': True}).has(9)
+
+def test_step_numbers_are_validated():
+    with pytest.raises(ValueError):
+        QAState().has(15)
+    with pytest.raises(ValueError):
+        qa_steps.step_bit(0)
+
+def test_mask_sql_covers_every_step():
+    sql = qa_steps.mask_sql('r')
+    assert all(f"r.{key}" in sql for key in STEP_KEYS)
+    assert "<< 13)" in sql
+
+def test_bulk_helpers_agree_with_qastate(numpy_mode):
+    rows = [sheet_row(set(range(1, 15))), sheet_row({1, 2}), ['2025-06-01', 'DR3'], sheet_row({9})]
+    masks = qa_steps.masks_from_rows(rows)
+    assert [int(m) for m in masks] == [QAState.from_cells(r[2:]) for r in rows]
+    assert qa_steps.incomplete_rows(masks) == [1, 2, 3]
+    assert qa_steps.rows_missing_step(masks, 9) == [1, 2]
+    counts = qa_steps.step_done_counts(masks)
+    assert counts[0] == 2 and counts[8] == 2 and counts[13] == 1
+
+def test_empty_tab(numpy_mode):
+    masks = qa_steps.masks_from_rows([])
+    assert len(masks) == 0
+    assert qa_steps.incomplete_rows(masks) == []
+
+class FakeReviews:
+    """Connection stand-in returning (drop_number, mask) rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+def test_drops_missing_step_deduplicates(numpy_mode):
+    conn = FakeReviews([('DR1', ALL_STEPS), ('DR2', 0), ('DR2', 0), ('DR3', ALL_STEPS & ~qa_steps.step_bit(9))])
+    assert qa_steps.drops_missing_step(conn, 9, since='2025-06-01') == ['DR2', 'DR3']
+    query, params = conn.executed[0]
+    assert "review_date >= %s" in query and params == ('2025-06-01',)
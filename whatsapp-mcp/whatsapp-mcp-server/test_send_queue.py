@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test WhatsApp Send Queue
+========================
+
+SendQueue and SendQueueWorker on a temporary SQLite file, with the bridge
+replaced by a fake deliver().
+"""
+
+import os
+import sqlite3
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import send_queue
+from send_queue import FAILED, PENDING, SENT, SendQueue, SendQueueWorker
+
+GROUP = '120363421664266245@g.us'
+OTHER = '120363421532174586@g.us'
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(send_queue, 'WA_SEND_RECIPIENT_INTERVAL', 0)
+    return SendQueue(str(tmp_path / 'queue.db'))
+
+@pytest.fixture
+def delivered(monkeypatch):
+    """Fake bridge: records (recipient, message); fails messages starting with 'fail'."""
+    sent = []
+
+    def deliver(job):
+        if (job['message'] or '').startswith('fail'):
+            return False, "bridge error"
+        sent.append((job['recipient'], job['message']))
+        return True, "ok"
+
+    monkeypatch.setattr(send_queue, 'deliver', deliver)
+    return sent
+
+def drain(queue):
+    worker = SendQueueWorker(queue)
+    while worker.deliver_one():
+        pass
+
+def test_duplicate_messages_are_queued_once(queue):
+    first, duplicate = queue.enqueue(GROUP, "hello")
+    assert not duplicate
+    assert queue.enqueue(GROUP, "hello") == (first, True)
+    assert queue.enqueue(OTHER, "hello")[1] is False
+    assert queue.enqueue(GROUP, "hello", idempotency_key='other')[1] is False
+
+def test_sent_message_is_still_deduplicated(queue, delivered):
+    job_id, _ = queue.enqueue(GROUP, "hello")
+    drain(queue)
+    assert queue.enqueue(GROUP, "hello") == (job_id, True)
+    assert delivered == [(GROUP, "hello")]
+
+def test_messages_to_a_recipient_go_out_in_order(queue, delivered):
+    for text in ("one", "two", "three"):
+        queue.enqueue(GROUP, text)
+    queue.enqueue(OTHER, "other")
+    drain(queue)
+    assert [m for r, m in delivered if r == GROUP] == ["one", "two", "three"]
+
+def test_recipient_pacing_holds_back_next_message(queue, delivered, monkeypatch):
+    monkeypatch.setattr(send_queue, 'WA_SEND_RECIPIENT_INTERVAL', 60)
+    queue.enqueue(GROUP, "one")
+    queue.enqueue(GROUP, "two")
+    queue.enqueue(OTHER, "other")
+    drain(queue)
+    assert delivered == [(GROUP, "one"), (OTHER, "other")]
+
+def test_failed_delivery_backs_off_then_parks(queue, delivered, monkeypatch):
+    monkeypatch.setattr(send_queue, 'WA_SEND_MAX_ATTEMPTS', 2)
+    job_id, _ = queue.enqueue(GROUP, "fail me")
+    drain(queue)
+    status = queue.status(job_id)
+    assert status['status'] == PENDING and status['attempts'] == 1
+    assert queue.claim() is None  # backing off
+
+    queue._conn.execute("UPDATE wa_send_queue SET next_attempt_at = 0")
+    drain(queue)
+    assert queue.status(job_id)['status'] == FAILED
+    assert queue.retry_failed() == 1
+    assert queue.status(job_id)['status'] == PENDING
+
+def test_expired_lease_is_claimed_again(queue):
+    job_id, _ = queue.enqueue(GROUP, "hello")
+    assert queue.claim()['id'] == job_id
+    assert queue.claim() is None
+    queue._conn.execute("UPDATE wa_send_queue SET lease_until = 0")
+    assert queue.claim()['id'] == job_id
+
+def test_on_sent_hook_runs_only_after_delivery(queue, delivered, monkeypatch):
+    calls = []
+    monkeypatch.setitem(send_queue.SENT_HOOKS, 'record', f'{__name__}:record_hook')
+    monkeypatch.setattr(sys.modules[__name__], 'hook_calls', calls)
+
+    ok_id, _ = queue.enqueue(GROUP, "feedback DR1", on_sent=('record', 'DR1'))
+    queue.enqueue(GROUP, "fail DR2", on_sent=('record', 'DR2'))
+    assert calls == []
+    drain(queue)
+    assert calls == ['DR1']
+    assert queue.status(ok_id)['status'] == SENT
+
+def test_failing_hook_does_not_fail_the_delivery(queue, delivered, monkeypatch):
+    monkeypatch.setitem(send_queue.SENT_HOOKS, 'broken', 'no_such_module:nothing')
+    job_id, _ = queue.enqueue(GROUP, "hello", on_sent=('broken',))
+    drain(queue)
+    assert queue.status(job_id)['status'] == SENT
+
+def test_old_queue_file_gets_hook_column(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE wa_send_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL,
+            recipient TEXT NOT NULL, message TEXT, media_path TEXT, reply_to TEXT,
+            status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL, lease_until REAL, last_error TEXT, response TEXT,
+            created_at TEXT NOT NULL, sent_at REAL
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+    queue = SendQueue(path)
+    queue.enqueue(GROUP, "hello", on_sent=('qa_feedback_sent', 'DR1'))
+    assert queue.claim()['on_sent'] == ['qa_feedback_sent', 'DR1']
+
+hook_calls = []
+
+def record_hook(drop_number):
+    hook_calls.append(drop_number)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test Sheets Mirror
+==================
+
+SheetsMirror on a temporary SQLite file, and the live row check writers use,
+against an in-memory fake of the Sheets API.
+"""
+
+import os
+import re
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import sheets_mirror
+from sheets_mirror import SheetsMirror
+
+TAB = 'Velo Test'
+
+def sheet_rows(*drops):
+    """Header rows, then one row per drop number."""
+    return [['Title'], ['Date', 'Drop Number']] + [['2025-01-01', drop, 'TRUE' if i % 2 else False]
+                                                  for i, drop in enumerate(drops)]
+
+class _Call:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+class FakeSheetsService:
+    """values.get / values.batchGet over {tab: rows}."""
+
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.reads = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range):
+        self.reads.append(range)
+        match = re.fullmatch(r"'(.*)'!B(\d+)", range)
+        rows = self.tabs[match.group(1)]
+        row_index = int(match.group(2)) - 1
+        if row_index < len(rows) and len(rows[row_index]) > 1:
+            return _Call(lambda: {'values': [[rows[row_index][1]]]})
+        return _Call(lambda: {})
+
+    def batchGet(self, spreadsheetId, ranges):
+        self.reads.append(ranges)
+        names = [re.fullmatch(r"'(.*)'!.*", r).group(1) for r in ranges]
+        return _Call(lambda: {'valueRanges': [{'values': self.tabs[name]} for name in names]})
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    mirror = SheetsMirror(str(tmp_path / 'mirror.db'))
+    monkeypatch.setattr(sheets_mirror, 'get_sheets_mirror', lambda path=None: mirror)
+    monkeypatch.setattr(sheets_mirror, 'GSHEET_ID', 'sheet')
+    monkeypatch.setattr(sheets_mirror, 'GOOGLE_APPLICATION_CREDENTIALS', 'credentials.json')
+    return mirror
+
+def test_apply_tab_only_rewrites_changed_rows(mirror):
+    assert mirror.apply_tab(TAB, sheet_rows('DR1', 'DR2')) == 4
+    assert mirror.apply_tab(TAB, sheet_rows('DR1', 'DR2')) == 0
+    assert mirror.apply_tab(TAB, sheet_rows('DR1', 'DR3')) == 1
+
+def test_values_are_normalised_like_formatted_values(mirror):
+    mirror.apply_tab(TAB, [['x', 'dr7', True, 14.0, None]])
+    assert mirror.get_tab_values(TAB) == [['x', 'dr7', 'TRUE', '14', '']]
+    assert mirror.get_drop_row(TAB, 'DR7')['row_number'] == 1
+
+def test_shrinking_tab_drops_trailing_rows(mirror):
+    mirror.apply_tab(TAB, sheet_rows('DR1', 'DR2', 'DR3'))
+    mirror.apply_tab(TAB, sheet_rows('DR1'))
+    assert len(mirror.get_tab_values(TAB)) == 3
+    assert mirror.get_drop_row(TAB, 'DR3') is None
+
+def test_patch_row_updates_cells_and_drop_index(mirror):
+    mirror.apply_tab(TAB, sheet_rows('DR1'))
+    mirror.patch_row(TAB, 3, {'W': True, 'B': 'DR9'})
+    row = mirror.get_drop_row(TAB, 'DR9')
+    assert row['row_number'] == 3 and row['data'][22] == 'TRUE'
+    assert mirror.get_drop_row(TAB, 'DR1') is None
+
+def test_touch_resets_age_of_synced_tabs_only(mirror):
+    mirror.apply_tab(TAB, [])
+    mirror._conn.execute("UPDATE sheet_sync SET synced_at = synced_at - 1000")
+    mirror.touch([TAB, 'Mohadin'])
+    assert mirror.age(TAB) < 5
+    assert mirror.age('Mohadin') is None
+
+def test_live_lookup_returns_row_that_still_holds_the_drop(mirror):
+    mirror.apply_tab(TAB, sheet_rows('DR1', 'DR2'))
+    service = FakeSheetsService({TAB: sheet_rows('DR1', 'DR2')})
+
+    row = sheets_mirror.find_drop_row_live(TAB, 'dr2', service)
+    assert row['row_number'] == 4
+    assert service.reads == [f"'{TAB}'!B4"]
+
+def test_live_lookup_refreshes_when_rows_moved(mirror):
+    mirror.apply_tab(TAB, sheet_rows('DR1', 'DR2'))
+    # Someone inserted a row above since the last sync
+    service = FakeSheetsService({TAB: sheet_rows('DR0', 'DR1', 'DR2')})
+
+    row = sheets_mirror.find_drop_row_live(TAB, 'DR2', service)
+    assert row['row_number'] == 5
+    assert mirror.get_drop_row(TAB, 'DR0')['row_number'] == 3
+
+def test_live_lookup_gives_up_when_drop_was_removed(mirror):
+    mirror.apply_tab(TAB, sheet_rows('DR1', 'DR2'))
+    service = FakeSheetsService({TAB: sheet_rows('DR1')})
+
+    assert sheets_mirror.find_drop_row_live(TAB, 'DR2', service) is None
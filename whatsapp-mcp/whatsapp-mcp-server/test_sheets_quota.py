@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test Sheets API Quota Limiter
+=============================
+
+The shared token bucket on a temporary SQLite file, and the retrying
+request class against a fake HTTP transport (no Google account needed).
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import sheets_quota
+from sheets_quota import SheetsQuotaBucket, SheetsQuotaTimeout
+
+@pytest.fixture
+def quota_path(tmp_path):
+    return str(tmp_path / 'quota.db')
+
+def slow_bucket(path, burst=5, write_reserve=2):
+    """Bucket that effectively doesn't refill during a test."""
+    return SheetsQuotaBucket(path, per_minute=0.01, burst=burst, write_reserve=write_reserve)
+
+def test_reads_leave_the_write_reserve(quota_path):
+    bucket = slow_bucket(quota_path)
+    assert bucket._try_take(write=False) == 0
+    assert bucket._try_take(write=False) == 0
+    assert bucket._try_take(write=False) == 0
+    assert bucket._try_take(write=False) > 0  # 2 tokens left, both reserved
+    assert bucket._try_take(write=True) == 0
+    assert bucket._try_take(write=True) == 0
+    assert bucket._try_take(write=True) > 0
+    assert bucket.counters() == {'read_requests': 3, 'write_requests': 2}
+
+def test_processes_share_one_budget(quota_path):
+    first = slow_bucket(quota_path, burst=3, write_reserve=0)
+    second = slow_bucket(quota_path, burst=3, write_reserve=0)
+    assert [first._try_take(True), second._try_take(True), first._try_take(True)] == [0, 0, 0]
+    assert second._try_take(True) > 0
+
+def test_cooldown_blocks_every_request(quota_path):
+    bucket = slow_bucket(quota_path)
+    bucket.cooldown(30)
+    wait = slow_bucket(quota_path)._try_take(write=True)
+    assert 25 < wait <= 30
+
+def test_acquire_gives_up_after_max_wait(quota_path):
+    bucket = slow_bucket(quota_path, burst=1, write_reserve=0)
+    bucket.acquire(write=True)
+    with pytest.raises(SheetsQuotaTimeout):
+        bucket.acquire(write=True, max_wait=1)
+    assert bucket.counters()['timeouts'] == 1
+
+def test_counters_reset(quota_path):
+    bucket = slow_bucket(quota_path)
+    bucket.count(retries=2)
+    bucket.count(retries=1)
+    assert bucket.counters()['retries'] == 3
+    bucket.reset_counters()
+    assert bucket.counters() == {}
+
+def test_backoff_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(sheets_quota, 'SHEETS_BACKOFF_BASE_SECONDS', 2)
+    monkeypatch.setattr(sheets_quota, 'SHEETS_BACKOFF_MAX_SECONDS', 10)
+    assert all(1 <= sheets_quota.backoff_delay(0) <= 2 for _ in range(20))
+    assert all(5 <= sheets_quota.backoff_delay(6) <= 10 for _ in range(20))
+
+class FakeHttp:
+    """httplib2.Http stand-in answering with a fixed list of statuses."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        import httplib2
+        self.calls += 1
+        status = self.statuses.pop(0)
+        return httplib2.Response({'status': status}), b'{"values": []}'
+
+def fake_request(http, method_id):
+    from googleapiclient.model import JsonModel
+    return sheets_quota.RateLimitedRequest(
+        http, JsonModel().response, 'https://sheets.googleapis.com/v4/test', methodId=method_id
+    )
+
+@pytest.fixture
+def shared_bucket(quota_path, monkeypatch):
+    pytest.importorskip('googleapiclient')
+    bucket = SheetsQuotaBucket(quota_path, per_minute=6000, burst=10, write_reserve=1)
+    monkeypatch.setattr(sheets_quota, 'get_quota_bucket', lambda: bucket)
+    monkeypatch.setattr(sheets_quota, 'backoff_delay', lambda attempt: 0.01)
+    monkeypatch.setattr(sheets_quota.time, 'sleep', lambda seconds: None)
+    return bucket
+
+def test_quota_error_is_retried(shared_bucket):
+    http = FakeHttp([429, 200])
+    assert fake_request(http, 'sheets.spreadsheets.values.batchGet').execute() == {'values': []}
+    assert http.calls == 2
+    counters = shared_bucket.counters()
+    assert counters['quota_errors'] == 1 and counters['read_requests'] == 2
+
+def test_client_errors_are_not_retried(shared_bucket):
+    from googleapiclient.errors import HttpError
+    http = FakeHttp([400])
+    with pytest.raises(HttpError):
+        fake_request(http, 'sheets.spreadsheets.values.update').execute()
+    assert http.calls == 1
+
+def test_persistent_server_errors_give_up(shared_bucket, monkeypatch):
+    from googleapiclient.errors import HttpError
+    monkeypatch.setattr(sheets_quota, 'SHEETS_QUOTA_RETRIES', 2)
+    http = FakeHttp([503, 503, 503])
+    with pytest.raises(HttpError):
+        fake_request(http, 'sheets.spreadsheets.values.update').execute()
+    assert http.calls == 3
+    assert shared_bucket.counters()['failures'] == 1
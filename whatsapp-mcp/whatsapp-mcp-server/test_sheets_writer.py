@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test Sheets Append Writer
+=========================
+
+SheetsAppendWriter against an in-memory fake of the Sheets API that enforces
+grid limits the way the real one does.
+"""
+
+import os
+import re
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from sheets_writer import FIRST_DATA_ROW, GRID_GROWTH_ROWS, SheetsAppendWriter
+
+class GridLimitError(Exception):
+    pass
+
+class _Call:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self):
+        return self._fn()
+
+class FakeSheetsService:
+    """One tab with a fixed grid; column A values keyed by 1-based row."""
+
+    def __init__(self, tab='Velo Test', row_count=10, used_rows=()):
+        self.tab = tab
+        self.row_count = row_count
+        self.cells = {row: f"DR{row}" for row in used_rows}
+        self.value_reads = []
+        self.batches = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range=None, fields=None, majorDimension=None):
+        if range is None:
+            return _Call(lambda: {'sheets': [{'properties': {
+                'sheetId': 7, 'title': self.tab, 'gridProperties': {'rowCount': self.row_count}
+            }}]})
+        return _Call(lambda: self._read(range, majorDimension))
+
+    def _read(self, cell_range, major_dimension):
+        self.value_reads.append(cell_range)
+        match = re.fullmatch(r".*!A(\d+):A(\d*)", cell_range)
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else self.row_count
+        if max(start, end) > self.row_count:
+            raise GridLimitError(f"Range ({cell_range}) exceeds grid limits")
+        column = [self.cells.get(row, '') for row in range(start, end + 1)]
+        while column and not column[-1]:
+            column.pop()
+        if major_dimension == 'COLUMNS':
+            return {'values': [column]} if column else {}
+        return {'values': [[value] if value else [] for value in column]}
+
+    def batchUpdate(self, spreadsheetId, body):
+        return _Call(lambda: self._batch(body['requests']))
+
+    def _batch(self, requests):
+        self.batches.append(requests)
+        for request in requests:
+            if 'appendDimension' in request:
+                self.row_count += request['appendDimension']['length']
+            elif 'pasteData' in request:
+                first = request['pasteData']['coordinate']['rowIndex'] + 1
+                lines = request['pasteData']['data'].split('\n')
+                if first + len(lines) - 1 > self.row_count:
+                    raise GridLimitError("paste exceeds grid limits")
+                for offset, line in enumerate(lines):
+                    self.cells[first + offset] = line.split('\t')[0]
+        return {}
+
+def test_appends_below_existing_rows():
+    service = FakeSheetsService(row_count=100, used_rows=range(FIRST_DATA_ROW, 8))
+    writer = SheetsAppendWriter(service, 'sheet')
+
+    assert writer.append_rows('Velo Test', [['DR1'], ['DR2']]) == 8
+    assert writer.append_rows('Velo Test', [['DR3']]) == 10
+    assert service.cells[8] == 'DR1' and service.cells[10] == 'DR3'
+
+def test_full_grid_grows_instead_of_failing():
+    # Every grid row is used - the next append starts past rowCount
+    service = FakeSheetsService(row_count=10, used_rows=range(FIRST_DATA_ROW, 11))
+    writer = SheetsAppendWriter(service, 'sheet')
+
+    for i in range(3):
+        assert writer.append_rows('Velo Test', [[f'NEW{i}']]) == 11 + i
+
+    appends = [r for batch in service.batches for r in batch if 'appendDimension' in r]
+    assert len(appends) == 1
+    assert service.row_count == 11 + GRID_GROWTH_ROWS
+    assert [service.cells[row] for row in (11, 12, 13)] == ['NEW0', 'NEW1', 'NEW2']
+
+def test_batch_straddling_grid_end_only_reads_inside_grid():
+    service = FakeSheetsService(row_count=10, used_rows=range(FIRST_DATA_ROW, 9))
+    writer = SheetsAppendWriter(service, 'sheet')
+
+    assert writer.append_rows('Velo Test', [['A'], ['B'], ['C'], ['D']]) == 9
+    assert 'Velo Test!A9:A10' in service.value_reads
+    assert service.cells[12] == 'D'
+
+def test_rows_taken_by_someone_else_resync_cursor():
+    service = FakeSheetsService(row_count=100, used_rows=range(FIRST_DATA_ROW, 5))
+    writer = SheetsAppendWriter(service, 'sheet')
+    assert writer.append_rows('Velo Test', [['MINE']]) == 5
+
+    # Another writer fills rows 6-7 behind our back
+    service.cells.update({6: 'OTHER', 7: 'OTHER'})
+    assert writer.append_rows('Velo Test', [['MINE2']]) == 8
+
+def test_api_error_drops_cached_state():
+    service = FakeSheetsService(row_count=100)
+    writer = SheetsAppendWriter(service, 'sheet')
+    writer.append_rows('Velo Test', [['X']])
+
+    service.batchUpdate = lambda spreadsheetId, body: _Call(lambda: (_ for _ in ()).throw(RuntimeError('boom')))
+    with pytest.raises(RuntimeError):
+        writer.append_rows('Velo Test', [['Y']])
+    assert writer._sheets == {} and 'Velo Test' not in writer._next_row
@@ -19,12 +19,14 @@ import os
 import time
 import logging
 import sys
-import sqlite3
 import subprocess
 from datetime import datetime
 from typing import Dict, List, Optional
 import signal
 
+from sqlite_pool import get_read_connection
+from message_watcher import get_watcher
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -74,7 +76,7 @@ def check_for_kill_commands(since_timestamp: Optional[float] = None) -> bool:
             logger.warning(f"⚠️ WhatsApp database not found: {whatsapp_db}")
             return False
         
-        conn = sqlite3.connect(whatsapp_db)
+        conn = get_read_connection(whatsapp_db)
         cursor = conn.cursor()
         
         enabled_groups = get_enabled_groups()
@@ -111,24 +113,10 @@ def check_for_kill_commands(since_timestamp: Optional[float] = None) -> bool:
         
         results = cursor.fetchall()
         cursor.close()
-        conn.close()
         
         if results:
             for message_id, content, sender, chat_jid, timestamp in results:
-                # Find group name
-                group_name = "Unknown"
-                for name, config in enabled_groups.items():
-                    if config['group_jid'] == chat_jid:
-                        group_name = name
-                        break
-                
-                dt = datetime.fromtimestamp(timestamp)
-                logger.critical(f"🚨 KILL COMMAND DETECTED!")
-                logger.critical(f"   Group: {group_name}")
-                logger.critical(f"   Sender: {sender}")
-                logger.critical(f"   Message: {content}")
-                logger.critical(f"   Time: {dt}")
-                logger.critical(f"   Message ID: {message_id}")
+                log_kill_command(enabled_groups, message_id, content, sender, chat_jid, datetime.fromtimestamp(timestamp))
                 return True
         
         return False
@@ -137,6 +125,35 @@ def check_for_kill_commands(since_timestamp: Optional[float] = None) -> bool:
         logger.error(f"❌ Error checking for kill commands: {e}")
         return False
 
+def log_kill_command(enabled_groups: Dict[str, Dict], message_id: str, content: str,
+                     sender: str, chat_jid: str, timestamp):
+    """Log the details of a detected kill command"""
+    # Find group name
+    group_name = "Unknown"
+    for name, config in enabled_groups.items():
+        if config['group_jid'] == chat_jid:
+            group_name = name
+            break
+    
+    logger.critical(f"🚨 KILL COMMAND DETECTED!")
+    logger.critical(f"   Group: {group_name}")
+    logger.critical(f"   Sender: {sender}")
+    logger.critical(f"   Message: {content}")
+    logger.critical(f"   Time: {timestamp}")
+    logger.critical(f"   Message ID: {message_id}")
+
+def handle_messages(messages: List[Dict]):
+    """Message dispatcher handler: shut everything down on a KILL command"""
+    enabled_groups = get_enabled_groups()
+    group_jids = {config['group_jid'] for config in enabled_groups.values()}
+    
+    for msg in messages:
+        if msg['chat_jid'] in group_jids and 'KILL' in (msg['content'] or '').upper():
+            log_kill_command(enabled_groups, msg['id'], msg['content'], msg['sender'],
+                             msg['chat_jid'], msg['timestamp'])
+            logger.critical("🚨 KILL COMMAND RECEIVED - SHUTTING DOWN ALL SERVICES!")
+            shutdown_all_services()
+
 def shutdown_all_services():
     """Shutdown all Docker Compose services immediately"""
     try:
@@ -174,11 +191,12 @@ def shutdown_all_services():
 def run_kill_switch_monitor(check_interval: int = 5):
     """Main kill switch monitoring loop"""
     logger.info(f"🚨 KILL SWITCH SERVICE STARTED")
-    logger.info(f"   Check interval: {check_interval} seconds")
+    logger.info(f"   Max idle interval: {check_interval} seconds (wakes on new messages)")
     logger.info(f"   Monitoring enabled groups: {list(get_enabled_groups().keys())}")
     logger.info(f"   Database: {WHATSAPP_DB_PATH}")
     
     last_check_timestamp = time.time()
+    watcher = get_watcher(os.path.abspath(WHATSAPP_DB_PATH))
     
     try:
         while True:
@@ -189,7 +207,7 @@ def run_kill_switch_monitor(check_interval: int = 5):
                 break  # This shouldn't be reached due to sys.exit()
             
             last_check_timestamp = time.time()
-            time.sleep(check_interval)
+            watcher.wait_for_change(check_interval)
             
     except KeyboardInterrupt:
         logger.info("Kill switch monitor stopped by user")
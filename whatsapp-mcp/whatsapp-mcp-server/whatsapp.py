@@ -1,14 +1,27 @@
 import sqlite3
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 import os.path
-import requests
-import json
-import audio
+import asyncio
+import threading
+import time
+import sqlite_pool
+from audio_transcoder import get_opus_ogg
+from bridge_client import get_bridge_client, get_async_bridge_client
+from media_cache import cached_download, get_media_cache
+from message_index import content_filter
 
 MESSAGES_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'whatsapp-bridge', 'store', 'messages.db')
-WHATSAPP_API_BASE_URL = "http://localhost:8080/api"
+# Seconds to wait for the bridge to accept a send
+SEND_TIMEOUT = 30
+
+def get_db_connection() -> sqlite3.Connection:
+    """Get this thread's pooled read-only connection to the messages database.
+
+    The connection is shared and must not be closed by the caller.
+    """
+    return sqlite_pool.get_read_connection(MESSAGES_DB_PATH)
 
 @dataclass
 class Message:
@@ -47,52 +60,91 @@ class MessageContext:
     before: List[Message]
     after: List[Message]
 
-def get_sender_name(sender_jid: str) -> str:
+# Sender JID -> display name cache shared by all formatting calls
+SENDER_NAME_CACHE_TTL = 300  # seconds
+SENDER_NAME_CACHE_MAX = 5000
+_sender_name_cache: Dict[str, Tuple[str, float]] = {}
+_sender_name_lock = threading.Lock()
+
+def _phone_part(jid: str) -> str:
+    return jid.split('@')[0] if '@' in jid else jid
+
+def invalidate_sender_names(sender_jid: Optional[str] = None) -> None:
+    """Drop one cached sender name, or the whole cache if no JID is given."""
+    with _sender_name_lock:
+        if sender_jid is None:
+            _sender_name_cache.clear()
+        else:
+            _sender_name_cache.pop(sender_jid, None)
+
+def resolve_sender_names(sender_jids: List[str]) -> Dict[str, str]:
+    """Resolve many sender JIDs to display names with at most one query.
+    
+    Names come from the in-process cache when fresh; the remaining senders are
+    looked up together, first by exact JID and then by phone number within
+    other JIDs. Unresolved senders map to their own JID.
+    """
+    now = time.monotonic()
+    names = {}
+    missing = []
+    with _sender_name_lock:
+        for jid in set(sender_jids):
+            cached = _sender_name_cache.get(jid)
+            if cached and now - cached[1] < SENDER_NAME_CACHE_TTL:
+                names[jid] = cached[0]
+            else:
+                missing.append(jid)
+    
+    if not missing:
+        return names
+    
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
-        # First try matching by exact JID
-        cursor.execute("""
-            SELECT name
+        phones = list({_phone_part(jid) for jid in missing})
+        jid_marks = ",".join("?" * len(missing))
+        phone_marks = ",".join("?" * len(phones))
+        cursor.execute(f"""
+            SELECT jid, name
             FROM chats
-            WHERE jid = ?
-            LIMIT 1
-        """, (sender_jid,))
-        
-        result = cursor.fetchone()
-        
-        # If no result, try looking for the number within JIDs
-        if not result:
-            # Extract the phone number part if it's a JID
-            if '@' in sender_jid:
-                phone_part = sender_jid.split('@')[0]
-            else:
-                phone_part = sender_jid
-                
-            cursor.execute("""
-                SELECT name
-                FROM chats
-                WHERE jid LIKE ?
-                LIMIT 1
-            """, (f"%{phone_part}%",))
-            
-            result = cursor.fetchone()
-        
-        if result and result[0]:
-            return result[0]
-        else:
-            return sender_jid
-        
+            WHERE jid IN ({jid_marks})
+               OR substr(jid, 1, instr(jid || '@', '@') - 1) IN ({phone_marks})
+        """, (*missing, *phones))
+        
+        by_jid = {}
+        by_phone = {}
+        for jid, name in cursor.fetchall():
+            by_jid[jid] = name
+            by_phone.setdefault(_phone_part(jid), name)
+        
+        resolved = {}
+        for jid in missing:
+            # Exact JID match wins, otherwise fall back to the phone number
+            name = by_jid[jid] if jid in by_jid else by_phone.get(_phone_part(jid))
+            resolved[jid] = name or jid
     except sqlite3.Error as e:
-        print(f"Database error while getting sender name: {e}")
-        return sender_jid
-    finally:
-        if 'conn' in locals():
-            conn.close()
-
-def format_message(message: Message, show_chat_info: bool = True) -> None:
-    """Print a single message with consistent formatting."""
+        print(f"Database error while getting sender names: {e}")
+        names.update({jid: jid for jid in missing})
+        return names
+    
+    with _sender_name_lock:
+        if len(_sender_name_cache) + len(resolved) > SENDER_NAME_CACHE_MAX:
+            _sender_name_cache.clear()
+        for jid, name in resolved.items():
+            _sender_name_cache[jid] = (name, now)
+    
+    names.update(resolved)
+    return names
+
+def get_sender_name(sender_jid: str) -> str:
+    return resolve_sender_names([sender_jid]).get(sender_jid, sender_jid)
+
+def format_message(message: Message, show_chat_info: bool = True, sender_names: Optional[Dict[str, str]] = None) -> None:
+    """Print a single message with consistent formatting.
+    
+    Pass sender_names (from resolve_sender_names) to avoid a per-message lookup.
+    """
     output = ""
     
     if show_chat_info and message.chat_name:
@@ -105,7 +157,12 @@ def format_message(message: Message, show_chat_info: bool = True) -> None:
         content_prefix = f"[{message.media_type} - Message ID: {message.id} - Chat JID: {message.chat_jid}] "
     
     try:
-        sender_name = get_sender_name(message.sender) if not message.is_from_me else "Me"
+        if message.is_from_me:
+            sender_name = "Me"
+        elif sender_names is not None and message.sender in sender_names:
+            sender_name = sender_names[message.sender]
+        else:
+            sender_name = get_sender_name(message.sender)
         output += f"From: {sender_name}: {content_prefix}{message.content}\n"
     except Exception as e:
         print(f"Error formatting message: {e}")
@@ -117,8 +174,11 @@ def format_messages_list(messages: List[Message], show_chat_info: bool = True) -
         output += "No messages to display."
         return output
     
+    # Resolve every sender on the page in one go
+    sender_names = resolve_sender_names([m.sender for m in messages if not m.is_from_me])
+    
     for message in messages:
-        output += format_message(message, show_chat_info)
+        output += format_message(message, show_chat_info, sender_names)
     return output
 
 def list_messages(
@@ -135,7 +195,7 @@ def list_messages(
 ) -> List[Message]:
     """Get messages matching the specified criteria with optional context."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Build base query
@@ -172,8 +232,9 @@ def list_messages(
             params.append(chat_jid)
             
         if query:
-            where_clauses.append("LOWER(messages.content) LIKE LOWER(?)")
-            params.append(f"%{query}%")
+            content_clause, content_params = content_filter(conn, MESSAGES_DB_PATH, query, "messages")
+            where_clauses.append(content_clause)
+            params.extend(content_params)
             
         if where_clauses:
             query_parts.append("WHERE " + " AND ".join(where_clauses))
@@ -202,13 +263,8 @@ def list_messages(
             result.append(message)
             
         if include_context and result:
-            # Add context for each message
-            messages_with_context = []
-            for msg in result:
-                context = get_message_context(msg.id, context_before, context_after)
-                messages_with_context.extend(context.before)
-                messages_with_context.append(context.message)
-                messages_with_context.extend(context.after)
+            # Add context for all hits in one windowed query
+            messages_with_context = get_context_windows(result, context_before, context_after)
             
             return format_messages_list(messages_with_context, show_chat_info=True)
             
@@ -218,9 +274,82 @@ def list_messages(
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+
+def get_context_windows(
+    hits: List[Message],
+    before: int = 1,
+    after: int = 1
+) -> List[Message]:
+    """Get the hits plus their surrounding messages in a single query.
+    
+    Messages are numbered per chat with ROW_NUMBER() and every message within
+    `before`/`after` positions of a hit is returned once, even where windows of
+    nearby hits overlap. Output follows the order of `hits`, each window in
+    chronological order.
+    """
+    if not hits:
+        return []
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    targets = ",".join("(?, ?, ?)" for _ in hits)
+    params = []
+    for order, hit in enumerate(hits):
+        params.extend([hit.id, hit.chat_jid, order])
+    params.extend([max(before, 0), max(after, 0)])
+    
+    try:
+        cursor.execute(f"""
+            WITH targets(t_id, t_jid, t_order) AS (VALUES {targets}),
+            ranked AS (
+                SELECT messages.timestamp, messages.sender, chats.name, messages.content,
+                       messages.is_from_me, chats.jid, messages.id, messages.media_type,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY messages.chat_jid
+                           ORDER BY messages.timestamp, messages.rowid
+                       ) AS rn
+                FROM messages
+                JOIN chats ON messages.chat_jid = chats.jid
+                WHERE messages.chat_jid IN (SELECT t_jid FROM targets)
+            ),
+            hit_rows AS (
+                SELECT ranked.jid, ranked.rn, targets.t_order
+                FROM ranked
+                JOIN targets ON ranked.id = targets.t_id AND ranked.jid = targets.t_jid
+            )
+            SELECT r.timestamp, r.sender, r.name, r.content, r.is_from_me, r.jid, r.id, r.media_type,
+                   MIN(h.t_order) AS hit_order
+            FROM ranked r
+            JOIN hit_rows h ON r.jid = h.jid AND r.rn BETWEEN h.rn - ? AND h.rn + ?
+            GROUP BY r.jid, r.rn
+            ORDER BY hit_order, r.rn
+        """, tuple(params))
+    except sqlite3.OperationalError as e:
+        # SQLite older than 3.25 has no window functions - fetch per hit instead
+        print(f"Windowed context query unavailable ({e}), fetching context per message")
+        messages = []
+        for hit in hits:
+            context = get_message_context(hit.id, before, after)
+            messages.extend(context.before)
+            messages.append(context.message)
+            messages.extend(context.after)
+        return messages
+    
+    messages = []
+    for msg in cursor.fetchall():
+        messages.append(Message(
+            timestamp=datetime.fromisoformat(msg[0]),
+            sender=msg[1],
+            chat_name=msg[2],
+            content=msg[3],
+            is_from_me=msg[4],
+            chat_jid=msg[5],
+            id=msg[6],
+            media_type=msg[7]
+        ))
+    return messages
 
 
 def get_message_context(
@@ -230,7 +359,7 @@ def get_message_context(
 ) -> MessageContext:
     """Get context around a specific message."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Get the target message first
@@ -311,9 +440,6 @@ def get_message_context(
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         raise
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 def list_chats(
@@ -325,7 +451,7 @@ def list_chats(
 ) -> List[Chat]:
     """Get chats matching the specified criteria."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Build base query
@@ -385,15 +511,12 @@ def list_chats(
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 def search_contacts(query: str) -> List[Contact]:
     """Search contacts by name or phone number."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Split query into characters to support partial matching
@@ -427,9 +550,6 @@ def search_contacts(query: str) -> List[Contact]:
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Chat]:
@@ -441,7 +561,7 @@ def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Chat]:
         page: Page number for pagination (default 0)
     """
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -478,15 +598,12 @@ def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Chat]:
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 def get_last_interaction(jid: str) -> str:
     """Get most recent message involving the contact."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -527,15 +644,12 @@ def get_last_interaction(jid: str) -> str:
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return None
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 def get_chat(chat_jid: str, include_last_message: bool = True) -> Optional[Chat]:
     """Get chat metadata by JID."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         query = """
@@ -575,15 +689,12 @@ def get_chat(chat_jid: str, include_last_message: bool = True) -> Optional[Chat]
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return None
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 
 def get_direct_chat_by_contact(sender_phone_number: str) -> Optional[Chat]:
     """Get chat metadata by sender phone number."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -618,9 +729,6 @@ def get_direct_chat_by_contact(sender_phone_number: str) -> Optional[Chat]:
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return None
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 def send_message(recipient: str, message: str) -> Tuple[bool, str]:
     try:
@@ -628,25 +736,13 @@ def send_message(recipient: str, message: str) -> Tuple[bool, str]:
         if not recipient:
             return False, "Recipient must be provided"
         
-        url = f"{WHATSAPP_API_BASE_URL}/send"
         payload = {
             "recipient": recipient,
             "message": message,
         }
         
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("success", False), result.get("message", "Unknown response")
-        else:
-            return False, f"Error: HTTP {response.status_code} - {response.text}"
+        return get_bridge_client().send(payload, timeout=SEND_TIMEOUT)
             
-    except requests.RequestException as e:
-        return False, f"Request error: {str(e)}"
-    except json.JSONDecodeError:
-        return False, f"Error parsing response: {response.text}"
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
@@ -670,103 +766,140 @@ def send_message_reply(recipient: str, message: str, reply_to_message_id: str) -
             # Fallback to regular message if no reply ID
             return send_message(recipient, message)
         
-        url = f"{WHATSAPP_API_BASE_URL}/send"
         payload = {
             "recipient": recipient,
             "message": message,
             "reply_to": reply_to_message_id  # This makes it a reply
         }
         
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("success", False), result.get("message", "Unknown response")
-        else:
-            return False, f"Error: HTTP {response.status_code} - {response.text}"
+        return get_bridge_client().send(payload, timeout=SEND_TIMEOUT)
             
-    except requests.RequestException as e:
-        return False, f"Request error: {str(e)}"
-    except json.JSONDecodeError:
-        return False, f"Error parsing response: {response.text}"
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
+def _media_error(recipient: str, media_path: str) -> Optional[str]:
+    """Validation error for a file send, or None."""
+    if not recipient:
+        return "Recipient must be provided"
+    if not media_path:
+        return "Media path must be provided"
+    if not os.path.isfile(media_path):
+        return f"Media file not found: {media_path}"
+    return None
+
 def send_file(recipient: str, media_path: str) -> Tuple[bool, str]:
     try:
         # Validate input
-        if not recipient:
-            return False, "Recipient must be provided"
-        
-        if not media_path:
-            return False, "Media path must be provided"
-        
-        if not os.path.isfile(media_path):
-            return False, f"Media file not found: {media_path}"
+        error = _media_error(recipient, media_path)
+        if error:
+            return False, error
         
-        url = f"{WHATSAPP_API_BASE_URL}/send"
         payload = {
             "recipient": recipient,
             "media_path": media_path
         }
         
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("success", False), result.get("message", "Unknown response")
-        else:
-            return False, f"Error: HTTP {response.status_code} - {response.text}"
+        return get_bridge_client().send(payload, timeout=SEND_TIMEOUT)
             
-    except requests.RequestException as e:
-        return False, f"Request error: {str(e)}"
-    except json.JSONDecodeError:
-        return False, f"Error parsing response: {response.text}"
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
 def send_audio_message(recipient: str, media_path: str) -> Tuple[bool, str]:
     try:
         # Validate input
-        if not recipient:
-            return False, "Recipient must be provided"
-        
-        if not media_path:
-            return False, "Media path must be provided"
-        
-        if not os.path.isfile(media_path):
-            return False, f"Media file not found: {media_path}"
+        error = _media_error(recipient, media_path)
+        if error:
+            return False, error
 
         if not media_path.endswith(".ogg"):
             try:
-                media_path = audio.convert_to_opus_ogg_temp(media_path)
+                # Cached by content - the same audio sent again isn't re-transcoded
+                media_path = get_opus_ogg(media_path)
             except Exception as e:
                 return False, f"Error converting file to opus ogg. You likely need to install ffmpeg: {str(e)}"
         
-        url = f"{WHATSAPP_API_BASE_URL}/send"
         payload = {
             "recipient": recipient,
             "media_path": media_path
         }
         
-        response = requests.post(url, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("success", False), result.get("message", "Unknown response")
-        else:
-            return False, f"Error: HTTP {response.status_code} - {response.text}"
+        return get_bridge_client().send(payload, timeout=SEND_TIMEOUT)
             
-    except requests.RequestException as e:
-        return False, f"Request error: {str(e)}"
-    except json.JSONDecodeError:
-        return False, f"Error parsing response: {response.text}"
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
+async def send_message_async(recipient: str, message: str) -> Tuple[bool, str]:
+    """send_message over the shared async bridge client (doesn't block the event loop)."""
+    if not recipient:
+        return False, "Recipient must be provided"
+    return await get_async_bridge_client().send(
+        {"recipient": recipient, "message": message}, timeout=SEND_TIMEOUT
+    )
+
+async def send_file_async(recipient: str, media_path: str) -> Tuple[bool, str]:
+    """send_file over the shared async bridge client."""
+    error = _media_error(recipient, media_path)
+    if error:
+        return False, error
+    return await get_async_bridge_client().send(
+        {"recipient": recipient, "media_path": media_path}, timeout=SEND_TIMEOUT
+    )
+
+async def send_audio_message_async(recipient: str, media_path: str) -> Tuple[bool, str]:
+    """send_audio_message over the shared async bridge client; ffmpeg runs in a worker thread."""
+    error = _media_error(recipient, media_path)
+    if error:
+        return False, error
+    if not media_path.endswith(".ogg"):
+        try:
+            media_path = await asyncio.to_thread(get_opus_ogg, media_path)
+        except Exception as e:
+            return False, f"Error converting file to opus ogg. You likely need to install ffmpeg: {str(e)}"
+    return await get_async_bridge_client().send(
+        {"recipient": recipient, "media_path": media_path}, timeout=SEND_TIMEOUT
+    )
+
+async def download_media_async(message_id: str, chat_jid: str) -> Tuple[Optional[str], str]:
+    """download_media over the shared async bridge client. Returns (path or None, message)."""
+    cache = get_media_cache()
+    path = await asyncio.to_thread(cache.lookup, message_id, chat_jid)
+    if path:
+        return path, "Served from media cache"
+    path, message = await get_async_bridge_client().download(message_id, chat_jid)
+    if not path:
+        return None, message
+    return await asyncio.to_thread(cache.add_file, message_id, chat_jid, path), message
+
+def queue_message(recipient: str, message: Optional[str] = None, media_path: Optional[str] = None,
+                  reply_to: Optional[str] = None, idempotency_key: Optional[str] = None,
+                  as_audio: bool = False, on_sent: Optional[Tuple] = None) -> Tuple[bool, str]:
+    """Queue a message (or file) for background delivery and return immediately.
+    
+    Delivery is retried, paced per recipient and deduplicated by send_queue.py.
+    
+    Args:
+        recipient: The chat JID to send to
+        message: The message content
+        media_path: File to send instead of a text message
+        reply_to: The ID of the message to reply to
+        idempotency_key: Messages with the same key are only sent once
+            (default: derived from recipient and content)
+        as_audio: Send media_path as a voice message. It's converted to Opus
+            once and the cached conversion is reused for every recipient
+        on_sent: (hook name, *args) from send_queue.SENT_HOOKS to run once
+            the message has been delivered
+        
+    Returns:
+        Tuple of (queued: bool, response_message: str)
+    """
+    import send_queue
+    if as_audio and media_path and os.path.isfile(media_path) and not media_path.endswith(".ogg"):
+        try:
+            media_path = get_opus_ogg(media_path)
+        except Exception as e:
+            return False, f"Error converting file to opus ogg. You likely need to install ffmpeg: {str(e)}"
+    return send_queue.queue_message(recipient, message, media_path, reply_to, idempotency_key, on_sent)
+
 def download_media(message_id: str, chat_jid: str) -> Optional[str]:
     """Download media from a message and return the local file path.
     
@@ -778,33 +911,13 @@ def download_media(message_id: str, chat_jid: str) -> Optional[str]:
         The local file path if download was successful, None otherwise
     """
     try:
-        url = f"{WHATSAPP_API_BASE_URL}/download"
-        payload = {
-            "message_id": message_id,
-            "chat_jid": chat_jid
-        }
-        
-        response = requests.post(url, json=payload)
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("success", False):
-                path = result.get("path")
-                print(f"Media downloaded successfully: {path}")
-                return path
-            else:
-                print(f"Download failed: {result.get('message', 'Unknown error')}")
-                return None
+        path, error = cached_download(message_id, chat_jid)
+        if path:
+            print(f"Media downloaded successfully: {path}")
         else:
-            print(f"Error: HTTP {response.status_code} - {response.text}")
-            return None
+            print(error)
+        return path
             
-    except requests.RequestException as e:
-        print(f"Request error: {str(e)}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error parsing response: {response.text}")
-        return None
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         return None
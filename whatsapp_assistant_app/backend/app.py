@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 import os
+import re
 import json
 import requests
 import sqlite3
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
 import openai
 import logging
@@ -25,6 +26,12 @@ WHATSAPP_MCP_URL = os.environ.get('WHATSAPP_MCP_URL', 'http://localhost:3000')
 LLM_API_KEY = os.environ.get('LLM_API_KEY', '')
 LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-4')
 LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'openai')  # openai, anthropic, etc.
+# (connect, read) seconds for calls to the WhatsApp MCP API
+WHATSAPP_MCP_TIMEOUT = (5, float(os.environ.get('WHATSAPP_MCP_TIMEOUT', '30')))
+
+# One keep-alive session for all calls to the WhatsApp MCP API
+whatsapp_session = requests.Session()
+whatsapp_session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=10))
 
 # Create data directory if it doesn't exist
 os.makedirs(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'), exist_ok=True)
@@ -32,6 +39,13 @@ os.makedirs(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'), ex
 # Path to the WhatsApp messages database
 MESSAGES_DB_PATH = '/home/louisdup/VF/Apps/WA_Tool/whatsapp-mcp/whatsapp-bridge/store/messages.db'
 
+# Thumbnails and review copies written by foto_uploads/photo_derivatives.py
+PHOTO_DERIVATIVES_DIR = os.environ.get(
+    'PHOTO_DERIVATIVES_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../foto_uploads/derivatives')
+)
+PHOTO_VARIANTS = {'thumb.jpg': 'image/jpeg', 'thumb.webp': 'image/webp', 'review.jpg': 'image/jpeg'}
+
 # Initialize LLM client
 if LLM_PROVIDER == 'openai' and LLM_API_KEY:
     openai.api_key = LLM_API_KEY
@@ -105,9 +119,9 @@ def call_whatsapp_api(endpoint, method="GET", data=None):
     
     try:
         if method == "GET":
-            response = requests.get(url)
+            response = whatsapp_session.get(url, timeout=WHATSAPP_MCP_TIMEOUT)
         elif method == "POST":
-            response = requests.post(url, json=data)
+            response = whatsapp_session.post(url, json=data, timeout=WHATSAPP_MCP_TIMEOUT)
         else:
             return {"success": False, "message": f"Unsupported method: {method}"}
         
@@ -120,7 +134,7 @@ def call_whatsapp_api(endpoint, method="GET", data=None):
 def get_status():
     """Check if the WhatsApp MCP server is running"""
     try:
-        response = requests.get(f"{WHATSAPP_MCP_URL}/status")
+        response = whatsapp_session.get(f"{WHATSAPP_MCP_URL}/status", timeout=WHATSAPP_MCP_TIMEOUT)
         return jsonify({"whatsapp_connected": response.status_code == 200})
     except:
         return jsonify({"whatsapp_connected": False})
@@ -352,6 +366,34 @@ def assistant():
         "llm_response": llm_response
     })
 
+@app.route('/api/photos/<sha256>/<variant>', methods=['GET'])
+def get_photo_derivative(sha256, variant):
+    """Serve a photo thumbnail or review copy by source photo hash.
+    
+    variant is thumb.jpg, thumb.webp, review.jpg, or 'thumb' to get WebP when
+    the client accepts it. Files never change for a given hash, so responses
+    carry a strong ETag and are cacheable forever; Range requests are honoured.
+    """
+    negotiated = variant == 'thumb'
+    if negotiated:
+        variant = 'thumb.webp' if 'image/webp' in request.headers.get('Accept', '') else 'thumb.jpg'
+    
+    if variant not in PHOTO_VARIANTS or not re.fullmatch(r'[0-9a-f]{64}', sha256):
+        return jsonify({"success": False, "message": "Unknown photo or variant"}), 404
+    
+    path = os.path.join(PHOTO_DERIVATIVES_DIR, sha256[:2], sha256, variant)
+    if not os.path.isfile(path):
+        return jsonify({"success": False, "message": "Photo derivative not generated yet"}), 404
+    
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    response = send_file(path, mimetype=PHOTO_VARIANTS[variant], conditional=True,
+                         etag=f"{sha256}-{variant}", max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if negotiated:
+        response.vary.add('Accept')
+    return response
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_frontend(path):